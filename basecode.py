@@ -1,1923 +1,5764 @@
-# Bilibili视频转GIF工具By:丶樱流
-# 支持下载bilibili视频并转换为GIF动图，新增本地视频上传功能
-# 新增功能：自动识别和移除黑边、bilibili水印，支持本地视频文件
-# 25-9-19优化版本：大幅提升GIF转换速度
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-import os
-import sys
-import subprocess
-import threading
-import time
-import json
-import logging
-import locale
-from pathlib import Path
-import re
-from urllib.parse import urlparse
-import numpy as np
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import tempfile
-import gc
-
-# 显示控制台窗口
-if os.name == 'nt':  # Windows系统
-    import ctypes
-    try:
-        # 分配新的控制台
-        ctypes.windll.kernel32.AllocConsole()
-        # 重定向标准输出到控制台
-        sys.stdout = open('CONOUT$', 'w', encoding='utf-8')
-        sys.stderr = open('CONOUT$', 'w', encoding='utf-8')
-        print("控制台已启用")
-    except:
-        pass
-
-class LibraryInstaller:
-    """库安装器"""
-    
-    # 格式: (安装包名, 导入名)
-    REQUIRED_PACKAGES = [
-        ('yt-dlp', 'yt_dlp'),
-        ('Pillow', 'PIL'),
-        ('requests', 'requests'),
-        ('opencv-python', 'cv2'),
-        ('numpy', 'numpy')
-    ]
-    
-    CHINA_MIRRORS = [
-        'https://pypi.tuna.tsinghua.edu.cn/simple/',
-        'https://mirrors.aliyun.com/pypi/simple/',
-        'https://pypi.mirrors.ustc.edu.cn/simple/',
-        'https://pypi.douban.com/simple/'
-    ]
-    
-    @classmethod
-    def check_and_install_packages(cls):
-        """检查并安装所需包"""
-        missing_packages = []
-        
-        for install_name, import_name in cls.REQUIRED_PACKAGES:
-            try:
-                __import__(import_name)
-                print(f"✓ {install_name} 已安装")
-            except ImportError:
-                print(f"✗ {install_name} 未安装")
-                missing_packages.append(install_name)
-        
-        if missing_packages:
-            # 创建一个简单的对话框让用户选择
-            root = tk.Tk()
-            root.withdraw()  # 隐藏主窗口
-            
-            result = messagebox.askyesnocancel(
-                "缺少依赖库", 
-                f"检测到缺少以下库：{', '.join(missing_packages)}\n\n"
-                f"点击'是'自动安装\n"
-                f"点击'否'跳过检查继续运行\n"
-                f"点击'取消'退出程序"
-            )
-            
-            root.destroy()
-            
-            if result is True:  # 是 - 安装
-                cls._install_packages(missing_packages)
-            elif result is False:  # 否 - 跳过
-                print("跳过库检查，继续运行...")
-                return
-            else:  # 取消 - 退出
-                sys.exit(1)
-    
-    @classmethod
-    def _install_packages(cls, packages):
-        """安装包"""
-        for package in packages:
-            success = False
-            
-            # 首先尝试默认源
-            try:
-                subprocess.check_call([
-                    sys.executable, '-m', 'pip', 'install', package
-                ])
-                success = True
-            except subprocess.CalledProcessError:
-                pass
-            
-            # 如果失败，尝试国内镜像
-            if not success:
-                for mirror in cls.CHINA_MIRRORS:
-                    try:
-                        subprocess.check_call([
-                            sys.executable, '-m', 'pip', 'install', 
-                            '-i', mirror, package
-                        ])
-                        success = True
-                        break
-                    except subprocess.CalledProcessError:
-                        continue
-            
-            if not success:
-                messagebox.showerror("安装失败", f"无法安装 {package}")
-                sys.exit(1)
-        
-        messagebox.showinfo("安装完成", "所有依赖库已安装完成，请重新启动程序")
-        sys.exit(0)
-
-# 在文件顶部导入所有需要的库
-try:
-    import cv2
-    CV2_AVAILABLE = True
-    print("✓ OpenCV 已加载")
-except ImportError:
-    CV2_AVAILABLE = False
-    print("✗ OpenCV 未安装，智能裁切功能将受限")
-
-class VideoProcessor:
-    """视频处理器 - 负责黑边和水印检测与移除"""
-    
-    @staticmethod
-    def detect_black_borders(frame, threshold=30):
-        """检测视频帧的黑边"""
-        if not CV2_AVAILABLE:
-            return 0, 0, 0, 0
-            
-        # 转换为灰度图
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        h, w = gray.shape
-        
-        # 检测上边黑边
-        top = 0
-        for i in range(h // 3):  # 只检查上三分之一
-            if np.mean(gray[i, :]) > threshold:
-                break
-            top = i + 1
-        
-        # 检测下边黑边
-        bottom = 0
-        for i in range(h - 1, h * 2 // 3, -1):  # 只检查下三分之一
-            if np.mean(gray[i, :]) > threshold:
-                break
-            bottom = h - i
-        
-        # 检测左边黑边
-        left = 0
-        for i in range(w // 3):  # 只检查左三分之一
-            if np.mean(gray[:, i]) > threshold:
-                break
-            left = i + 1
-        
-        # 检测右边黑边
-        right = 0
-        for i in range(w - 1, w * 2 // 3, -1):  # 只检查右三分之一
-            if np.mean(gray[:, i]) > threshold:
-                break
-            right = w - i
-        
-        return top, bottom, left, right
-    
-    @staticmethod
-    def detect_bilibili_watermark(frame, margin_ratio=0.15):
-        """检测bilibili水印位置"""
-        if not CV2_AVAILABLE:
-            return 0, 0, 0, 0
-            
-        h, w = frame.shape[:2]
-        margin_h = int(h * margin_ratio)
-        margin_w = int(w * margin_ratio)
-        
-        # 转换为HSV用于更好的颜色检测
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # bilibili水印通常是白色或浅色的
-        # 检测白色区域 (HSV中V值较高)
-        white_mask = cv2.inRange(hsv, (0, 0, 200), (180, 30, 255))
-        
-        # 也检测灰度图中的高亮区域
-        _, bright_mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
-        
-        # 合并掩码
-        watermark_mask = cv2.bitwise_or(white_mask, bright_mask)
-        
-        # 形态学操作去除噪声
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        watermark_mask = cv2.morphologyEx(watermark_mask, cv2.MORPH_CLOSE, kernel)
-        watermark_mask = cv2.morphologyEx(watermark_mask, cv2.MORPH_OPEN, kernel)
-        
-        # 在四个边缘区域检测水印
-        regions = {
-            'top': watermark_mask[:margin_h, :],
-            'bottom': watermark_mask[-margin_h:, :],
-            'left': watermark_mask[:, :margin_w],
-            'right': watermark_mask[:, -margin_w:]
-        }
-        
-        crop_values = {'top': 0, 'bottom': 0, 'left': 0, 'right': 0}
-        
-        for region_name, region in regions.items():
-            if region.size == 0:
-                continue
-                
-            # 计算该区域的白色像素比例
-            white_ratio = np.sum(region > 0) / region.size
-            
-            # 如果白色像素比例超过阈值，认为存在水印
-            if white_ratio > 0.01:  # 1%的阈值
-                # 寻找连续的水印区域
-                if region_name == 'top':
-                    # 从上往下找到最后一行有水印的位置
-                    for i in range(region.shape[0] - 1, -1, -1):
-                        if np.sum(region[i, :]) > region.shape[1] * 0.02:  # 该行2%像素是白色
-                            crop_values['top'] = max(crop_values['top'], i + 5)  # 多裁切5像素确保完全移除
-                            break
-                            
-                elif region_name == 'bottom':
-                    # 从下往上找到最后一行有水印的位置
-                    for i in range(region.shape[0]):
-                        if np.sum(region[i, :]) > region.shape[1] * 0.02:
-                            crop_values['bottom'] = max(crop_values['bottom'], margin_h - i + 5)
-                            break
-                            
-                elif region_name == 'left':
-                    # 从左往右找到最后一列有水印的位置
-                    for i in range(region.shape[1] - 1, -1, -1):
-                        if np.sum(region[:, i]) > region.shape[0] * 0.02:
-                            crop_values['left'] = max(crop_values['left'], i + 5)
-                            break
-                            
-                elif region_name == 'right':
-                    # 从右往左找到最后一列有水印的位置
-                    for i in range(region.shape[1]):
-                        if np.sum(region[:, i]) > region.shape[0] * 0.02:
-                            crop_values['right'] = max(crop_values['right'], margin_w - i + 5)
-                            break
-        
-        return crop_values['top'], crop_values['bottom'], crop_values['left'], crop_values['right']
-    
-    @staticmethod
-    def calculate_smart_crop(frame, remove_black_borders=True, remove_watermark=True):
-        """计算智能裁切参数"""
-        if not CV2_AVAILABLE:
-            return 0, 0, 0, 0
-            
-        h, w = frame.shape[:2]
-        
-        # 初始化裁切值
-        crop_top = crop_bottom = crop_left = crop_right = 0
-        
-        # 检测黑边
-        if remove_black_borders:
-            black_top, black_bottom, black_left, black_right = VideoProcessor.detect_black_borders(frame)
-            crop_top = max(crop_top, black_top)
-            crop_bottom = max(crop_bottom, black_bottom)
-            crop_left = max(crop_left, black_left)
-            crop_right = max(crop_right, black_right)
-        
-        # 检测水印
-        if remove_watermark:
-            mark_top, mark_bottom, mark_left, mark_right = VideoProcessor.detect_bilibili_watermark(frame)
-            crop_top = max(crop_top, mark_top)
-            crop_bottom = max(crop_bottom, mark_bottom)
-            crop_left = max(crop_left, mark_left)
-            crop_right = max(crop_right, mark_right)
-        
-        # 确保裁切后仍有有效图像
-        min_dimension = 100  # 最小尺寸
-        if w - crop_left - crop_right < min_dimension:
-            # 如果水平裁切过多，按比例减少
-            total_horizontal = crop_left + crop_right
-            if total_horizontal > 0:
-                reduction_ratio = (w - min_dimension) / total_horizontal
-                crop_left = int(crop_left * reduction_ratio)
-                crop_right = int(crop_right * reduction_ratio)
-        
-        if h - crop_top - crop_bottom < min_dimension:
-            # 如果垂直裁切过多，按比例减少
-            total_vertical = crop_top + crop_bottom
-            if total_vertical > 0:
-                reduction_ratio = (h - min_dimension) / total_vertical
-                crop_top = int(crop_top * reduction_ratio)
-                crop_bottom = int(crop_bottom * reduction_ratio)
-        
-        return crop_top, crop_bottom, crop_left, crop_right
-
-class OptimizedFrameProcessor:
-    """优化的帧处理器 - 大幅提升转换速度"""
-    
-    def __init__(self, max_workers=None):
-        # 根据CPU核心数自动设置工作线程数，但优化线程配置
-        if max_workers is None:
-            cpu_count = os.cpu_count() or 1
-            # 对于I/O密集型任务，可以使用更多线程
-            max_workers = min(12, cpu_count * 2)  # 提高到CPU核心数的2倍，最多12个线程
-        self.max_workers = max_workers
-        print(f"使用 {max_workers} 个线程进行帧处理")
-    
-    def process_frame_batch_optimized(self, frame_data, target_width, target_height, max_colors, crop_params=None):
-        """优化的批量帧处理 - 减少内存拷贝和提高处理效率"""
-        try:
-            from PIL import Image
-            
-            frame, frame_index = frame_data
-            
-            # 提前应用裁切以减少后续处理的数据量
-            if crop_params and any(crop_params):
-                crop_top, crop_bottom, crop_left, crop_right = crop_params
-                h, w = frame.shape[:2]
-                if crop_top + crop_bottom < h and crop_left + crop_right < w:
-                    frame = frame[crop_top:h-crop_bottom, crop_left:w-crop_right]
-            
-            # 优化的颜色空间转换 - 直接转换为RGB避免多次转换
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # 创建PIL图像并直接resize
-            img = Image.fromarray(frame_rgb)
-            
-            # 优化resize方法 - 根据缩放比例选择合适的算法
-            current_size = img.size
-            scale_factor = (target_width * target_height) / (current_size[0] * current_size[1])
-            
-            if scale_factor < 0.5:
-                # 大幅缩小时使用LANCZOS获得更好质量
-                resample_method = Image.Resampling.LANCZOS
-            elif scale_factor < 0.8:
-                # 中等缩小时使用BILINEAR平衡速度和质量
-                resample_method = Image.Resampling.BILINEAR
-            else:
-                # 轻微缩放或放大时使用最快的NEAREST
-                resample_method = Image.Resampling.NEAREST
-            
-            img = img.resize((target_width, target_height), resample_method)
-            
-            # 优化的颜色量化 - 根据颜色数量选择最佳策略
-            if max_colors < 256:
-                if max_colors <= 32:
-                    # 极少颜色时使用最快的MAXCOVERAGE方法
-                    img = img.quantize(colors=max_colors, method=Image.Quantize.MAXCOVERAGE)
-                elif max_colors <= 64:
-                    # 较少颜色时使用FASTOCTREE方法
-                    img = img.quantize(colors=max_colors, method=Image.Quantize.FASTOCTREE)
-                else:
-                    # 较多颜色时使用MEDIANCUT方法获得更好质量
-                    img = img.quantize(colors=max_colors, method=Image.Quantize.MEDIANCUT)
-            
-            # 立即清理原始帧数据
-            del frame, frame_rgb
-            
-            return frame_index, img
-            
-        except Exception as e:
-            print(f"处理第{frame_index}帧时出错: {e}")
-            return frame_index, None
-    
-    def extract_and_process_frames_optimized(self, input_file, start_time, end_time, fps, 
-                                          target_width, target_height, max_colors, 
-                                          crop_params=None, progress_callback=None):
-        """优化的帧提取和处理 - 流水线处理提高效率"""
-        if not CV2_AVAILABLE:
-            raise Exception("需要OpenCV支持")
-        
-        frames = []
-        cap = cv2.VideoCapture(input_file)
-        
-        if not cap.isOpened():
-            raise Exception(f"无法打开视频文件: {input_file}")
-        
-        try:
-            # 获取视频信息
-            video_fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # 计算需要提取的帧
-            duration = end_time - start_time
-            target_frame_count = int(duration * fps)
-            
-            # 设置起始位置
-            start_frame = int(start_time * video_fps)
-            end_frame = min(int(end_time * video_fps), total_frames)
-            
-            # 优化的帧间隔计算
-            available_frames = end_frame - start_frame
-            frame_step = max(1, available_frames // target_frame_count)
-            
-            print(f"视频信息: FPS={video_fps:.2f}, 总帧数={total_frames}")
-            print(f"提取范围: 第{start_frame}帧到第{end_frame}帧，间隔{frame_step}帧")
-            print(f"预计提取 {target_frame_count} 帧")
-            
-            # 使用流水线方式提取和处理帧
-            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-            
-            # 创建帧数据队列用于流水线处理
-            frame_queue = []
-            current_frame_pos = start_frame
-            extracted_count = 0
-            
-            # 第一阶段：快速提取所有需要的原始帧
-            while current_frame_pos < end_frame and extracted_count < target_frame_count:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # 只保存需要的帧
-                if (current_frame_pos - start_frame) % frame_step == 0:
-                    frame_queue.append((frame.copy(), extracted_count))
-                    extracted_count += 1
-                    
-                    # 更新进度
-                    if progress_callback and extracted_count % 30 == 0:
-                        progress_callback(f"提取帧中... {extracted_count}/{target_frame_count}")
-                
-                current_frame_pos += 1
-                
-                # 跳帧以提高速度
-                if frame_step > 1:
-                    next_pos = current_frame_pos + frame_step - 1
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, next_pos)
-                    current_frame_pos = next_pos
-            
-            cap.release()
-            print(f"实际提取了 {len(frame_queue)} 帧")
-            
-            if not frame_queue:
-                raise Exception("未能提取到任何帧")
-            
-            # 第二阶段：并行处理所有帧
-            if progress_callback:
-                progress_callback("并行处理帧中...")
-            
-            processed_frames = [None] * len(frame_queue)
-            
-            # 使用批处理提高效率
-            batch_size = min(20, len(frame_queue))  # 批处理大小
-            
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # 提交所有任务
-                future_to_index = {}
-                for i in range(0, len(frame_queue), batch_size):
-                    batch_end = min(i + batch_size, len(frame_queue))
-                    batch_data = frame_queue[i:batch_end]
-                    
-                    for j, frame_data in enumerate(batch_data):
-                        future = executor.submit(
-                            self.process_frame_batch_optimized,
-                            frame_data,
-                            target_width,
-                            target_height,
-                            max_colors,
-                            crop_params
-                        )
-                        future_to_index[future] = i + j
-                
-                # 使用as_completed获得更好的响应性
-                completed = 0
-                for future in as_completed(future_to_index):
-                    try:
-                        frame_index, processed_frame = future.result(timeout=30)
-                        if processed_frame is not None:
-                            processed_frames[frame_index] = processed_frame
-                        completed += 1
-                        
-                        # 更新进度
-                        if progress_callback and completed % 15 == 0:
-                            progress_callback(f"处理帧中... {completed}/{len(frame_queue)}")
-                            
-                    except Exception as e:
-                        print(f"处理帧时出错: {e}")
-                        continue
-            
-            # 过滤掉处理失败的帧
-            frames = [f for f in processed_frames if f is not None]
-            
-            # 立即清理内存
-            del frame_queue, processed_frames
-            gc.collect()
-            
-            if not frames:
-                raise Exception("所有帧处理失败")
-            
-            print(f"成功处理了 {len(frames)} 帧")
-            return frames
-            
-        finally:
-            if cap.isOpened():
-                cap.release()
-
-class BilibiliToGifConverter:
-    """bilibili视频转GIF转换器"""
-    
-    def __init__(self, root):
-        self.root = root
-        self.setup_directories()
-        self.setup_logging()
-        self.setup_gui()
-        
-        # 转换参数
-        self.video_info = None
-        self.conversion_thread = None
-        self.is_converting = False
-        self.is_local_file = False  # 新增：标记是否为本地文件
-        self.local_file_path = None  # 新增：本地文件路径
-        
-        # 初始化优化的帧处理器
-        self.frame_processor = OptimizedFrameProcessor()
-        
-    def setup_directories(self):
-        """设置目录结构"""
-        self.base_dir = Path(__file__).parent
-        self.output_dir = self.base_dir / "output"
-        self.log_dir = self.base_dir / "logs"
-        self.temp_dir = self.base_dir / "temp"
-        
-        for dir_path in [self.output_dir, self.log_dir, self.temp_dir]:
-            dir_path.mkdir(exist_ok=True)
-    
-    def setup_logging(self):
-        """设置日志"""
-        log_file = self.log_dir / f"bilibili_to_gif_{int(time.time())}.log"
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
-    
-    def setup_gui(self):
-        """设置GUI界面"""
-        self.root.title(" Bilibili视频转GIF工具By:丶樱流 ")
-        self.root.geometry("950x800")
-        self.root.minsize(900, 750)
-        self.root.resizable(True, True)
-        
-        # 设置高DPI适配
-        try:
-            from ctypes import windll
-            windll.shcore.SetProcessDpiAwareness(1)
-        except:
-            pass
-        
-        # 直接创建主框架，不使用滚动条，确保所有内容在默认大小下可见
-        main_frame = ttk.Frame(self.root, padding="15")
-        main_frame.pack(fill="both", expand=True)
-        
-        # 配置网格权重
-        main_frame.columnconfigure(1, weight=1)
-        
-        row = 0
-        
-        # 输入方式选择
-        input_frame = ttk.LabelFrame(main_frame, text="输入方式", padding="5")
-        input_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-        
-        self.input_method_var = tk.StringVar(value="url")
-        ttk.Radiobutton(input_frame, text="Bilibili链接", variable=self.input_method_var, 
-                       value="url", command=self.on_input_method_change).pack(side=tk.LEFT, padx=(0, 20))
-        ttk.Radiobutton(input_frame, text="本地视频文件", variable=self.input_method_var, 
-                       value="file", command=self.on_input_method_change).pack(side=tk.LEFT)
-        row += 1
-        
-        # URL输入框
-        self.url_frame = ttk.Frame(main_frame)
-        self.url_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-        self.url_frame.columnconfigure(1, weight=1)
-        
-        ttk.Label(self.url_frame, text="Bilibili视频链接:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.url_var = tk.StringVar()
-        url_entry = ttk.Entry(self.url_frame, textvariable=self.url_var, width=60)
-        url_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
-        ttk.Button(self.url_frame, text="获取视频信息", command=self.get_video_info).grid(
-            row=0, column=2, padx=(10, 0), pady=5)
-        
-        # 本地文件选择框
-        self.file_frame = ttk.Frame(main_frame)
-        self.file_frame.columnconfigure(1, weight=1)
-        
-        ttk.Label(self.file_frame, text="本地视频文件:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.file_path_var = tk.StringVar()
-        ttk.Entry(self.file_frame, textvariable=self.file_path_var, width=60, state="readonly").grid(
-            row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
-        ttk.Button(self.file_frame, text="选择文件", command=self.select_local_file).grid(
-            row=0, column=2, padx=(10, 0), pady=5)
-        
-        row += 1
-        
-        # 视频信息显示
-        self.info_text = tk.Text(main_frame, height=4, wrap=tk.WORD)
-        self.info_text.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-        row += 1
-        
-        # 时间设置框架
-        time_frame = ttk.LabelFrame(main_frame, text="时间设置", padding="5")
-        time_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
-        time_frame.columnconfigure(1, weight=1)
-        time_frame.columnconfigure(3, weight=1)
-        
-        ttk.Label(time_frame, text="开始时间(秒):").grid(row=0, column=0, sticky=tk.W)
-        self.start_time_var = tk.StringVar(value="0")
-        ttk.Entry(time_frame, textvariable=self.start_time_var, width=10).grid(
-            row=0, column=1, sticky=tk.W, padx=(5, 20)
-        )
-        
-        ttk.Label(time_frame, text="结束时间(秒):").grid(row=0, column=2, sticky=tk.W)
-        self.end_time_var = tk.StringVar(value="10")
-        ttk.Entry(time_frame, textvariable=self.end_time_var, width=10).grid(
-            row=0, column=3, sticky=tk.W, padx=(5, 0)
-        )
-        row += 1
-        
-        # GIF设置框架
-        gif_frame = ttk.LabelFrame(main_frame, text="GIF设置", padding="5")
-        gif_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
-        gif_frame.columnconfigure(1, weight=1)
-        gif_frame.columnconfigure(3, weight=1)
-        
-        # 分辨率设置
-        ttk.Label(gif_frame, text="输出分辨率:").grid(row=0, column=0, sticky=tk.W)
-        self.resolution_var = tk.StringVar()
-        self.resolution_combo = ttk.Combobox(
-            gif_frame, textvariable=self.resolution_var, 
-            values=["480x270", "640x360", "854x480", "1280x720", "自定义"], 
-            state="readonly", width=20
-        )
-        self.resolution_combo.grid(row=0, column=1, sticky=tk.W, padx=(5, 20))
-        self.resolution_combo.set("640x360")
-        
-        # 压缩比例显示
-        self.compression_label = ttk.Label(gif_frame, text="", foreground="blue")
-        self.compression_label.grid(row=0, column=2, sticky=tk.W, padx=(10, 0))
-        
-        # 帧率设置
-        ttk.Label(gif_frame, text="帧率(FPS):").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
-        self.fps_var = tk.StringVar(value="20")  # 进一步提高默认帧率以改善流畅度
-        ttk.Entry(gif_frame, textvariable=self.fps_var, width=8).grid(
-            row=1, column=1, sticky=tk.W, padx=(5, 20), pady=(5, 0)
-        )
-        
-        # 质量设置
-        ttk.Label(gif_frame, text="质量:").grid(row=1, column=2, sticky=tk.W, padx=(10, 0), pady=(5, 0))
-        self.quality_var = tk.StringVar(value="中")
-        quality_combo = ttk.Combobox(
-            gif_frame, textvariable=self.quality_var,
-            values=["高", "中", "低"],
-            state="readonly", width=8
-        )
-        quality_combo.grid(row=1, column=3, sticky=tk.W, padx=(5, 0), pady=(5, 0))
-        
-        # 视频处理设置
-        processing_frame = ttk.LabelFrame(gif_frame, text="视频优化", padding="5")
-        processing_frame.grid(row=2, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
-        
-        self.auto_crop_var = tk.BooleanVar(value=True)
-        auto_crop_check = ttk.Checkbutton(
-            processing_frame, 
-            text="自动去除黑边", 
-            variable=self.auto_crop_var
-        )
-        auto_crop_check.pack(side=tk.LEFT, padx=(0, 20))
-        
-        self.remove_watermark_var = tk.BooleanVar(value=True)
-        watermark_check = ttk.Checkbutton(
-            processing_frame, 
-            text="智能裁切bilibili水印", 
-            variable=self.remove_watermark_var
-        )
-        watermark_check.pack(side=tk.LEFT, padx=(0, 20))
-        
-        # 添加水印位置说明
-        watermark_info = ttk.Label(
-            processing_frame, 
-            text="(自动识别右下角水印区域)",
-            font=('TkDefaultFont', 8),
-            foreground='gray'
-        )
-        watermark_info.pack(side=tk.LEFT)
-        
-        # 如果OpenCV不可用，显示警告并禁用智能处理选项
-        if not CV2_AVAILABLE:
-            auto_crop_check.config(state=tk.DISABLED)
-            watermark_check.config(state=tk.DISABLED)
-            self.auto_crop_var.set(False)
-            self.remove_watermark_var.set(False)
-            
-            warning_label = ttk.Label(
-                processing_frame,
-                text="(需要安装opencv-python库可用智能处理)",
-                font=('TkDefaultFont', 8),
-                foreground='red'
-            )
-            warning_label.pack(side=tk.LEFT, padx=(10, 0))
-        
-        # 智能推荐框架
-        self.recommend_frame = ttk.LabelFrame(gif_frame, text="智能推荐", padding="5")
-        self.recommend_frame.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
-        self.recommend_frame.columnconfigure(0, weight=1)
-        
-        # 推荐信息显示
-        self.recommend_text = tk.Text(self.recommend_frame, height=3, wrap=tk.WORD)
-        self.recommend_text.grid(row=0, column=0, sticky=(tk.W, tk.E))
-        self.recommend_text.insert(1.0, "请先获取视频信息以查看智能推荐")
-        self.recommend_text.config(state=tk.DISABLED)
-        
-        # 推荐按钮框架
-        recommend_btn_frame = ttk.Frame(self.recommend_frame)
-        recommend_btn_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
-        
-        self.recommend_buttons = []
-        
-        # 自定义分辨率
-        self.custom_frame = ttk.Frame(gif_frame)
-        self.custom_frame.grid(row=4, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=5)
-        
-        ttk.Label(self.custom_frame, text="自定义宽度:").pack(side=tk.LEFT)
-        self.custom_width_var = tk.StringVar(value="640")
-        ttk.Entry(self.custom_frame, textvariable=self.custom_width_var, width=8).pack(
-            side=tk.LEFT, padx=(5, 20)
-        )
-        
-        ttk.Label(self.custom_frame, text="高度:").pack(side=tk.LEFT)
-        self.custom_height_var = tk.StringVar(value="360")
-        ttk.Entry(self.custom_frame, textvariable=self.custom_height_var, width=8).pack(
-            side=tk.LEFT, padx=(5, 0)
-        )
-        
-        # 预估文件大小
-        ttk.Label(self.custom_frame, text="预估大小:").pack(side=tk.LEFT, padx=(20, 5))
-        self.size_estimate_label = ttk.Label(self.custom_frame, text="--")
-        self.size_estimate_label.pack(side=tk.LEFT)
-        
-        # 绑定事件
-        self.resolution_combo.bind('<<ComboboxSelected>>', self.on_resolution_change)
-        self.custom_width_var.trace('w', self.update_size_estimate)
-        self.custom_height_var.trace('w', self.update_size_estimate)
-        self.fps_var.trace('w', self.update_size_estimate)
-        self.quality_var.trace('w', self.update_size_estimate)
-        # 绑定时间变化事件，用于重新计算推荐
-        self.start_time_var.trace('w', self.on_time_change)
-        self.end_time_var.trace('w', self.on_time_change)
-        
-        self.custom_frame.pack_forget()  # 初始隐藏自定义分辨率
-        row += 1
-        
-        # 输出路径设置
-        output_frame = ttk.Frame(main_frame)
-        output_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
-        output_frame.columnconfigure(1, weight=1)
-        
-        ttk.Label(output_frame, text="输出路径:").grid(row=0, column=0, sticky=tk.W)
-        self.output_path_var = tk.StringVar(value=str(self.output_dir))
-        ttk.Entry(output_frame, textvariable=self.output_path_var).grid(
-            row=0, column=1, sticky=(tk.W, tk.E), padx=(5, 5)
-        )
-        ttk.Button(output_frame, text="浏览", command=self.browse_output_path).grid(
-            row=0, column=2
-        )
-        row += 1
-        
-        # 控制按钮
-        button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=row, column=0, columnspan=3, pady=20)
-        
-        self.convert_button = ttk.Button(
-            button_frame, text="开始转换", command=self.start_conversion
-        )
-        self.convert_button.pack(side=tk.LEFT, padx=(0, 10))
-        
-        self.stop_button = ttk.Button(
-            button_frame, text="停止转换", command=self.stop_conversion, state=tk.DISABLED
-        )
-        self.stop_button.pack(side=tk.LEFT)
-        row += 1
-        
-        # 进度条
-        self.progress_var = tk.StringVar(value="就绪")
-        ttk.Label(main_frame, textvariable=self.progress_var).grid(
-            row=row, column=0, columnspan=3, pady=5
-        )
-        row += 1
-        
-        self.progress_bar = ttk.Progressbar(
-            main_frame, mode='indeterminate'
-        )
-        self.progress_bar.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-        
-        # 初始化输入方式显示
-        self.on_input_method_change()
-    
-    def on_input_method_change(self):
-        """输入方式改变时的回调"""
-        if self.input_method_var.get() == "url":
-            self.url_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-            self.file_frame.grid_remove()
-            self.is_local_file = False
-        else:
-            self.file_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-            self.url_frame.grid_remove()
-            self.is_local_file = True
-    
-    def select_local_file(self):
-        """选择本地视频文件"""
-        file_types = [
-            ("视频文件", "*.mp4 *.avi *.mkv *.mov *.wmv *.flv *.webm *.m4v"),
-            ("所有文件", "*.*")
-        ]
-        
-        file_path = filedialog.askopenfilename(
-            title="选择视频文件",
-            filetypes=file_types
-        )
-        
-        if file_path:
-            self.file_path_var.set(file_path)
-            self.local_file_path = file_path
-            # 自动获取本地文件信息
-            self.get_video_info()
-    
-    def on_resolution_change(self, event):
-        """分辨率选择改变事件"""
-        if self.resolution_var.get() == "自定义":
-            self.custom_frame.pack(fill=tk.X, pady=5)
-        else:
-            self.custom_frame.pack_forget()
-        
-        # 更新压缩比例显示
-        self.update_compression_info()
-        self.update_size_estimate()
-    
-    def on_time_change(self, *args):
-        """时间设置改变时的回调"""
-        # 更新文件大小预估
-        self.update_size_estimate()
-        
-        # 如果有视频信息，重新计算推荐（延迟执行避免频繁计算）
-        if hasattr(self, 'video_info') and self.video_info:
-            # 取消之前的延迟任务
-            if hasattr(self, '_update_recommendations_job'):
-                self.root.after_cancel(self._update_recommendations_job)
-            
-            # 延迟500ms执行更新，避免用户快速输入时频繁计算
-            self._update_recommendations_job = self.root.after(500, self._delayed_update_recommendations)
-    
-    def _delayed_update_recommendations(self):
-        """延迟更新推荐"""
-        if hasattr(self, 'video_info') and self.video_info:
-            formats = self.video_info.get('formats', [])
-            best_video = None
-            for fmt in formats:
-                if fmt.get('vcodec') != 'none' and fmt.get('height'):
-                    if not best_video or fmt.get('height', 0) > best_video.get('height', 0):
-                        best_video = fmt
-            
-            if best_video and best_video.get('width') and best_video.get('height'):
-                self._suggest_gif_resolution(best_video.get('width'), best_video.get('height'))
-    
-    def update_compression_info(self):
-        """更新压缩比例信息"""
-        if not self.video_info:
-            self.compression_label.config(text="")
-            return
-        
-        # 获取视频原始分辨率
-        formats = self.video_info.get('formats', [])
-        best_video = None
-        for fmt in formats:
-            if fmt.get('vcodec') != 'none' and fmt.get('height'):
-                if not best_video or fmt.get('height', 0) > best_video.get('height', 0):
-                    best_video = fmt
-        
-        if not best_video:
-            return
-        
-        orig_width = best_video.get('width', 0)
-        orig_height = best_video.get('height', 0)
-        
-        if orig_width == 0 or orig_height == 0:
-            return
-        
-        # 获取目标分辨率
-        if self.resolution_var.get() == "自定义":
-            try:
-                target_width = int(self.custom_width_var.get())
-                target_height = int(self.custom_height_var.get())
-            except ValueError:
-                return
-        else:
-            try:
-                target_width, target_height = map(int, self.resolution_var.get().split('x'))
-            except ValueError:
-                return
-        
-        # 计算压缩比例和限制检查
-        compression_ratio = (target_width * target_height) / (orig_width * orig_height)
-        compression_percent = compression_ratio * 100
-        max_edge = max(target_width, target_height)
-        
-        # 构建显示文本
-        if compression_percent < 100:
-            text = f"压缩至 {compression_percent:.1f}%"
-            color = "green"
-        elif compression_percent == 100:
-            text = "原始大小"
-            color = "blue" 
-        else:
-            text = f"放大至 {compression_percent:.1f}%"
-            color = "orange"
-        
-        # 修改限制警告逻辑 - 只提示不拒绝
-        if max_edge > 500:
-            text += f" (提示: 超出推荐边长)"
-            color = "orange"  # 改为橙色提示而不是红色错误
-        
-        self.compression_label.config(text=text, foreground=color)
-    
-    def update_size_estimate(self, *args):
-        """更新文件大小预估"""
-        if not hasattr(self, 'video_info') or not self.video_info:
-            self.size_estimate_label.config(text="--")
-            return
-        
-        try:
-            # 获取参数
-            if self.resolution_var.get() == "自定义":
-                width = int(self.custom_width_var.get())
-                height = int(self.custom_height_var.get())
-            else:
-                width, height = map(int, self.resolution_var.get().split('x'))
-            
-            fps = int(self.fps_var.get())
-            start_time = float(self.start_time_var.get())
-            end_time = float(self.end_time_var.get())
-            quality = self.quality_var.get()
-            
-            # 计算持续时间
-            duration = end_time - start_time
-            
-            if duration <= 0:
-                self.size_estimate_label.config(text="--")
-                return
-            
-            # 根据质量获取颜色数
-            quality_colors = {"高": 256, "中": 128, "低": 64}.get(quality, 128)
-            
-            # 使用改进的文件大小预估
-            estimated_size_mb = self._estimate_gif_size(width, height, duration, fps, quality_colors)
-            
-            # 检查是否超过限制
-            max_edge = max(width, height)
-            
-            size_text = f"{estimated_size_mb:.1f}MB"
-            
-            # 修改警告标识 - 只提示不拒绝
-            warnings = []
-            if estimated_size_mb > 4.0:
-                warnings.append("大文件提示")
-            if max_edge > 500:
-                warnings.append("高分辨率")
-            
-            if warnings:
-                size_text += f" ({', '.join(warnings)})"
-                self.size_estimate_label.config(text=size_text, foreground="orange")  # 改为橙色提示
-            else:
-                size_text += " ✓"
-                self.size_estimate_label.config(text=size_text, foreground="green")
-            
-        except (ValueError, ZeroDivisionError):
-            self.size_estimate_label.config(text="--")
-    
-    def browse_output_path(self):
-        """浏览输出路径"""
-        path = filedialog.askdirectory(initialdir=self.output_path_var.get())
-        if path:
-            self.output_path_var.set(path)
-    
-    def get_video_info(self):
-        """获取视频信息"""
-        if self.is_local_file:
-            # 处理本地文件
-            if not self.local_file_path or not os.path.exists(self.local_file_path):
-                messagebox.showerror("错误", "请选择有效的本地视频文件")
-                return
-            file_path = self.local_file_path
-        else:
-            # 处理在线链接
-            url = self.url_var.get().strip()
-            if not url:
-                messagebox.showerror("错误", "请输入视频链接")
-                return
-            
-            if not self.is_bilibili_url(url):
-                messagebox.showerror("错误", "请输入有效的bilibili视频链接")
-                return
-            file_path = url
-        
-        self.progress_var.set("获取视频信息中...")
-        self.progress_bar.start()
-        
-        # 在新线程中获取视频信息
-        threading.Thread(target=self._get_video_info_thread, args=(file_path,), daemon=True).start()
-    
-    def is_bilibili_url(self, url):
-        """检查是否为bilibili链接"""
-        bilibili_patterns = [
-            r'bilibili\.com/video/[ABab][Vv]\w+',
-            r'b23\.tv/\w+',
-            r'bilibili\.com/video/BV\w+',
-            r'bilibili\.com/video/av\d+'
-        ]
-        return any(re.search(pattern, url) for pattern in bilibili_patterns)
-    
-    def _get_video_info_thread(self, source):
-        """获取视频信息线程"""
-        try:
-            if self.is_local_file:
-                # 处理本地文件
-                self._get_local_video_info(source)
-            else:
-                # 处理在线链接
-                import yt_dlp
-                
-                ydl_opts = {
-                    'quiet': False,
-                    'no_warnings': False,
-                    # 添加用户代理
-                    'http_headers': {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                    }
-                }
-                
-                print(f"正在获取视频信息: {source}")
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(source, download=False)
-                    self.video_info = info
-                    
-                    print(f"视频标题: {info.get('title', '未知')}")
-                    print(f"视频时长: {info.get('duration', 0)}秒")
-                    
-                    # 显示可用格式信息
-                    formats = info.get('formats', [])
-                    print(f"可用格式数量: {len(formats)}")
-                    
-                    for i, fmt in enumerate(formats[:5]):  # 只显示前5个格式
-                        print(f"格式{i+1}: {fmt.get('format_id', 'unknown')} - "
-                              f"{fmt.get('ext', 'unknown')} - "
-                              f"{fmt.get('width', '?')}x{fmt.get('height', '?')} - "
-                              f"{fmt.get('vcodec', 'unknown')}")
-                    
-                    # 更新GUI
-                    self.root.after(0, self._update_video_info, info)
-                
-        except Exception as e:
-            error_msg = str(e)
-            print(f"获取视频信息失败: {error_msg}")
-            self.logger.error(f"获取视频信息失败: {error_msg}")
-            self.root.after(0, lambda msg=error_msg: messagebox.showerror("错误", f"获取视频信息失败: {msg}"))
-        finally:
-            self.root.after(0, self._stop_progress)
-    
-    def _get_local_video_info(self, file_path):
-        """获取本地视频信息"""
-        try:
-            if CV2_AVAILABLE:
-                # 使用OpenCV获取视频信息
-                cap = cv2.VideoCapture(file_path)
-                if not cap.isOpened():
-                    raise Exception(f"无法打开视频文件: {file_path}")
-                
-                # 获取基本信息
-                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps = cap.get(cv2.CAP_PROP_FPS)
-                frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                duration = frame_count / fps if fps > 0 else 0
-                
-                cap.release()
-                
-                # 构建伪造的info结构以兼容现有代码
-                file_name = Path(file_path).stem
-                self.video_info = {
-                    'title': file_name,
-                    'duration': duration,
-                    'uploader': '本地文件',
-                    'formats': [{
-                        'width': width,
-                        'height': height,
-                        'fps': fps,
-                        'vcodec': 'unknown',
-                        'ext': Path(file_path).suffix[1:]
-                    }]
-                }
-                
-                print(f"本地视频信息: {width}x{height}, {duration:.1f}秒")
-                
-            else:
-                # 如果没有OpenCV，使用ffprobe
-                try:
-                    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', file_path]
-                    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                    probe_data = json.loads(result.stdout)
-                    
-                    # 找到视频流
-                    video_stream = None
-                    for stream in probe_data.get('streams', []):
-                        if stream.get('codec_type') == 'video':
-                            video_stream = stream
-                            break
-                    
-                    if not video_stream:
-                        raise Exception("未找到视频流")
-                    
-                    width = int(video_stream.get('width', 0))
-                    height = int(video_stream.get('height', 0))
-                    duration = float(probe_data.get('format', {}).get('duration', 0))
-                    fps = eval(video_stream.get('r_frame_rate', '0/1'))
-                    
-                    file_name = Path(file_path).stem
-                    self.video_info = {
-                        'title': file_name,
-                        'duration': duration,
-                        'uploader': '本地文件',
-                        'formats': [{
-                            'width': width,
-                            'height': height,
-                            'fps': fps,
-                            'vcodec': video_stream.get('codec_name', 'unknown'),
-                            'ext': Path(file_path).suffix[1:]
-                        }]
-                    }
-                    
-                except (subprocess.CalledProcessError, FileNotFoundError, json.JSONDecodeError):
-                    # 如果ffprobe也失败，使用基本信息
-                    file_name = Path(file_path).stem
-                    file_size = os.path.getsize(file_path) / (1024*1024)  # MB
-                    
-                    self.video_info = {
-                        'title': file_name,
-                        'duration': 60,  # 假设60秒
-                        'uploader': '本地文件',
-                        'formats': [{
-                            'width': 1920,  # 假设1080p
-                            'height': 1080,
-                            'fps': 25,
-                            'vcodec': 'unknown',
-                            'ext': Path(file_path).suffix[1:]
-                        }]
-                    }
-                    
-                    print(f"无法获取详细信息，使用默认值. 文件大小: {file_size:.1f}MB")
-            
-            # 更新GUI
-            self.root.after(0, self._update_video_info, self.video_info)
-            
-        except Exception as e:
-            error_msg = f"读取本地视频失败: {str(e)}"
-            print(error_msg)
-            self.root.after(0, lambda msg=error_msg: messagebox.showerror("错误", msg))
-    
-    def _update_video_info(self, info):
-        """更新视频信息显示"""
-        self.info_text.delete(1.0, tk.END)
-        
-        title = info.get('title', '未知')
-        duration = info.get('duration', 0) or 0  # 确保duration不为None
-        uploader = info.get('uploader', '未知')
-        
-        # 获取最佳视频格式信息
-        formats = info.get('formats', [])
-        best_video = None
-        for fmt in formats:
-            if fmt.get('vcodec') != 'none' and fmt.get('height'):
-                if not best_video or fmt.get('height', 0) > best_video.get('height', 0):
-                    best_video = fmt
-        
-        width = best_video.get('width', '未知') if best_video else '未知'
-        height = best_video.get('height', '未知') if best_video else '未知'
-        
-        # 将duration转换为整数进行格式化
-        duration_int = int(duration) if isinstance(duration, (int, float)) else 0
-        minutes = duration_int // 60
-        seconds = duration_int % 60
-        
-        info_text = f"标题: {title}\n"
-        info_text += f"时长: {minutes}:{seconds:02d}\n"
-        info_text += f"UP主: {uploader}\n"
-        info_text += f"分辨率: {width}x{height}"
-        
-        self.info_text.insert(1.0, info_text)
-        
-        # 自动设置结束时间
-        if duration and duration > 0:
-            # 设置为视频长度和10秒中的较小值
-            end_time = min(int(duration), 10)
-            self.end_time_var.set(str(end_time))
-        
-        # 根据视频分辨率推荐GIF分辨率
-        if best_video and best_video.get('width') and best_video.get('height'):
-            self._suggest_gif_resolution(best_video.get('width'), best_video.get('height'))
-        else:
-            # 如果没有找到视频信息，显示默认提示
-            self.recommend_text.config(state=tk.NORMAL)
-            self.recommend_text.delete(1.0, tk.END)
-            self.recommend_text.insert(1.0, "无法获取视频分辨率信息，请手动选择GIF分辨率")
-            self.recommend_text.config(state=tk.DISABLED)
-    
-    def _suggest_gif_resolution(self, video_width, video_height):
-        """根据视频分辨率智能推荐GIF分辨率 - 限制最大边500px，文件大小4MB"""
-        if video_width == 0 or video_height == 0:
-            return
-        
-        aspect_ratio = video_width / video_height
-        
-        # 获取当前时长设置用于文件大小计算
-        try:
-            duration = float(self.end_time_var.get()) - float(self.start_time_var.get())
-            fps = int(self.fps_var.get())
-        except (ValueError, AttributeError):
-            duration = 10  # 默认值
-            fps = 20  # 提高默认帧率
-        
-        if duration <= 0:
-            duration = 10
-        
-        # 生成智能推荐选项
-        recommendations = []
-        
-        # 1. 计算最大边为500的分辨率（最高质量选项）
-        if video_width >= video_height:  # 横屏视频
-            max_width = min(500, video_width)
-            max_height = int(max_width / aspect_ratio)
-        else:  # 竖屏视频
-            max_height = min(500, video_height)
-            max_width = int(max_height * aspect_ratio)
-        
-        # 确保尺寸为偶数
-        max_width = max_width if max_width % 2 == 0 else max_width - 1
-        max_height = max_height if max_height % 2 == 0 else max_height - 1
-        
-        # 2. 生成不同质量级别的推荐
-        quality_levels = [
-            {"name": "最佳质量", "scale": 1.0, "colors": 256, "quality_desc": "高"},
-            {"name": "推荐", "scale": 0.8, "colors": 192, "quality_desc": "中"},
-            {"name": "标准", "scale": 0.65, "colors": 128, "quality_desc": "中"},
-            {"name": "小文件", "scale": 0.5, "colors": 96, "quality_desc": "低"}
-        ]
-        
-        for level in quality_levels:
-            # 计算该级别的分辨率
-            width = int(max_width * level["scale"])
-            height = int(max_height * level["scale"])
-            
-            # 确保尺寸为偶数且不小于最小值
-            width = max(width if width % 2 == 0 else width - 1, 160)
-            height = max(height if height % 2 == 0 else height - 1, 90)
-            
-            # 预估文件大小
-            estimated_size_mb = self._estimate_gif_size(width, height, duration, fps, level["colors"])
-            
-            # 计算相对于原视频的压缩比
-            compression = (width * height) / (video_width * video_height)
-            
-            recommendations.append({
-                'width': width,
-                'height': height,
-                'name': level["name"],
-                'desc': f'{width}x{height}',
-                'size_mb': estimated_size_mb,
-                'compression': compression,
-                'colors': level["colors"],
-                'quality': level["quality_desc"],
-                'is_recommended': level["name"] == "推荐"
-            })
-        
-        # 3. 去重并排序（按分辨率大小排序，最大的在前面）
-        seen = set()
-        unique_recommendations = []
-        for rec in recommendations:
-            key = (rec['width'], rec['height'])
-            if key not in seen:
-                seen.add(key)
-                unique_recommendations.append(rec)
-        
-        # 按分辨率大小排序（从大到小）
-        unique_recommendations.sort(key=lambda x: x['width'] * x['height'], reverse=True)
-        
-        # 更新UI
-        self._update_recommendations_ui(unique_recommendations, video_width, video_height, duration)
-        
-        # 自动选择推荐的分辨率
-        if unique_recommendations:
-            # 优先选择标记为推荐的，否则选择第一个
-            best_rec = None
-            for rec in unique_recommendations:
-                if rec.get('is_recommended'):
-                    best_rec = rec
-                    break
-            
-            if not best_rec:
-                best_rec = unique_recommendations[0]
-            
-            self.resolution_var.set(f"{best_rec['width']}x{best_rec['height']}")
-            self.custom_width_var.set(str(best_rec['width']))
-            self.custom_height_var.set(str(best_rec['height']))
-            
-            # 根据推荐自动设置质量
-            if best_rec['colors'] >= 200:
-                self.quality_var.set("高")
-            elif best_rec['colors'] >= 128:
-                self.quality_var.set("中")
-            else:
-                self.quality_var.set("低")
-        
-        # 更新压缩信息
-        self.update_compression_info()
-        self.update_size_estimate()
-    
-    def _estimate_gif_size(self, width, height, duration, fps, colors):
-        """预估GIF文件大小（MB）"""
-        # GIF文件大小预估算法
-        # 基于：分辨率 × 时长 × 帧率 × 颜色数量
-        
-        total_frames = duration * fps
-        pixels_per_frame = width * height
-        
-        # 颜色数量影响系数
-        color_factor = colors / 256
-        
-        # 基础字节数每像素（经验值）
-        base_bytes_per_pixel = 0.8
-        
-        # GIF压缩效率（相邻帧的相似性）
-        compression_efficiency = 0.4  # GIF压缩通常能减少60%的重复数据
-        
-        # 计算估算大小
-        estimated_bytes = (pixels_per_frame * total_frames * base_bytes_per_pixel * 
-                          color_factor * compression_efficiency)
-        
-        # 添加文件头和调色板开销
-        overhead_bytes = 1024 + (colors * 3)  # 文件头 + 调色板
-        
-        total_bytes = estimated_bytes + overhead_bytes
-        
-        # 转换为MB
-        size_mb = total_bytes / (1024 * 1024)
-        
-        return size_mb
-    
-    def _update_recommendations_ui(self, recommendations, orig_width, orig_height, duration=10):
-        """更新推荐UI"""
-        # 清除旧的推荐按钮
-        for btn in self.recommend_buttons:
-            btn.destroy()
-        self.recommend_buttons.clear()
-        
-        # 更新推荐文本
-        self.recommend_text.config(state=tk.NORMAL)
-        self.recommend_text.delete(1.0, tk.END)
-        
-        max_edge = max(orig_width, orig_height)
-        info_text = f"视频分辨率: {orig_width}x{orig_height} (最大边: {max_edge}px)\n"
-        info_text += f"时长: {duration:.1f}秒 | 建议: 最大边≤500px, 文件≤4MB\n"
-        
-        if recommendations:
-            info_text += f"为您推荐 {len(recommendations)} 个优化GIF配置:"
-        else:
-            info_text += "无法生成推荐配置，请手动调整参数"
-        
-        self.recommend_text.insert(1.0, info_text)
-        self.recommend_text.config(state=tk.DISABLED)
-        
-        # 创建推荐按钮
-        if not recommendations:
-            return
-            
-        btn_frame = ttk.Frame(self.recommend_frame)
-        btn_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
-        
-        # 计算按钮列数（最多4列）
-        num_buttons = min(len(recommendations), 4)
-        for i in range(num_buttons):
-            btn_frame.columnconfigure(i, weight=1)
-        
-        for i, rec in enumerate(recommendations[:4]):  # 最多显示4个推荐
-            # 构建按钮文本
-            compression_percent = rec['compression'] * 100
-            max_edge = max(rec['width'], rec['height'])
-            
-            btn_text = f"{rec['name']}\n"
-            btn_text += f"{rec['desc']}\n"
-            btn_text += f"≈{rec['size_mb']:.1f}MB"
-            
-            # 如果是推荐选项，添加标识
-            if rec.get('is_recommended'):
-                btn_text = f"⭐ {btn_text}"
-            
-            btn = ttk.Button(
-                btn_frame, 
-                text=btn_text,
-                command=lambda r=rec: self._apply_recommendation(r),
-                width=15
-            )
-            btn.grid(row=0, column=i, padx=(0, 5) if i < 3 else (0, 0), sticky=(tk.W, tk.E))
-            self.recommend_buttons.append(btn)
-        
-        # 如果有更多推荐，显示提示
-        if len(recommendations) > 4:
-            info_label = ttk.Label(
-                btn_frame, 
-                text=f"(还有{len(recommendations)-4}个选项可在自定义中设置)",
-                font=('TkDefaultFont', 8),
-                foreground='gray'
-            )
-            info_label.grid(row=1, column=0, columnspan=4, pady=(5, 0))
-    
-    def _apply_recommendation(self, recommendation):
-        """应用推荐的分辨率"""
-        width = recommendation['width']
-        height = recommendation['height']
-        
-        # 更新下拉框选项，如果不存在则添加
-        current_values = list(self.resolution_combo['values'])
-        new_resolution = f"{width}x{height}"
-        
-        if new_resolution not in current_values[:-1]:  # 排除"自定义"选项
-            current_values.insert(-1, new_resolution)  # 在"自定义"前插入
-            self.resolution_combo['values'] = current_values
-        
-        # 设置选中的分辨率
-        self.resolution_var.set(new_resolution)
-        self.custom_width_var.set(str(width))
-        self.custom_height_var.set(str(height))
-        
-        # 根据推荐自动设置质量
-        if 'quality' in recommendation and recommendation['quality'] in ['高', '中', '低']:
-            self.quality_var.set(recommendation['quality'])
-        elif 'colors' in recommendation:
-            if recommendation['colors'] >= 200:
-                self.quality_var.set("高")
-            elif recommendation['colors'] >= 128:
-                self.quality_var.set("中")
-            else:
-                self.quality_var.set("低")
-        
-        # 隐藏自定义框架
-        self.custom_frame.pack_forget()
-        
-        # 更新相关信息
-        self.update_compression_info()
-        self.update_size_estimate()
-        
-        # 视觉反馈 - 临时高亮选中的按钮
-        for btn in self.recommend_buttons:
-            btn.config(state=tk.NORMAL)
-        
-        # 临时禁用选中的按钮表示已选择
-        for btn in self.recommend_buttons:
-            if f"{width}x{height}" in btn.cget('text'):
-                original_text = btn.cget('text')
-                btn.config(text=f"✓ 已选择\n{width}x{height}", state=tk.DISABLED)
-                # 2秒后恢复原始文本
-                self.root.after(2000, lambda b=btn, t=original_text: (
-                    b.config(text=t, state=tk.NORMAL)
-                ))
-                break
-    
-    def _stop_progress(self):
-        """停止进度条"""
-        self.progress_bar.stop()
-        self.progress_var.set("就绪")
-    
-    def _validate_conversion_params(self, width, height, fps, duration, estimated_size_mb):
-        """验证转换参数是否合理 - 修改为只警告不拒绝"""
-        warnings = []
-        errors = []
-        
-        # 检查基础参数
-        if width <= 0 or height <= 0:
-            errors.append("分辨率必须大于0")
-        
-        if fps <= 0 or fps > 60:
-            errors.append("帧率必须在1-60之间")
-        
-        if duration <= 0:
-            errors.append("时长必须大于0")
-        
-        # 修改分辨率和文件大小检查 - 只警告不拒绝
-        max_edge = max(width, height)
-        if max_edge > 800:
-            warnings.append(f"分辨率很大({max_edge}px)，转换可能较慢，建议使用推荐设置")
-        elif max_edge > 500:
-            warnings.append(f"分辨率较大({max_edge}px)，转换可能较慢")
-        
-        # 检查文件大小 - 只警告不拒绝
-        if estimated_size_mb > 10:
-            warnings.append(f"预估文件很大({estimated_size_mb:.1f}MB)，转换可能较慢且占用较多空间")
-        elif estimated_size_mb > 4:
-            warnings.append(f"预估文件较大({estimated_size_mb:.1f}MB)，转换可能较慢")
-        
-        # 检查帧数
-        total_frames = duration * fps
-        if total_frames > 500:
-            warnings.append(f"总帧数较多({int(total_frames)}帧)，转换可能较慢")
-        
-        return warnings, errors
-    
-    def start_conversion(self):
-        """开始转换"""
-        if self.is_converting:
-            return
-        
-        # 验证输入
-        if not self.video_info:
-            messagebox.showerror("错误", "请先获取视频信息")
-            return
-        
-        try:
-            start_time = float(self.start_time_var.get())
-            end_time = float(self.end_time_var.get())
-            fps = int(self.fps_var.get())
-            
-            if start_time >= end_time:
-                messagebox.showerror("错误", "开始时间必须小于结束时间")
-                return
-            
-            duration = end_time - start_time
-            
-        except ValueError:
-            messagebox.showerror("错误", "请输入有效的数字")
-            return
-        
-        # 获取分辨率
-        if self.resolution_var.get() == "自定义":
-            try:
-                width = int(self.custom_width_var.get())
-                height = int(self.custom_height_var.get())
-            except ValueError:
-                messagebox.showerror("错误", "请输入有效的自定义分辨率")
-                return
-        else:
-            width, height = map(int, self.resolution_var.get().split('x'))
-        
-        # 预估文件大小用于参数验证
-        quality_colors = {"高": 256, "中": 128, "低": 64}.get(self.quality_var.get(), 128)
-        estimated_size_mb = self._estimate_gif_size(width, height, duration, fps, quality_colors)
-        
-        # 验证转换参数
-        warnings, errors = self._validate_conversion_params(width, height, fps, duration, estimated_size_mb)
-        
-        if errors:
-            messagebox.showerror("参数错误", "\n".join(errors))
-            return
-        
-        if warnings:
-            warning_msg = "\n".join(warnings) + "\n\n是否继续转换？"
-            if not messagebox.askyesno("参数提示", warning_msg):
-                return
-        
-        # 检查输出路径
-        output_path = Path(self.output_path_var.get())
-        if not output_path.exists():
-            try:
-                output_path.mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                messagebox.showerror("错误", f"无法创建输出目录: {str(e)}")
-                return
-        
-        # 开始转换
-        self.is_converting = True
-        self.convert_button.config(state=tk.DISABLED)
-        self.stop_button.config(state=tk.NORMAL)
-        self.progress_bar.start()
-        
-        # 转换参数
-        conversion_params = {
-            'source': self.local_file_path if self.is_local_file else self.url_var.get(),
-            'is_local_file': self.is_local_file,
-            'start_time': start_time,
-            'end_time': end_time,
-            'width': width,
-            'height': height,
-            'fps': fps,
-            'quality': self.quality_var.get(),
-            'output_path': output_path,
-            'remove_black_borders': self.auto_crop_var.get(),
-            'remove_watermark': self.remove_watermark_var.get()
-        }
-        
-        # 启动转换线程
-        self.conversion_thread = threading.Thread(
-            target=self._conversion_thread, 
-            args=(conversion_params,), 
-            daemon=True
-        )
-        self.conversion_thread.start()
-    
-    def stop_conversion(self):
-        """停止转换"""
-        self.is_converting = False
-        self.progress_var.set("正在停止...")
-    
-    def _conversion_thread(self, params):
-        """转换线程 - 使用优化的转换方法"""
-        try:
-            if params['is_local_file']:
-                # 处理本地文件
-                self.root.after(0, lambda: self.progress_var.set("处理本地视频中..."))
-                temp_video = params['source']
-            else:
-                # 处理在线链接
-                import yt_dlp
-                
-                self.root.after(0, lambda: self.progress_var.set("下载视频中..."))
-                
-                # 生成时间戳和文件名
-                timestamp = int(time.time())
-                
-                # 临时视频文件 - 让yt-dlp决定扩展名
-                temp_video_base = self.temp_dir / f"temp_video_{timestamp}"
-                
-                # 修复的下载策略 - 优先选择单一格式，避免需要合并的格式
-                download_success = False
-                temp_video = None
-                
-                # 优化的格式选择策略 - 避免需要合并的格式
-                format_options = [
-                    # 优先选择单一的完整格式，不需要合并
-                    'best[ext=mp4][vcodec!=none][acodec!=none]',  # 优先mp4完整格式
-                    'best[vcodec!=none][acodec!=none]',  # 任何完整格式
-                    'best[ext=flv]',  # bilibili经常有flv格式
-                    'worst[height>=360][vcodec!=none][acodec!=none]',  # 至少360p的完整格式
-                    # 如果都没有，选择仅视频格式（无音频也可以转GIF）
-                    'best[vcodec!=none]',  
-                    'bestvideo[ext=mp4]',
-                    'bestvideo',
-                    # 最后的备选方案
-                    'best'
-                ]
-                
-                for format_selector in format_options:
-                    ydl_opts = {
-                        'outtmpl': str(temp_video_base) + '.%(ext)s',
-                        'quiet': False,
-                        'no_warnings': False,
-                        'format': format_selector,
-                        # 关键：不要尝试合并格式
-                        'noplaylist': True,
-                        'no_check_certificates': True,
-                        'http_headers': {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                        }
-                    }
-                    
-                    try:
-                        print(f"尝试格式: {format_selector}")
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            ydl.download([params['source']])
-                        
-                        # 查找实际下载的文件
-                        temp_video = None
-                        for file in self.temp_dir.glob(f"temp_video_{timestamp}*"):
-                            if file.is_file() and file.stat().st_size > 1024:  # 至少1KB
-                                temp_video = file
-                                print(f"找到下载文件: {temp_video}")
-                                break
-                        
-                        if temp_video and temp_video.exists():
-                            file_size = temp_video.stat().st_size / (1024*1024)
-                            print(f"下载成功! 文件: {temp_video.name}, 大小: {file_size:.2f}MB")
-                            download_success = True
-                            break
-                        else:
-                            print(f"格式 '{format_selector}' 下载后未找到有效文件")
-                        
-                    except Exception as format_error:
-                        print(f"格式 '{format_selector}' 下载失败: {str(format_error)}")
-                        continue
-                
-                if not download_success or not temp_video:
-                    error_msg = ("无法下载视频，可能的原因：\n"
-                                "1. 网络连接问题\n"
-                                "2. 视频链接无效或已失效\n"
-                                "3. bilibili限制访问\n"
-                                "4. 视频需要登录或有地区限制\n"
-                                "\n建议：检查网络连接或尝试其他视频链接")
-                    raise Exception(error_msg)
-            
-            if not self.is_converting:
-                return
-            
-            self.root.after(0, lambda: self.progress_var.set("转换为GIF中..."))
-            
-            # 生成输出文件名
-            timestamp = int(time.time())
-            safe_title = re.sub(r'[^\w\s-]', '', self.video_info.get('title', 'video'))
-            safe_title = re.sub(r'[-\s]+', '-', safe_title)
-            output_file = params['output_path'] / f"{safe_title}_{timestamp}.gif"
-            
-            # 使用优化的转换方法
-            self._convert_with_super_optimized_method(
-                str(temp_video),
-                str(output_file),
-                params['start_time'],
-                params['end_time'],
-                params['width'],
-                params['height'],
-                params['fps'],
-                params['quality'],
-                params['remove_black_borders'],
-                params['remove_watermark']
-            )
-            
-            # 清理临时文件（只清理下载的文件，不清理本地文件）
-            if not params['is_local_file'] and temp_video and temp_video.exists():
-                try:
-                    temp_video.unlink()
-                except:
-                    pass
-            
-            if self.is_converting:
-                self.root.after(0, lambda: self._conversion_complete(output_file))
-            
-        except Exception as e:
-            error_msg = str(e)
-            self.logger.error(f"转换失败: {error_msg}")
-            self.root.after(0, lambda msg=error_msg: self._conversion_error(msg))
-        finally:
-            self.root.after(0, self._conversion_finished)
-    
-    def _convert_with_super_optimized_method(self, input_file, output_file, start_time, end_time, width, height, fps, quality, remove_black_borders, remove_watermark):
-        """进行转换"""
-        try:
-            from PIL import Image
-            
-            # 质量设置
-            quality_colors = {"高": 256, "中": 128, "低": 64}.get(quality, 128)
-            
-            # 进度回调函数
-            def progress_callback(msg):
-                if self.is_converting:  # 只有在转换状态才更新进度
-                    self.root.after(0, lambda m=msg: self.progress_var.set(m))
-            
-            # 如果需要智能处理且OpenCV可用
-            crop_params = None
-            if (remove_black_borders or remove_watermark) and CV2_AVAILABLE:
-                print("使用智能裁切方法")
-                
-                # 快速分析裁切参数 - 只分析1帧以提高速度
-                cap = cv2.VideoCapture(input_file)
-                if not cap.isOpened():
-                    raise Exception(f"无法打开视频文件: {input_file}")
-                
-                # 设置到开始位置并分析1帧
-                cap.set(cv2.CAP_PROP_POS_MSEC, (start_time + (end_time - start_time) / 2) * 1000)  # 分析中间帧
-                ret, frame = cap.read()
-                cap.release()
-                
-                if ret:
-                    crop_top, crop_bottom, crop_left, crop_right = VideoProcessor.calculate_smart_crop(
-                        frame, remove_black_borders, remove_watermark
-                    )
-                    crop_params = (crop_top, crop_bottom, crop_left, crop_right)
-                    print(f"智能裁切参数: top={crop_params[0]}, bottom={crop_params[1]}, left={crop_params[2]}, right={crop_params[3]}")
-                    
-                    # 立即清理
-                    del frame
-                    gc.collect()
-            
-            # 使用优化的帧处理器
-            frames = self.frame_processor.extract_and_process_frames_optimized(
-                input_file, start_time, end_time, fps, 
-                width, height, quality_colors, 
-                crop_params, progress_callback
-            )
-            
-            if not frames or not self.is_converting:
-                raise Exception("帧提取失败或转换被取消")
-            
-            #优化的GIF保存
-            progress_callback("保存GIF文件中...")
-            print(f"开始保存GIF，共 {len(frames)} 帧")
-            
-            # 使用最优化的保存参数
-            frame_duration = max(20, int(1000 / fps))  # 最小20ms避免太快
-            
-            # 根据质量选择最佳保存策略
-            if quality == "高" and len(frames) < 100:
-                # 高质量且帧数不多时，使用最佳质量保存
-                save_kwargs = {
-                    'save_all': True,
-                    'append_images': frames[1:],
-                    'duration': frame_duration,
-                    'loop': 0,
-                    'optimize': True,
-                    'disposal': 2  # 恢复到背景色，减少文件大小
-                }
-            else:
-                # 其他情况使用平衡的保存参数
-                save_kwargs = {
-                    'save_all': True,
-                    'append_images': frames[1:],
-                    'duration': frame_duration,
-                    'loop': 0,
-                    'optimize': True,
-                    'disposal': 2
-                }
-            
-            # 保存GIF
-            try:
-                frames[0].save(output_file, **save_kwargs)
-            except Exception as save_error:
-                # 如果保存失败，尝试降低质量保存
-                print(f"保存失败，尝试降低质量: {save_error}")
-                # 重新量化所有帧为更少颜色
-                reduced_frames = []
-                for frame in frames:
-                    if hasattr(frame, 'quantize'):
-                        reduced_frame = frame.quantize(colors=min(64, quality_colors))
-                        reduced_frames.append(reduced_frame)
-                    else:
-                        reduced_frames.append(frame)
-                
-                # 尝试用减少的颜色保存
-                save_kwargs['append_images'] = reduced_frames[1:]
-                reduced_frames[0].save(output_file, **save_kwargs)
-            
-            # 立即清理内存
-            del frames
-            if 'reduced_frames' in locals():
-                del reduced_frames
-            gc.collect()
-            
-            if not Path(output_file).exists() or Path(output_file).stat().st_size == 0:
-                raise Exception("GIF保存失败")
-            
-            file_size = Path(output_file).stat().st_size / (1024 * 1024)
-            print(f"GIF转换完成，文件大小: {file_size:.2f}MB")
-                
-        except Exception as e:
-            print(f"优化转换失败: {str(e)}")
-            raise
-    
-    def _conversion_complete(self, output_file):
-        """转换完成"""
-        self.progress_var.set("转换完成")
-        messagebox.showinfo("完成", f"GIF已保存到: {output_file}")
-        
-        # 询问是否打开文件夹
-        if messagebox.askyesno("打开文件夹", "是否打开输出文件夹？"):
-            try:
-                if os.name == 'nt':  # Windows
-                    os.startfile(output_file.parent)
-                elif os.name == 'posix':  # macOS和Linux
-                    subprocess.run(['open' if sys.platform == 'darwin' else 'xdg-open', output_file.parent])
-            except Exception as e:
-                print(f"无法打开文件夹: {e}")
-    
-    def _conversion_error(self, error_msg):
-        """转换错误"""
-        self.progress_var.set("转换失败")
-        messagebox.showerror("错误", f"转换失败: {error_msg}")
-    
-    def _conversion_finished(self):
-        """转换结束清理"""
-        self.is_converting = False
-        self.convert_button.config(state=tk.NORMAL)
-        self.stop_button.config(state=tk.DISABLED)
-        self.progress_bar.stop()
-        if not self.progress_var.get().startswith("转换"):
-            self.progress_var.set("就绪")
-
-def main():
-    """主函数"""
-    print("启动 Bilibili视频转GIF工具By:丶樱流")
-    
-    # 设置环境变量解决Windows编码问题
-    if os.name == 'nt':
-        os.environ['PYTHONIOENCODING'] = 'utf-8'
-        try:
-            import locale
-            locale.setlocale(locale.LC_ALL, 'C.UTF-8')
-        except:
-            try:
-                locale.setlocale(locale.LC_ALL, '.UTF8')
-            except:
-                os.environ['LC_ALL'] = 'C.UTF-8'
-    
-    # 检查并安装依赖库
-    try:
-        LibraryInstaller.check_and_install_packages()
-    except Exception as e:
-        print(f"库检查过程中出现错误: {e}")
-        print("尝试继续运行...")
-    
-    # 创建GUI
-    root = tk.Tk()
-    app = BilibiliToGifConverter(root)
-    
-    try:
-        root.mainloop()
-    except KeyboardInterrupt:
-        pass
-
-if __name__ == "__main__":
-    main()
+# Bilibili视频转GIF工具By:丶樱流
+# 支持下载bilibili视频并转换为GIF动图，新增本地视频上传功能
+# 新增功能：自动识别和移除黑边、bilibili水印，支持本地视频文件
+# 25-9-19优化版本：大幅提升GIF转换速度
+import os
+import sys
+import subprocess
+import shutil
+import threading
+import time
+import json
+import io
+import struct
+import hashlib
+import uuid
+import copy
+from contextlib import redirect_stdout, nullcontext
+import logging
+import locale
+from pathlib import Path
+import re
+from urllib.parse import urlparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import tempfile
+import gc
+
+# tkinter在启动图形界面时才导入，命令行模式不加载GUI
+tk = ttk = filedialog = messagebox = None
+
+def _load_tkinter():
+    """导入tkinter模块（仅图形界面模式）"""
+    global tk, ttk, filedialog, messagebox
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+
+# 显示控制台窗口（命令行模式直接使用当前终端）
+if os.name == 'nt' and '--cli' not in sys.argv[1:]:  # Windows系统
+    import ctypes
+    try:
+        # 分配新的控制台
+        ctypes.windll.kernel32.AllocConsole()
+        # 重定向标准输出到控制台
+        sys.stdout = open('CONOUT$', 'w', encoding='utf-8')
+        sys.stderr = open('CONOUT$', 'w', encoding='utf-8')
+        print("控制台已启用")
+    except:
+        pass
+
+class LibraryInstaller:
+    """库安装器"""
+    
+    # 格式: (安装包名, 导入名)
+    REQUIRED_PACKAGES = [
+        ('yt-dlp', 'yt_dlp'),
+        ('Pillow', 'PIL'),
+        ('requests', 'requests'),
+        ('opencv-python', 'cv2'),
+        ('numpy', 'numpy')
+    ]
+    
+    CHINA_MIRRORS = [
+        'https://pypi.tuna.tsinghua.edu.cn/simple/',
+        'https://mirrors.aliyun.com/pypi/simple/',
+        'https://pypi.mirrors.ustc.edu.cn/simple/',
+        'https://pypi.douban.com/simple/'
+    ]
+    
+    @classmethod
+    def check_and_install_packages(cls):
+        """检查并安装所需包"""
+        missing_packages = []
+        
+        for install_name, import_name in cls.REQUIRED_PACKAGES:
+            try:
+                __import__(import_name)
+                print(f"✓ {install_name} 已安装")
+            except ImportError:
+                print(f"✗ {install_name} 未安装")
+                missing_packages.append(install_name)
+        
+        if missing_packages:
+            # 创建一个简单的对话框让用户选择
+            root = tk.Tk()
+            root.withdraw()  # 隐藏主窗口
+            
+            result = messagebox.askyesnocancel(
+                "缺少依赖库", 
+                f"检测到缺少以下库：{', '.join(missing_packages)}\n\n"
+                f"点击'是'自动安装\n"
+                f"点击'否'跳过检查继续运行\n"
+                f"点击'取消'退出程序"
+            )
+            
+            root.destroy()
+            
+            if result is True:  # 是 - 安装
+                cls._install_packages(missing_packages)
+            elif result is False:  # 否 - 跳过
+                print("跳过库检查，继续运行...")
+                return
+            else:  # 取消 - 退出
+                sys.exit(1)
+    
+    @classmethod
+    def _install_packages(cls, packages):
+        """安装包"""
+        for package in packages:
+            success = False
+            
+            # 首先尝试默认源
+            try:
+                subprocess.check_call([
+                    sys.executable, '-m', 'pip', 'install', package
+                ])
+                success = True
+            except subprocess.CalledProcessError:
+                pass
+            
+            # 如果失败，尝试国内镜像
+            if not success:
+                for mirror in cls.CHINA_MIRRORS:
+                    try:
+                        subprocess.check_call([
+                            sys.executable, '-m', 'pip', 'install', 
+                            '-i', mirror, package
+                        ])
+                        success = True
+                        break
+                    except subprocess.CalledProcessError:
+                        continue
+            
+            if not success:
+                messagebox.showerror("安装失败", f"无法安装 {package}")
+                sys.exit(1)
+        
+        messagebox.showinfo("安装完成", "所有依赖库已安装完成，请重新启动程序")
+        sys.exit(0)
+
+# 在文件顶部导入所有需要的库
+try:
+    import cv2
+    CV2_AVAILABLE = True
+    # 导入时的提示写到stderr，命令行模式的stdout只输出GIF路径
+    print("✓ OpenCV 已加载", file=sys.stderr)
+except ImportError:
+    CV2_AVAILABLE = False
+    print("✗ OpenCV 未安装，智能裁切功能将受限", file=sys.stderr)
+
+class VideoProcessor:
+    """视频处理器 - 负责黑边和水印检测与移除"""
+    
+    @staticmethod
+    def _leading_count(flags):
+        """布尔序列开头连续True的个数"""
+        if flags.all():
+            return len(flags)
+        return int(np.argmin(flags))
+    
+    @staticmethod
+    def detect_black_borders(frame, threshold=30, max_side=None):
+        """检测视频帧的黑边
+        
+        一次计算所有行、列的亮度和，与逐行逐列求均值的结果一致。
+        指定max_side时先隔行隔列取样到最长边不超过max_side再检测，坐标按取样间隔换算回原尺寸（近似结果，误差在取样间隔以内）。
+        """
+        if not CV2_AVAILABLE:
+            return 0, 0, 0, 0
+        
+        h, w = frame.shape[:2]
+        step = 1
+        if max_side and max(h, w) > max_side:
+            # 隔行隔列取样（切片视图）后再转灰度，灰度转换只处理取样后的像素
+            step = -(-max(h, w) // max_side)
+            gray = cv2.cvtColor(np.ascontiguousarray(frame[::step, ::step]), cv2.COLOR_BGR2GRAY)
+        else:
+            # 转换为灰度图
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gh, gw = gray.shape
+        
+        # 行/列亮度和与阈值比较（整数求和，等价于均值 > threshold）
+        row_dark = np.add.reduce(gray, axis=1, dtype=np.uint32) <= threshold * gw
+        col_dark = np.add.reduce(gray, axis=0, dtype=np.uint32) <= threshold * gh
+        
+        # 上下只检查三分之一，从边缘向内数连续的暗行/暗列
+        top = VideoProcessor._leading_count(row_dark[:gh // 3])
+        bottom = VideoProcessor._leading_count(row_dark[gh * 2 // 3 + 1:][::-1])
+        left = VideoProcessor._leading_count(col_dark[:gw // 3])
+        right = VideoProcessor._leading_count(col_dark[gw * 2 // 3 + 1:][::-1])
+        
+        if step > 1:
+            # 换算回原尺寸，仍限制在三分之一范围内
+            top = min(top * step, h // 3)
+            bottom = min(bottom * step, h - 1 - h * 2 // 3)
+            left = min(left * step, w // 3)
+            right = min(right * step, w - 1 - w * 2 // 3)
+        
+        return top, bottom, left, right
+    
+    # 形态学闭运算+开运算(3x3)的影响范围，边缘条带向内多取这些像素，结果与整帧计算一致
+    WATERMARK_STRIP_PAD = 4
+    
+    @staticmethod
+    def _watermark_mask(strip):
+        """计算一个区域的水印掩码（白色/高亮像素，经形态学去噪）"""
+        # 转换为HSV用于更好的颜色检测
+        hsv = cv2.cvtColor(strip, cv2.COLOR_BGR2HSV)
+        gray = cv2.cvtColor(strip, cv2.COLOR_BGR2GRAY)
+        
+        # bilibili水印通常是白色或浅色的
+        # 检测白色区域 (HSV中V值较高)
+        white_mask = cv2.inRange(hsv, (0, 0, 200), (180, 30, 255))
+        
+        # 也检测灰度图中的高亮区域
+        _, bright_mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
+        
+        # 合并掩码
+        watermark_mask = cv2.bitwise_or(white_mask, bright_mask)
+        
+        # 形态学操作去除噪声
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        watermark_mask = cv2.morphologyEx(watermark_mask, cv2.MORPH_CLOSE, kernel)
+        return cv2.morphologyEx(watermark_mask, cv2.MORPH_OPEN, kernel)
+    
+    @staticmethod
+    def detect_bilibili_watermark(frame, margin_ratio=0.15):
+        """检测bilibili水印位置
+        
+        只对四个边缘条带做颜色转换和形态学处理，再用行/列投影一次找出裁切范围。
+        """
+        if not CV2_AVAILABLE:
+            return 0, 0, 0, 0
+            
+        h, w = frame.shape[:2]
+        margin_h = int(h * margin_ratio)
+        margin_w = int(w * margin_ratio)
+        pad = VideoProcessor.WATERMARK_STRIP_PAD
+        
+        if margin_h == 0 or margin_w == 0:
+            return 0, 0, 0, 0
+        
+        # 在四个边缘区域检测水印：(区域掩码, 投影方向)
+        regions = {
+            'top': (VideoProcessor._watermark_mask(frame[:margin_h + pad])[:margin_h], 1),
+            'bottom': (VideoProcessor._watermark_mask(frame[max(0, h - margin_h - pad):])[-margin_h:], 1),
+            'left': (VideoProcessor._watermark_mask(frame[:, :margin_w + pad])[:, :margin_w], 0),
+            'right': (VideoProcessor._watermark_mask(frame[:, max(0, w - margin_w - pad):])[:, -margin_w:], 0)
+        }
+        
+        crop_values = {'top': 0, 'bottom': 0, 'left': 0, 'right': 0}
+        for region_name, (region, axis) in regions.items():
+            # 计算该区域的白色像素比例，超过1%认为存在水印
+            if np.count_nonzero(region) <= region.size * 0.01:
+                continue
+            
+            # 行投影(axis=1)或列投影(axis=0)：该行/列掩码值之和超过阈值的位置
+            profile = np.add.reduce(region, axis=axis, dtype=np.uint64)
+            hits = np.flatnonzero(profile > region.shape[axis] * 0.02)
+            if hits.size == 0:
+                continue
+            
+            # 多裁切5像素确保完全移除
+            if region_name == 'top':
+                # 最后一行有水印的位置
+                crop_values['top'] = int(hits[-1]) + 5
+            elif region_name == 'bottom':
+                # 最靠上的有水印的行
+                crop_values['bottom'] = margin_h - int(hits[0]) + 5
+            elif region_name == 'left':
+                crop_values['left'] = int(hits[-1]) + 5
+            elif region_name == 'right':
+                crop_values['right'] = margin_w - int(hits[0]) + 5
+        
+        return crop_values['top'], crop_values['bottom'], crop_values['left'], crop_values['right']
+    
+    @staticmethod
+    def calculate_smart_crop(frame, remove_black_borders=True, remove_watermark=True):
+        """计算智能裁切参数"""
+        if not CV2_AVAILABLE:
+            return 0, 0, 0, 0
+            
+        h, w = frame.shape[:2]
+        
+        # 初始化裁切值
+        crop_top = crop_bottom = crop_left = crop_right = 0
+        
+        # 检测黑边
+        if remove_black_borders:
+            black_top, black_bottom, black_left, black_right = VideoProcessor.detect_black_borders(frame)
+            crop_top = max(crop_top, black_top)
+            crop_bottom = max(crop_bottom, black_bottom)
+            crop_left = max(crop_left, black_left)
+            crop_right = max(crop_right, black_right)
+        
+        # 检测水印
+        if remove_watermark:
+            mark_top, mark_bottom, mark_left, mark_right = VideoProcessor.detect_bilibili_watermark(frame)
+            crop_top = max(crop_top, mark_top)
+            crop_bottom = max(crop_bottom, mark_bottom)
+            crop_left = max(crop_left, mark_left)
+            crop_right = max(crop_right, mark_right)
+        
+        # 确保裁切后仍有有效图像
+        min_dimension = 100  # 最小尺寸
+        if w - crop_left - crop_right < min_dimension:
+            # 如果水平裁切过多，按比例减少
+            total_horizontal = crop_left + crop_right
+            if total_horizontal > 0:
+                reduction_ratio = (w - min_dimension) / total_horizontal
+                crop_left = int(crop_left * reduction_ratio)
+                crop_right = int(crop_right * reduction_ratio)
+        
+        if h - crop_top - crop_bottom < min_dimension:
+            # 如果垂直裁切过多，按比例减少
+            total_vertical = crop_top + crop_bottom
+            if total_vertical > 0:
+                reduction_ratio = (h - min_dimension) / total_vertical
+                crop_top = int(crop_top * reduction_ratio)
+                crop_bottom = int(crop_bottom * reduction_ratio)
+        
+        return crop_top, crop_bottom, crop_left, crop_right
+
+class TemporalCropAnalyzer:
+    """多帧裁切分析 - 在解码循环已经解码的帧中均匀取样，每条边取中位数，避免单帧过暗/过亮导致裁切错误"""
+    
+    # 默认暂存帧数为取样数的倍数
+    BUFFER_SAMPLE_FACTOR = 3
+    
+    def __init__(self, remove_black_borders=True, remove_watermark=True, max_samples=7, buffer_frames=None):
+        self.remove_black_borders = remove_black_borders
+        self.remove_watermark = remove_watermark
+        self.max_samples = max(1, max_samples)
+        # 做出裁切决定前最多暂存的原始帧数（暂存期间帧不提交处理，解码与处理不重叠，因此按帧数而不是字节数限制）
+        self.buffer_frames = max(1, buffer_frames or self.BUFFER_SAMPLE_FACTOR * self.max_samples)
+        self.crop_params = None
+    
+    def analyze(self, frames):
+        """从暂存的帧中取样分析，返回合并后的裁切参数"""
+        if not frames:
+            return None
+        
+        sample_count = min(self.max_samples, len(frames))
+        indices = np.unique(np.linspace(0, len(frames) - 1, sample_count).round().astype(int))
+        crops = np.array([
+            VideoProcessor.calculate_smart_crop(frames[i], self.remove_black_borders, self.remove_watermark)
+            for i in indices
+        ])
+        self.crop_params = tuple(int(value) for value in np.median(crops, axis=0))
+        print(f"智能裁切参数({len(indices)}帧中位数): top={self.crop_params[0]}, bottom={self.crop_params[1]}, "
+              f"left={self.crop_params[2]}, right={self.crop_params[3]}")
+        return self.crop_params
+
+def _init_process_worker():
+    """进程池工作进程初始化 - 避免OpenCV内部线程与进程池争抢CPU"""
+    if CV2_AVAILABLE:
+        cv2.setNumThreads(1)
+
+def _process_shared_frame(shm_name, shape, frame_index, target_width, target_height, max_colors,
+                          crop_params=None, quantize=True, rgb_input=False, dither='none'):
+    """进程池工作函数 - 从共享内存读取原始帧，避免pickle传输整帧数据"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        return OptimizedFrameProcessor.process_frame_batch_optimized(
+            (frame, frame_index), target_width, target_height, max_colors, crop_params, quantize, rgb_input, dither
+        )
+    finally:
+        # 必须先释放对共享内存的引用才能关闭
+        del frame
+        shm.close()
+
+class SharedFrameSlots:
+    """共享内存帧槽 - 固定数量的可复用缓冲区，同时限制在途帧数量"""
+    
+    def __init__(self, slot_count, slot_size):
+        self.slot_size = slot_size
+        self.slots = []
+        self.free_slots = queue.Queue()
+        try:
+            for i in range(slot_count):
+                self.slots.append(shared_memory.SharedMemory(create=True, size=slot_size))
+                self.free_slots.put(i)
+        except Exception:
+            self.close()
+            raise
+    
+    def put(self, frame):
+        """把帧拷贝进一个空闲槽，没有空闲槽时阻塞，返回(槽编号, 共享内存名)"""
+        if frame.nbytes > self.slot_size:
+            raise Exception(f"帧大小超出共享内存槽容量: {frame.nbytes} > {self.slot_size}")
+        slot_index = self.free_slots.get()
+        shm = self.slots[slot_index]
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf)[:] = frame
+        return slot_index, shm.name
+    
+    def release(self, slot_index):
+        """归还槽"""
+        self.free_slots.put(slot_index)
+    
+    def close(self):
+        """关闭并删除所有共享内存"""
+        for shm in self.slots:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        self.slots = []
+
+class MemoryBudget:
+    """内存预算 - 转换开始前按视频尺寸和目标帧数预估各阶段的帧数据占用，超出预算时收紧流水线窗口、
+    把全局调色板阶段暂存的帧转存到磁盘；转换过程中记录各阶段实际持有的帧数据峰值
+    
+    阶段：
+      decode   在途的原始帧（流水线窗口 × 解码帧大小，OpenCV解码为源分辨率BGR，FFmpeg解码为目标尺寸RGB）
+      process  已处理、等待按顺序交付的帧（流水线窗口 × 目标尺寸RGB）
+      crop     OpenCV解码时为分析裁切参数暂存的最初若干帧
+      palette  全局调色板模式下暂存的全部缩放后帧（超出预算时转存磁盘，计入spill）
+    """
+    
+    DEFAULT_BUDGET_MB = 1024
+    STAGES = ('decode', 'process', 'crop', 'palette', 'spill')
+    STAGE_NAMES = {'decode': '解码窗口', 'process': '待交付帧', 'crop': '裁切分析',
+                   'palette': '全局调色板帧', 'spill': '磁盘转存'}
+    # 流水线（decode + process + crop）最多占预算的一半，其余留给全局调色板阶段和编码；裁切分析暂存最多占四分之一
+    PIPELINE_SHARE = 0.5
+    CROP_SHARE = 0.25
+    MIN_WINDOW = 2
+    
+    def __init__(self, budget_bytes=None):
+        # None或0表示不限制，只做预估和统计
+        self.budget_bytes = budget_bytes or None
+        self.estimates = {}
+        self.usage = dict.fromkeys(self.STAGES, 0)
+        self.peaks = dict.fromkeys(self.STAGES, 0)
+        self.window = None
+        self.crop_buffer_frames = None
+        self.frame_count = 0
+        self.spill = False
+        self.lock = threading.Lock()
+    
+    def plan(self, decode_size, target_size, frame_count, window, palette_mode='local', crop_buffer_frames=0):
+        """预估各阶段占用并决定流水线窗口、裁切分析暂存帧数上限（crop_buffer_frames）和是否转存磁盘，返回流水线窗口大小"""
+        decode_bytes = decode_size[0] * decode_size[1] * 3
+        target_bytes = target_size[0] * target_size[1] * 3
+        per_window_frame = decode_bytes + target_bytes
+        # 裁切分析结束时暂存的帧一次性提交，处理结果在交付前最多累积这么多帧
+        crop_frames = min(crop_buffer_frames, frame_count)
+        if self.budget_bytes and crop_frames:
+            crop_frames = min(crop_frames, max(1, int(self.budget_bytes * self.CROP_SHARE // decode_bytes)))
+        self.crop_buffer_frames = crop_frames
+        crop_bytes = crop_frames * decode_bytes
+        
+        if self.budget_bytes:
+            pipeline_limit = self.budget_bytes * self.PIPELINE_SHARE - crop_bytes
+            fitting = int(pipeline_limit // per_window_frame) if pipeline_limit > 0 else 0
+            if fitting < window:
+                window = max(self.MIN_WINDOW, fitting)
+                print(f"内存预算 {self.budget_bytes / 1024 ** 2:.0f}MB: 流水线窗口收紧为 {window} 帧")
+        
+        self.window = window
+        self.frame_count = frame_count
+        self.estimates = {
+            'decode': window * decode_bytes,
+            'process': max(window, crop_frames) * target_bytes,
+            'crop': crop_bytes,
+            'palette': frame_count * target_bytes if palette_mode == 'global' else 0,
+        }
+        total = sum(self.estimates.values())
+        if self.budget_bytes and self.estimates['palette'] and total > self.budget_bytes:
+            self.spill = True
+        print(f"预估帧数据内存: {self._describe(self.estimates)}，合计 {total / 1024 ** 2:.1f}MB" +
+              ("，超出预算，全局调色板帧转存磁盘" if self.spill else ""))
+        return window
+    
+    def track(self, stage, nbytes):
+        """登记某阶段持有的字节数变化（正数为占用，负数为释放）"""
+        with self.lock:
+            self.usage[stage] += nbytes
+            if self.usage[stage] > self.peaks[stage]:
+                self.peaks[stage] = self.usage[stage]
+    
+    def report(self):
+        """各阶段实测峰值（MB）"""
+        return {stage: round(peak / 1024 ** 2, 1) for stage, peak in self.peaks.items() if peak}
+    
+    def print_report(self):
+        peaks = {stage: peak for stage, peak in self.peaks.items() if peak}
+        if peaks:
+            print(f"帧数据内存峰值: {self._describe(peaks)}")
+    
+    @classmethod
+    def _describe(cls, sizes):
+        return ', '.join(f"{cls.STAGE_NAMES[stage]} {size / 1024 ** 2:.1f}MB"
+                         for stage, size in sizes.items() if size)
+
+class FrameSpillStore:
+    """磁盘帧缓存 - 固定尺寸的RGB帧顺序写入np.memmap文件，读取时按需从磁盘映射，关闭时删除文件"""
+    
+    def __init__(self, directory, capacity, width, height):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='frames_', suffix='.rgb', dir=directory)
+        os.close(fd)
+        self.path = Path(path)
+        self.shape = (height, width, 3)
+        self.capacity = 0
+        self.array = None
+        self.infos = []
+        self._resize(max(1, capacity))
+    
+    def _resize(self, capacity):
+        """扩大文件并重新映射（帧数超出预估时）"""
+        if self.array is not None:
+            self.array.flush()
+            self.array = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(capacity * int(np.prod(self.shape)))
+        self.array = np.memmap(self.path, dtype=np.uint8, mode='r+', shape=(capacity, *self.shape))
+        self.capacity = capacity
+    
+    @property
+    def nbytes(self):
+        return len(self.infos) * int(np.prod(self.shape))
+    
+    def append(self, img):
+        """写入一帧PIL图像（保留info中的帧时长等信息）"""
+        if len(self.infos) >= self.capacity:
+            self._resize(self.capacity * 2)
+        self.array[len(self.infos)] = np.asarray(img if img.mode == 'RGB' else img.convert('RGB'))
+        self.infos.append(dict(img.info))
+    
+    def __len__(self):
+        return len(self.infos)
+    
+    def __getitem__(self, index):
+        from PIL import Image
+        
+        img = Image.fromarray(np.array(self.array[index]))
+        img.info.update(self.infos[index])
+        return img
+    
+    def __iter__(self):
+        for index in range(len(self.infos)):
+            yield self[index]
+    
+    def close(self):
+        self.array = None
+        self.path.unlink(missing_ok=True)
+
+class GlobalPalette:
+    """全局共享调色板 - 所有帧共用一个调色板，通过5位/通道查找表向量化映射"""
+    
+    LUT_BITS = 5
+    
+    def __init__(self, palette_rgb):
+        # 去重，保证调色板中每个颜色唯一
+        self.colors = np.unique(np.asarray(palette_rgb, dtype=np.uint8).reshape(-1, 3), axis=0)
+        self.palette = self.colors.flatten().tolist()
+        self.lut = self._build_lut(self.colors)
+        self.palette_image = None
+    
+    @staticmethod
+    def quantize_method(max_colors):
+        """按颜色数量选择量化算法，与逐帧量化保持一致"""
+        from PIL import Image
+        
+        if max_colors <= 32:
+            return Image.Quantize.MAXCOVERAGE
+        elif max_colors <= 64:
+            return Image.Quantize.FASTOCTREE
+        return Image.Quantize.MEDIANCUT
+    
+    @classmethod
+    def from_frames(cls, frames, max_colors, sample_pixels=200000):
+        """从所有帧中均匀采样像素构建调色板"""
+        from PIL import Image
+        
+        per_frame = max(1, sample_pixels // len(frames))
+        samples = []
+        for frame in frames:
+            pixels = np.asarray(frame.convert('RGB')).reshape(-1, 3)
+            step = max(1, len(pixels) // per_frame)
+            # 拷贝采样结果，切片视图会让整帧数组一直留在内存中
+            samples.append(pixels[::step].copy())
+        
+        sample = np.ascontiguousarray(np.concatenate(samples))
+        sample_img = Image.fromarray(sample.reshape(1, -1, 3))
+        quantized = sample_img.quantize(colors=max_colors, method=cls.quantize_method(max_colors))
+        
+        # 只保留实际使用到的调色板颜色
+        palette = np.array(quantized.getpalette()[:max_colors * 3], dtype=np.uint8).reshape(-1, 3)
+        used = [index for _, index in quantized.getcolors(max_colors)]
+        return cls(palette[used])
+    
+    @classmethod
+    def _build_lut(cls, colors):
+        """预计算 RGB(每通道5位) -> 调色板索引 的最近颜色查找表"""
+        levels = 1 << cls.LUT_BITS
+        shift = 8 - cls.LUT_BITS
+        # 每个量化格子取中心值
+        axis = (np.arange(levels, dtype=np.int32) << shift) + (1 << (shift - 1))
+        r, g, b = np.meshgrid(axis, axis, axis, indexing='ij')
+        centers = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+        
+        palette = colors.astype(np.int32)
+        lut = np.empty(len(centers), dtype=np.uint8)
+        chunk = 4096  # 分块计算距离，控制临时内存
+        for i in range(0, len(centers), chunk):
+            diff = centers[i:i + chunk, None, :] - palette[None, :, :]
+            lut[i:i + chunk] = np.argmin((diff * diff).sum(axis=2), axis=1)
+        return lut
+    
+    def map_frame(self, img, dither='none'):
+        """把RGB帧映射到全局调色板 - 每帧只需一次NumPy花式索引（误差扩散抖动由PIL逐像素完成）"""
+        from PIL import Image
+        
+        if dither == 'error_diffusion':
+            if self.palette_image is None:
+                self.palette_image = Image.new('P', (1, 1))
+                self.palette_image.putpalette(self.palette)
+            return (img if img.mode == 'RGB' else img.convert('RGB')).quantize(
+                palette=self.palette_image, dither=Image.Dither.FLOYDSTEINBERG
+            )
+        
+        rgb = np.asarray(img if img.mode == 'RGB' else img.convert('RGB'))
+        if dither == 'ordered':
+            rgb = OptimizedFrameProcessor.ordered_dither(rgb, len(self.colors))
+        shift = 8 - self.LUT_BITS
+        key = ((rgb[..., 0] >> shift).astype(np.uint16) << (2 * self.LUT_BITS)) \
+            | ((rgb[..., 1] >> shift).astype(np.uint16) << self.LUT_BITS) \
+            | (rgb[..., 2] >> shift)
+        indices = np.ascontiguousarray(self.lut[key])
+        
+        mapped = Image.frombytes('P', img.size, indices.tobytes())
+        mapped.putpalette(self.palette)
+        return mapped
+
+class FrameSeeker:
+    """跳帧策略 - 在需要的帧之间前进：顺序grab（只解码不取出）、直接seek、或按关键帧对齐seek
+    
+    seek会从目标之前的关键帧重新解码，另外还有清空解码器等固定开销，长GOP视频中往往比顺序grab更慢。
+    auto模式下已知关键帧位置时使用keyframe策略：目标与当前位置之间没有关键帧时grab；否则比较
+    "seek固定开销 + 从关键帧解码到目标" 与 "顺序grab到目标" 的实测耗时。
+    不知道关键帧位置时先各试一次grab和seek，按实测耗时选择。
+    """
+    
+    STRATEGIES = ('auto', 'grab', 'seek', 'keyframe')
+    
+    def __init__(self, cap, strategy='auto', keyframes=None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的跳帧策略: {strategy}")
+        if strategy == 'auto':
+            strategy = 'keyframe' if keyframes is not None and len(keyframes) > 0 else 'measured'
+        elif strategy == 'keyframe' and (keyframes is None or len(keyframes) == 0):
+            strategy = 'measured'
+        self.cap = cap
+        self.strategy = strategy
+        self.keyframes = keyframes
+        # 实测耗时（秒）：每grab一帧、每次seek、seek除解码以外的固定开销
+        self.grab_cost = None
+        self.seek_cost = None
+        self.seek_overhead = None
+        self._decode_frames = None  # 本次seek需要从关键帧解码的帧数
+        self.counts = {'grab': 0, 'seek': 0}
+    
+    @property
+    def gop_size(self):
+        """关键帧间隔的中位数，未知时为None"""
+        if self.keyframes is None or len(self.keyframes) < 2:
+            return None
+        return float(np.median(np.diff(self.keyframes)))
+    
+    def skip_to(self, current_pos, target_pos):
+        """从current_pos（下一次read将返回的帧）前进到target_pos，返回是否成功"""
+        distance = target_pos - current_pos
+        if distance <= 0:
+            return True
+        
+        method = self._choose(current_pos, target_pos, distance)
+        start = time.perf_counter()
+        if method == 'seek':
+            ok = self.cap.set(cv2.CAP_PROP_POS_FRAMES, target_pos)
+        else:
+            ok = True
+            for _ in range(distance):
+                if not self.cap.grab():
+                    ok = False
+                    break
+        elapsed = time.perf_counter() - start
+        
+        # 指数平均，适应片段内码率变化
+        if method == 'seek':
+            self.seek_cost = elapsed if self.seek_cost is None else self.seek_cost * 0.7 + elapsed * 0.3
+            if self._decode_frames is not None and self.grab_cost is not None:
+                overhead = max(0.0, elapsed - self._decode_frames * self.grab_cost)
+                self.seek_overhead = overhead if self.seek_overhead is None else \
+                    self.seek_overhead * 0.7 + overhead * 0.3
+        else:
+            per_frame = elapsed / distance
+            self.grab_cost = per_frame if self.grab_cost is None else self.grab_cost * 0.7 + per_frame * 0.3
+        self.counts[method] += 1
+        return ok
+    
+    def _choose(self, current_pos, target_pos, distance):
+        self._decode_frames = None
+        if self.strategy in ('grab', 'seek'):
+            return self.strategy
+        if distance == 1:
+            return 'grab'
+        
+        if self.strategy == 'keyframe':
+            # 目标之前最近的关键帧：在当前位置之后且从它解码到目标比顺序grab少时才考虑seek
+            index = int(np.searchsorted(self.keyframes, target_pos, side='right')) - 1
+            if index < 0 or int(self.keyframes[index]) <= current_pos:
+                return 'grab'
+            decode_frames = target_pos - int(self.keyframes[index])
+            if decode_frames >= distance or self.grab_cost is None:
+                return 'grab'
+            self._decode_frames = decode_frames
+            if self.seek_overhead is None:
+                return 'seek'  # 测一次seek的固定开销
+            seek_estimate = self.seek_overhead + decode_frames * self.grab_cost
+            return 'seek' if seek_estimate < distance * self.grab_cost else 'grab'
+        
+        # 未知关键帧：先各测一次，之后选实测更快的方式
+        if self.grab_cost is None:
+            return 'grab'
+        if self.seek_cost is None:
+            return 'seek'
+        return 'seek' if self.seek_cost < self.grab_cost * distance else 'grab'
+    
+    def describe(self):
+        gop = self.gop_size
+        gop_desc = f"GOP≈{gop:.0f}帧" if gop else "GOP未知"
+        return f"{self.strategy}（{gop_desc}，grab {self.counts['grab']}次，seek {self.counts['seek']}次）"
+    
+    @staticmethod
+    def _iter_boxes(data, start, end):
+        """遍历MP4盒子，产出 (类型, 内容起点, 盒子终点)"""
+        pos = start
+        while pos + 8 <= end:
+            size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+            header = 8
+            if size == 1:
+                size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+                header = 16
+            elif size == 0:
+                size = end - pos
+            if size < header:
+                break
+            yield box_type, pos + header, min(pos + size, end)
+            pos += size
+    
+    @classmethod
+    def read_keyframes(cls, input_file):
+        """读取MP4视频轨道的关键帧序号（从0开始）：普通MP4读stss，分片MP4按每个分片从关键帧开始计算
+        
+        不是MP4或没有关键帧信息时返回None。
+        """
+        try:
+            with open(input_file, 'rb') as f:
+                # 读取顶层盒子头，只把moov和moof读入内存
+                moov = None
+                fragments = []
+                file_size = os.fstat(f.fileno()).st_size
+                pos = 0
+                while pos + 8 <= file_size:
+                    f.seek(pos)
+                    header = f.read(16)
+                    size, box_type = struct.unpack('>I4s', header[:8])
+                    header_size = 8
+                    if size == 1:
+                        size = struct.unpack('>Q', header[8:16])[0]
+                        header_size = 16
+                    elif size == 0:
+                        size = file_size - pos
+                    if size < header_size:
+                        break
+                    if box_type == b'moov':
+                        f.seek(pos)
+                        moov = f.read(size)
+                    elif box_type == b'moof':
+                        f.seek(pos)
+                        fragments.append(f.read(size))
+                    pos += size
+        except (OSError, struct.error):
+            return None
+        if moov is None:
+            return None
+        
+        # 找到视频轨道
+        for box_type, start, end in cls._iter_boxes(moov, 0, len(moov)):
+            if box_type != b'moov':
+                continue
+            for trak_type, trak_start, trak_end in cls._iter_boxes(moov, start, end):
+                if trak_type != b'trak':
+                    continue
+                track_id, is_video, sync_samples = None, False, None
+                for sub_type, sub_start, sub_end in cls._iter_boxes(moov, trak_start, trak_end):
+                    if sub_type == b'tkhd':
+                        offset = 20 if moov[sub_start] == 1 else 12
+                        track_id = struct.unpack('>I', moov[sub_start + offset:sub_start + offset + 4])[0]
+                    elif sub_type == b'mdia':
+                        is_video, sync_samples = cls._parse_mdia(moov, sub_start, sub_end)
+                if not is_video:
+                    continue
+                
+                if sync_samples is not None:
+                    return sync_samples - 1
+                if fragments:
+                    return cls._fragment_keyframes(fragments, track_id)
+                return None
+        return None
+    
+    @classmethod
+    def _parse_mdia(cls, data, start, end):
+        """返回 (是否视频轨道, stss中的关键帧序号数组或None)"""
+        is_video = False
+        sync_samples = None
+        for box_type, box_start, box_end in cls._iter_boxes(data, start, end):
+            if box_type == b'hdlr':
+                is_video = data[box_start + 8:box_start + 12] == b'vide'
+            elif box_type == b'minf':
+                for minf_type, minf_start, minf_end in cls._iter_boxes(data, box_start, box_end):
+                    if minf_type != b'stbl':
+                        continue
+                    for stbl_type, stbl_start, stbl_end in cls._iter_boxes(data, minf_start, minf_end):
+                        if stbl_type == b'stss':
+                            count = struct.unpack('>I', data[stbl_start + 4:stbl_start + 8])[0]
+                            sync_samples = np.frombuffer(data, dtype='>u4', count=count,
+                                                         offset=stbl_start + 8).astype(np.int64)
+        return is_video, sync_samples
+    
+    @classmethod
+    def _fragment_keyframes(cls, fragments, track_id):
+        """分片MP4：每个分片以关键帧开始，关键帧序号为之前所有分片的样本数之和"""
+        keyframes = []
+        sample_index = 0
+        for moof in fragments:
+            fragment_samples = 0
+            for box_type, start, end in cls._iter_boxes(moof, 0, len(moof)):
+                for traf_type, traf_start, traf_end in cls._iter_boxes(moof, start, end):
+                    if traf_type != b'traf':
+                        continue
+                    traf_track = None
+                    for sub_type, sub_start, sub_end in cls._iter_boxes(moof, traf_start, traf_end):
+                        if sub_type == b'tfhd':
+                            traf_track = struct.unpack('>I', moof[sub_start + 4:sub_start + 8])[0]
+                        elif sub_type == b'trun' and traf_track in (track_id, None):
+                            fragment_samples += struct.unpack('>I', moof[sub_start + 4:sub_start + 8])[0]
+            if fragment_samples:
+                keyframes.append(sample_index)
+                sample_index += fragment_samples
+        return np.array(keyframes, dtype=np.int64) if keyframes else None
+
+_ffmpeg_path = None
+
+def find_ffmpeg():
+    """查找ffmpeg可执行文件：优先PATH中的ffmpeg，其次imageio-ffmpeg自带的，找不到返回None"""
+    global _ffmpeg_path
+    if _ffmpeg_path is None:
+        path = shutil.which('ffmpeg')
+        if path is None:
+            try:
+                import imageio_ffmpeg
+                path = imageio_ffmpeg.get_ffmpeg_exe()
+            except Exception:
+                path = ''
+        _ffmpeg_path = path
+    return _ffmpeg_path or None
+
+class FFmpegFrameDecoder:
+    """FFmpeg解码器 - 用-ss/-to定位，fps/crop/scale滤镜在ffmpeg内完成，rgb24原始帧通过管道读取"""
+    
+    # Windows下不弹出ffmpeg控制台窗口
+    CREATION_FLAGS = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    
+    def __init__(self, ffmpeg_path):
+        self.ffmpeg_path = ffmpeg_path
+    
+    def _probe(self, input_file):
+        """ffmpeg -i 输出的流信息"""
+        result = subprocess.run(
+            [self.ffmpeg_path, '-hide_banner', '-nostdin', '-i', str(input_file)],
+            capture_output=True, creationflags=self.CREATION_FLAGS
+        )
+        return result.stderr.decode('utf-8', 'replace')
+    
+    def probe_size(self, input_file):
+        """读取视频分辨率 (宽, 高)，失败时返回None"""
+        match = re.search(r'Video:.*?\b(\d{2,5})x(\d{2,5})\b', self._probe(input_file))
+        return (int(match.group(1)), int(match.group(2))) if match else None
+    
+    def probe_fps(self, input_file):
+        """读取视频帧率，失败时返回None"""
+        match = re.search(r'Video:.*?\b(\d+(?:\.\d+)?) (?:fps|tbr)\b', self._probe(input_file))
+        return float(match.group(1)) if match else None
+    
+    def _open(self, args, input_file, start_time, end_time):
+        """启动ffmpeg，原始帧输出到stdout，错误信息写入临时文件（避免stderr管道写满阻塞）"""
+        cmd = [self.ffmpeg_path, '-v', 'error', '-nostdin', *args.get('input', []),
+               '-ss', f'{start_time:.3f}', '-to', f'{end_time:.3f}', '-i', str(input_file),
+               '-an', '-sn', *args.get('output', []), '-f', 'rawvideo', 'pipe:1']
+        stderr_file = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+                                   creationflags=self.CREATION_FLAGS)
+        return process, stderr_file
+    
+    def _read_frames(self, process, stderr_file, width, height):
+        """从管道逐帧读取，每帧是对读取缓冲区的np.frombuffer视图（不拷贝）"""
+        frame_size = width * height * 3
+        frame_count = 0
+        try:
+            while True:
+                buffer = process.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                frame_count += 1
+                yield np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+            stderr_file.seek(0)
+            error = stderr_file.read().decode('utf-8', 'replace').strip()
+            stderr_file.close()
+        
+        if frame_count == 0 and process.returncode != 0:
+            raise Exception(f"ffmpeg解码失败: {error[-500:]}")
+    
+    @staticmethod
+    def _scale_flags(scale_factor):
+        """与OpenCV路径的缩放算法选择保持一致：缩小用区域平均，放大用双线性"""
+        return 'area' if scale_factor < 1 else 'bilinear'
+    
+    @staticmethod
+    def select_expression(frame_indices):
+        """把递增的源帧序号压缩为select表达式：等间隔的一段合并为 between(n,a,b)*not(mod(n-a,k)) 一项，
+        ffmpeg对每个解码帧求值的项数随间隔变化的次数而不是取帧数增长"""
+        indices = [int(index) for index in frame_indices]
+        terms = []
+        i = 0
+        while i < len(indices):
+            first = indices[i]
+            if i + 1 == len(indices):
+                terms.append(f'eq(n,{first})')
+                break
+            step = indices[i + 1] - first
+            j = i + 1
+            while j + 1 < len(indices) and indices[j + 1] - indices[j] == step:
+                j += 1
+            last = indices[j]
+            if step == 1:
+                terms.append(f'between(n,{first},{last})')
+            else:
+                terms.append(f'between(n,{first},{last})*not(mod(n-{first},{step}))')
+            i = j + 1
+        return '+'.join(terms)
+    
+    def _sample_filter(self, fps, frame_indices=None):
+        """抽帧滤镜（指定frame_indices时按片段内的源帧序号取帧，而不是固定帧率）"""
+        if frame_indices is not None:
+            return f"select='{self.select_expression(frame_indices)}'"
+        # round=up：每个输出时刻取该时刻或之前的最后一个源帧，起始帧与OpenCV解码（int(开始时间*帧率)）一致
+        return f'fps={fps}:round=up'
+    
+    def build_filters(self, input_file, fps, target_width, target_height, crop_params=None, frame_indices=None):
+        """抽帧、裁切、缩放滤镜链"""
+        source_size = self.probe_size(input_file)
+        filters = [self._sample_filter(fps, frame_indices)]
+        crop_width, crop_height = source_size or (target_width, target_height)
+        if crop_params and any(crop_params) and source_size:
+            crop_top, crop_bottom, crop_left, crop_right = crop_params
+            width, height = source_size
+            if crop_top + crop_bottom < height and crop_left + crop_right < width:
+                crop_width = width - crop_left - crop_right
+                crop_height = height - crop_top - crop_bottom
+                filters.append(f'crop={crop_width}:{crop_height}:{crop_left}:{crop_top}')
+        scale_factor = (target_width * target_height) / (crop_width * crop_height)
+        filters.append(f'scale={target_width}:{target_height}:flags={self._scale_flags(scale_factor)}')
+        return filters
+    
+    def iter_frames(self, input_file, start_time, end_time, fps, target_width, target_height, crop_params=None,
+                    frame_indices=None):
+        """产出目标尺寸的RGB帧"""
+        filters = self.build_filters(input_file, fps, target_width, target_height, crop_params, frame_indices)
+        if frame_indices is not None:
+            # 按序号取帧时原样输出时间戳，避免ffmpeg为保持恒定帧率复制帧
+            target_frame_count = len(frame_indices)
+            output_args = ['-vsync', '0']
+            print(f"FFmpeg解码: 按运动量取 {target_frame_count} 帧，{','.join(filters[1:])}")
+        else:
+            target_frame_count = int((end_time - start_time) * fps)
+            output_args = []
+            print(f"FFmpeg解码: {','.join(filters)}，预计提取 {target_frame_count} 帧")
+        process, stderr_file = self._open({
+            'output': ['-vf', ','.join(filters), *output_args, '-frames:v', str(target_frame_count),
+                       '-pix_fmt', 'rgb24']
+        }, input_file, start_time, end_time)
+        yield from self._read_frames(process, stderr_file, target_width, target_height)
+    
+    def iter_source_frames(self, input_file, start_time, end_time, fps, frame_indices=None):
+        """产出原始分辨率的BGR帧，滤镜中只抽帧（裁切参数要由解码的帧分析时使用，裁切缩放由调用方完成）"""
+        source_size = self.probe_size(input_file)
+        if source_size is None:
+            raise Exception(f"无法读取视频分辨率: {input_file}")
+        width, height = source_size
+        if frame_indices is not None:
+            target_frame_count = len(frame_indices)
+            output_args = ['-vsync', '0']
+        else:
+            target_frame_count = int((end_time - start_time) * fps)
+            output_args = []
+        sample_filter = self._sample_filter(fps, frame_indices)
+        print(f"FFmpeg解码: {sample_filter if frame_indices is None else '按运动量取帧'}，"
+              f"原始分辨率 {width}x{height}，预计提取 {target_frame_count} 帧")
+        process, stderr_file = self._open({
+            'output': ['-vf', sample_filter, *output_args, '-frames:v', str(target_frame_count),
+                       '-pix_fmt', 'bgr24']
+        }, input_file, start_time, end_time)
+        yield from self._read_frames(process, stderr_file, width, height)
+    
+    def iter_thumbnails(self, input_file, start_time, end_time, width, height):
+        """片段内每个源帧的低分辨率RGB缩略图（区域平均缩小）"""
+        process, stderr_file = self._open({
+            'output': ['-vf', f'scale={width}:{height}:flags=area', '-vsync', '0', '-pix_fmt', 'rgb24']
+        }, input_file, start_time, end_time)
+        yield from self._read_frames(process, stderr_file, width, height)
+    
+    def analyze_crop(self, input_file, start_time, end_time, crop_analyzer):
+        """只解码片段内的关键帧（原始分辨率BGR）做多帧裁切分析，没有关键帧时取中间一帧
+        （供FFmpeg编码引擎使用，它没有Python解码循环；FFmpeg解码器在解码循环的帧上分析）"""
+        source_size = self.probe_size(input_file)
+        if source_size is None:
+            return None
+        width, height = source_size
+        
+        # 关键帧较多时等间隔保留，内存中最多2*max_samples帧
+        samples = []
+        stride = 1
+        index = 0
+        process, stderr_file = self._open({
+            'input': ['-skip_frame', 'nokey'],
+            'output': ['-vsync', '0', '-pix_fmt', 'bgr24']
+        }, input_file, start_time, end_time)
+        try:
+            for frame in self._read_frames(process, stderr_file, width, height):
+                if index % stride == 0:
+                    samples.append(frame)
+                    if len(samples) > 2 * crop_analyzer.max_samples:
+                        samples = samples[::2]
+                        stride *= 2
+                index += 1
+        except Exception as e:
+            print(f"关键帧解码失败: {e}")
+        
+        if not samples:
+            middle = start_time + (end_time - start_time) / 2
+            process, stderr_file = self._open({
+                'output': ['-frames:v', '1', '-pix_fmt', 'bgr24']
+            }, input_file, middle, end_time)
+            samples = list(self._read_frames(process, stderr_file, width, height))
+        return crop_analyzer.analyze(samples)
+
+class FFmpegGifEncoder:
+    """FFmpeg GIF编码引擎 - 抽帧/裁切/缩放/调色板生成/编码在一个ffmpeg滤镜图中完成（palettegen + paletteuse）"""
+    
+    # paletteuse抖动方式：none 不抖动（最小、色带明显），bayer 有序抖动（快、压缩友好），
+    # floyd_steinberg/sierra2/sierra2_4a 误差扩散（过渡最平滑，但噪点使文件变大）
+    DITHER_MODES = ('none', 'bayer', 'floyd_steinberg', 'sierra2', 'sierra2_4a')
+    # 差分模式：rectangle 只重新映射与上一帧不同的矩形区域（配合GIF分帧偏移更小），none 每帧完整映射
+    DIFF_MODES = ('none', 'rectangle')
+    
+    def __init__(self, ffmpeg_path, dither='sierra2_4a', diff_mode='rectangle', bayer_scale=3, dedup=False):
+        if dither not in self.DITHER_MODES:
+            raise ValueError(f"未知的抖动方式: {dither}")
+        if diff_mode not in self.DIFF_MODES:
+            raise ValueError(f"未知的差分模式: {diff_mode}")
+        self.ffmpeg_path = ffmpeg_path
+        self.dither = dither
+        self.diff_mode = diff_mode
+        self.bayer_scale = bayer_scale
+        # 合并近似重复帧：mpdecimate丢弃与上一帧近似相同的帧，可变帧率输出时时长并入上一帧
+        self.dedup = dedup
+        self.decoder = FFmpegFrameDecoder(ffmpeg_path)
+    
+    def build_filter_graph(self, input_file, fps, width, height, max_colors, crop_params=None):
+        """完整滤镜图：抽帧裁切缩放后分成两路，一路生成调色板，一路用调色板映射"""
+        filters = self.decoder.build_filters(input_file, fps, width, height, crop_params)
+        if self.dedup:
+            filters.insert(1, 'mpdecimate')
+        filters = ','.join(filters)
+        # 差分模式下调色板只统计变化的像素，静态背景不占用颜色
+        stats_mode = 'diff' if self.diff_mode == 'rectangle' else 'full'
+        dither = self.dither
+        if dither == 'bayer':
+            dither = f'bayer:bayer_scale={self.bayer_scale}'
+        return (f"[0:v]{filters},split[a][b];"
+                f"[a]palettegen=max_colors={max(4, min(256, max_colors))}:stats_mode={stats_mode}[p];"
+                f"[b][p]paletteuse=dither={dither}:diff_mode={self.diff_mode}")
+    
+    def encode(self, input_file, output_file, start_time, end_time, fps, width, height, max_colors,
+               crop_params=None, progress_callback=None, cancel_check=None):
+        """编码GIF，返回写入的帧数"""
+        expected_frames = max(1, int((end_time - start_time) * fps))
+        filter_graph = self.build_filter_graph(input_file, fps, width, height, max_colors, crop_params)
+        print(f"FFmpeg编码: {filter_graph}")
+        
+        cmd = [self.ffmpeg_path, '-v', 'error', '-nostdin', '-y',
+               '-ss', f'{start_time:.3f}', '-to', f'{end_time:.3f}', '-i', str(input_file),
+               '-an', '-sn', '-filter_complex', filter_graph, '-frames:v', str(expected_frames),
+               *(['-vsync', 'vfr'] if self.dedup else []),
+               '-loop', '0', '-progress', 'pipe:1', '-nostats', '-f', 'gif', str(output_file)]
+        stderr_file = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+                                   creationflags=FFmpegFrameDecoder.CREATION_FLAGS)
+        frame_count = 0
+        try:
+            # -progress 每隔约0.5秒输出一组 key=value
+            for line in process.stdout:
+                key, _, value = line.decode('ascii', 'replace').strip().partition('=')
+                if key == 'frame' and value.isdigit():
+                    frame_count = int(value)
+                    if progress_callback:
+                        progress_callback(f"FFmpeg编码中... {frame_count}/{expected_frames}")
+                if cancel_check and not cancel_check():
+                    raise Exception("转换被取消")
+            process.wait()
+            stderr_file.seek(0)
+            error = stderr_file.read().decode('utf-8', 'replace').strip()
+            if process.returncode != 0:
+                raise Exception(f"ffmpeg编码失败: {error[-500:]}")
+        except Exception:
+            Path(output_file).unlink(missing_ok=True)
+            raise
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            stderr_file.close()
+        return frame_count
+
+class MotionAdaptiveSampler:
+    """运动自适应取帧 - 低分辨率解码片段内的每个源帧测量帧间运动量，总帧数不变，运动剧烈处多取帧、静止处少取帧
+    
+    取帧时刻按运动量的累积分布等分，局部帧率与运动量成正比，并限制在目标帧率的
+    [MIN_RATE_RATIO, MAX_RATE_RATIO]倍之间（且不超过源帧率和GIF最短帧延时对应的50fps），静止画面仍会定期更新。
+    每帧的显示时长为到下一取样帧的时间，以目标帧间隔为单位给出。
+    """
+    
+    ANALYSIS_SIZE = (64, 36)
+    MIN_RATE_RATIO = 0.25
+    MAX_RATE_RATIO = 3.0
+    # GIF最短帧延时（毫秒），与write_gif一致；更短的帧间隔无法显示，只会被拉长并挤占后续帧的时长
+    MIN_FRAME_MS = 20
+    # 运动量平滑窗口（秒），避免单帧噪声造成取帧时刻抖动
+    SMOOTH_SECONDS = 0.25
+    
+    def __init__(self, ffmpeg_path=None):
+        self.ffmpeg_path = ffmpeg_path
+    
+    def measure(self, input_file, start_time, end_time):
+        """返回 (源帧率, 各源帧与前一帧的平均像素差)，失败时返回None"""
+        width, height = self.ANALYSIS_SIZE
+        cap = None
+        if self.ffmpeg_path:
+            decoder = FFmpegFrameDecoder(self.ffmpeg_path)
+            source_fps = decoder.probe_fps(input_file)
+            thumbnails = decoder.iter_thumbnails(input_file, start_time, end_time, width, height)
+        elif CV2_AVAILABLE:
+            cap = cv2.VideoCapture(input_file)
+            if not cap.isOpened():
+                return None
+            source_fps = cap.get(cv2.CAP_PROP_FPS)
+            start_frame = int(start_time * source_fps)
+            end_frame = min(int(end_time * source_fps), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            thumbnails = self._iter_opencv_thumbnails(cap, end_frame - start_frame, width, height)
+        else:
+            return None
+        
+        motion = []
+        previous = None
+        try:
+            for thumbnail in thumbnails:
+                current = thumbnail.astype(np.int16)
+                motion.append(0.0 if previous is None else float(np.abs(current - previous).mean()))
+                previous = current
+        except Exception as e:
+            print(f"运动量分析失败: {e}")
+            return None
+        finally:
+            if cap is not None:
+                cap.release()
+        
+        if not source_fps or len(motion) < 2:
+            return None
+        return source_fps, np.array(motion)
+    
+    @staticmethod
+    def _iter_opencv_thumbnails(cap, frame_count, width, height):
+        for _ in range(max(0, frame_count)):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    
+    def allocate(self, motion, source_fps, fps, frame_budget):
+        """把frame_budget帧按运动量分配到各源帧，返回 (片段内源帧序号数组, 各帧以目标帧间隔为单位的显示时长)"""
+        source_count = len(motion)
+        frame_budget = max(1, min(frame_budget, source_count))
+        weights = np.asarray(motion, dtype=np.float64).copy()
+        weights[0] = weights[1]  # 第一帧没有前一帧
+        window = int(round(self.SMOOTH_SECONDS * source_fps))
+        if 1 < window < source_count:
+            weights = np.convolve(weights, np.ones(window) / window, mode='same')
+        
+        # 归一化为相对目标帧率的倍数并限制范围；限幅后均值改变，重复几次使均值回到1
+        max_ratio = max(1.0, min(self.MAX_RATE_RATIO, source_fps / fps, 1000 / fps / self.MIN_FRAME_MS))
+        if weights.mean() <= 1e-6:
+            weights = np.ones(source_count)
+        for _ in range(4):
+            weights = np.clip(weights / weights.mean(), self.MIN_RATE_RATIO, max_ratio)
+        
+        # 第k帧取在累积权重达到总量k/frame_budget的源帧；高运动段超过源帧率时相邻取样落到同一帧，去重后少于预算
+        cumulative = np.concatenate(([0.0], np.cumsum(weights)))
+        targets = np.arange(frame_budget) * (cumulative[-1] / frame_budget)
+        indices = np.unique(np.clip(np.searchsorted(cumulative, targets, side='right') - 1, 0, source_count - 1))
+        # 源帧网格上相邻取样可能比GIF最短帧延时更近（如60fps源的相邻帧），跳过这些帧
+        min_gap = self.MIN_FRAME_MS * source_fps / 1000
+        kept = [indices[0]]
+        for index in indices[1:]:
+            if index - kept[-1] >= min_gap - 1e-9:
+                kept.append(index)
+        indices = np.asarray(kept)
+        spans = np.diff(np.append(indices, source_count))
+        return indices, spans * (fps / source_fps)
+    
+    def plan(self, input_file, start_time, end_time, fps):
+        """测量并分配，返回 (源帧序号数组, 显示时长数组)，无法分析时返回None（改用固定帧率）"""
+        started = time.perf_counter()
+        measured = self.measure(input_file, start_time, end_time)
+        if measured is None:
+            print("运动量分析失败，按固定帧率取帧")
+            return None
+        source_fps, motion = measured
+        indices, holds = self.allocate(motion, source_fps, fps, int((end_time - start_time) * fps))
+        interval = 1000 / fps
+        print(f"运动自适应取帧: {len(motion)} 个源帧中取 {len(indices)} 帧，"
+              f"帧间隔 {holds.min() * interval:.0f}-{holds.max() * interval:.0f}ms，"
+              f"分析耗时 {time.perf_counter() - started:.2f}秒")
+        return indices, holds
+
+class OptimizedFrameProcessor:
+    """优化的帧处理器 - 大幅提升转换速度"""
+    
+    # 可选的帧处理引擎
+    ENGINES = ('thread', 'process')
+    # 调色板模式：local 每帧独立量化，global 所有帧共用一个调色板
+    PALETTE_MODES = ('local', 'global')
+    # 解码器：auto 有ffmpeg时用ffmpeg，否则OpenCV；ffmpeg 未安装时同样回退到OpenCV
+    DECODERS = ('auto', 'opencv', 'ffmpeg')
+    # 量化抖动方式（速度与大小的实测对比见 benchmarks/bench_dither_modes.py）：
+    #   none            不抖动：最快，文件最小，渐变处有色带
+    #   ordered         8x8 Bayer有序抖动：NumPy一次叠加阈值矩阵后由PIL映射到调色板，耗时与误差扩散相近
+    #                   （主要开销在生成调色板）；抖动图案固定不随帧变化，配合全局调色板（--palette global）时
+    #                   静止区域前后帧像素相同，帧间差分仍然有效，文件明显小于误差扩散；逐帧调色板（local）下
+    #                   每帧调色板颜色不同，抖动后的像素逐帧变化，差分失效，文件反而比误差扩散更大
+    #   error_diffusion Floyd–Steinberg误差扩散：渐变最平滑，但误差随内容传播，静止区域的噪点也逐帧变化，
+    #                   帧间差分几乎失效
+    DITHER_MODES = ('none', 'ordered', 'error_diffusion')
+    BAYER_ORDER = 3
+    _bayer_cache = {}
+    # 近似重复帧合并：比较缩略图（区域平均后压缩噪声基本抵消），任一格子的平均差都低于阈值（0-255）时视为重复
+    DEDUP_THRESHOLD = 4.0
+    THUMBNAIL_SIZE = (64, 36)
+    # 取帧方式：fixed 固定帧率；adaptive 总帧数不变，按画面运动量分配（见MotionAdaptiveSampler）
+    SAMPLING_MODES = ('fixed', 'adaptive')
+    
+    def __init__(self, max_workers=None, pipeline_window=None, engine='thread', palette_mode='local',
+                 persistent=False, seek_strategy='auto', decoder='auto', dither='none', dedup_threshold=0,
+                 sampling='fixed', memory_budget=None, spill_dir=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"未知的帧处理引擎: {engine}")
+        if palette_mode not in self.PALETTE_MODES:
+            raise ValueError(f"未知的调色板模式: {palette_mode}")
+        if seek_strategy not in FrameSeeker.STRATEGIES:
+            raise ValueError(f"未知的跳帧策略: {seek_strategy}")
+        if decoder not in self.DECODERS:
+            raise ValueError(f"未知的解码器: {decoder}")
+        if dither not in self.DITHER_MODES:
+            raise ValueError(f"未知的抖动方式: {dither}")
+        if sampling not in self.SAMPLING_MODES:
+            raise ValueError(f"未知的取帧方式: {sampling}")
+        self.engine = engine
+        self.palette_mode = palette_mode
+        self.seek_strategy = seek_strategy
+        self.decoder = decoder
+        self.dither = dither
+        # 大于0时丢弃与上一保留帧近似相同的帧，其时长并入上一帧
+        # （帧的info['frame_hold']记录显示时长，以目标帧间隔为单位）
+        self.dedup_threshold = dedup_threshold
+        self.sampling = sampling
+        # 帧数据内存预算（字节，None为不限制），超出时全局调色板阶段的帧转存到spill_dir
+        self.memory_budget = memory_budget
+        self.spill_dir = Path(spill_dir) if spill_dir else Path(tempfile.gettempdir())
+        self.last_memory_report = {}
+        
+        # 根据CPU核心数自动设置工作线程数，但优化线程配置
+        if max_workers is None:
+            cpu_count = os.cpu_count() or 1
+            if engine == 'process':
+                # 进程池不受GIL限制，每个核心一个进程
+                max_workers = cpu_count
+            else:
+                # 对于I/O密集型任务，可以使用更多线程
+                max_workers = min(12, cpu_count * 2)  # 提高到CPU核心数的2倍，最多12个线程
+        self.max_workers = max_workers
+        
+        # 流水线窗口：同一时刻最多存活的原始帧数量（解码与处理重叠进行）
+        if pipeline_window is None:
+            pipeline_window = max_workers * 2
+        self.pipeline_window = max(1, int(pipeline_window))
+        
+        # 常驻模式：执行器在多次转换之间复用，避免每次转换都创建线程/进程池（常驻服务使用）
+        self.persistent = persistent
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        worker_desc = "进程" if engine == 'process' else "线程"
+        print(f"使用 {max_workers} 个{worker_desc}进行帧处理，流水线窗口 {self.pipeline_window} 帧")
+    
+    @staticmethod
+    def process_frame_batch_optimized(frame_data, target_width, target_height, max_colors, crop_params=None,
+                                      quantize=True, rgb_input=False, dither='none'):
+        """优化的批量帧处理 - 减少内存拷贝和提高处理效率（quantize=False时返回RGB帧，由全局调色板统一映射）
+        
+        rgb_input=True表示帧已由解码器裁切缩放为目标尺寸的RGB，只需量化。
+        """
+        try:
+            from PIL import Image
+            
+            frame, frame_index = frame_data
+            
+            if rgb_input:
+                img = Image.fromarray(frame)
+                if img.size != (target_width, target_height):
+                    img = img.resize((target_width, target_height), Image.Resampling.BILINEAR)
+                del frame
+                return frame_index, OptimizedFrameProcessor._quantize_image(img, max_colors, dither) if quantize else img
+            
+            # 裁切、缩放、通道转换在NumPy/OpenCV中完成，只在量化（编码）前创建PIL图像
+            frame_rgb = OptimizedFrameProcessor.resize_frame(frame, target_width, target_height, crop_params)
+            img = Image.fromarray(frame_rgb)
+            
+            if quantize:
+                img = OptimizedFrameProcessor._quantize_image(img, max_colors, dither)
+            
+            # 立即清理原始帧数据
+            del frame, frame_rgb
+            
+            return frame_index, img
+            
+        except Exception as e:
+            print(f"处理第{frame_index}帧时出错: {e}")
+            return frame_index, None
+    
+    @staticmethod
+    def resize_frame(frame, target_width, target_height, crop_params=None):
+        """BGR帧裁切并缩放到目标尺寸，返回RGB数组
+        
+        裁切只取视图不拷贝；在BGR下直接从源分辨率缩放，通道转换只作用于缩小后的帧。
+        缩小用区域平均（抗锯齿，比PIL的LANCZOS快得多），放大用双线性。
+        """
+        if crop_params and any(crop_params):
+            crop_top, crop_bottom, crop_left, crop_right = crop_params
+            h, w = frame.shape[:2]
+            if crop_top + crop_bottom < h and crop_left + crop_right < w:
+                frame = frame[crop_top:h-crop_bottom, crop_left:w-crop_right]
+        
+        height, width = frame.shape[:2]
+        if (width, height) != (target_width, target_height):
+            interpolation = cv2.INTER_AREA if target_width * target_height < width * height else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, (target_width, target_height), interpolation=interpolation)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    @staticmethod
+    def _quantize_image(img, max_colors, dither='none'):
+        """优化的颜色量化 - 根据颜色数量选择最佳策略；256色及以上时不量化（也不抖动），原样返回"""
+        from PIL import Image
+        
+        if max_colors >= 256:
+            return img
+        if dither != 'none':
+            # 先按相同策略生成调色板，再带抖动映射到调色板
+            palette_image = img.quantize(colors=max_colors, method=GlobalPalette.quantize_method(max_colors))
+            if dither == 'ordered':
+                source = Image.fromarray(OptimizedFrameProcessor.ordered_dither(np.asarray(img.convert('RGB')), max_colors))
+                return source.quantize(palette=palette_image, dither=Image.Dither.NONE)
+            return img.convert('RGB').quantize(palette=palette_image, dither=Image.Dither.FLOYDSTEINBERG)
+        
+        if max_colors <= 32:
+            # 极少颜色时使用最快的MAXCOVERAGE方法
+            return img.quantize(colors=max_colors, method=Image.Quantize.MAXCOVERAGE)
+        elif max_colors <= 64:
+            # 较少颜色时使用FASTOCTREE方法
+            return img.quantize(colors=max_colors, method=Image.Quantize.FASTOCTREE)
+        else:
+            # 较多颜色时使用MEDIANCUT方法获得更好质量
+            return img.quantize(colors=max_colors, method=Image.Quantize.MEDIANCUT)
+    
+    @classmethod
+    def bayer_matrix(cls, order=None):
+        """2^order阶Bayer阈值矩阵，归一化到[-0.5, 0.5)"""
+        order = order or cls.BAYER_ORDER
+        matrix = cls._bayer_cache.get(order)
+        if matrix is None:
+            matrix = np.zeros((1, 1))
+            for _ in range(order):
+                matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+            matrix = (matrix + 0.5) / matrix.size - 0.5
+            cls._bayer_cache[order] = matrix
+        return matrix
+    
+    @classmethod
+    def ordered_dither(cls, rgb, max_colors):
+        """按像素位置叠加Bayer阈值，之后映射到最近的调色板颜色即为有序抖动
+        
+        阈值幅度取均匀调色板颜色间距的一半：再大时色带不再减少，文件却继续变大。
+        """
+        height, width = rgb.shape[:2]
+        spread = 0.5 * 255 / max(2, max_colors) ** (1 / 3)
+        matrix = cls.bayer_matrix()
+        size = len(matrix)
+        offsets = np.round(matrix * spread).astype(np.int16)
+        offsets = np.tile(offsets, (-(-height // size), -(-width // size)))[:height, :width, None]
+        return np.clip(rgb.astype(np.int16) + offsets, 0, 255).astype(np.uint8)
+    
+    @classmethod
+    def frame_thumbnail(cls, frame):
+        """区域平均缩小为缩略图，用于近似重复帧比较"""
+        if CV2_AVAILABLE:
+            thumbnail = cv2.resize(frame, cls.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        else:
+            width, height = cls.THUMBNAIL_SIZE
+            h, w = frame.shape[:2]
+            block_h, block_w = max(1, h // height), max(1, w // width)
+            thumbnail = frame[:block_h * height, :block_w * width].reshape(
+                height, block_h, width, block_w, -1).mean(axis=(1, 3))
+        return thumbnail.astype(np.float32)
+    
+    @staticmethod
+    def thumbnail_difference(a, b):
+        """两张缩略图差异最大的格子的平均差（局部变化如字幕、光标不会被整体平均掩盖）"""
+        return float(np.abs(a - b).mean(axis=-1).max())
+    
+    def extract_and_process_frames_optimized(self, input_file, start_time, end_time, fps, 
+                                          target_width, target_height, max_colors, 
+                                          crop_params=None, progress_callback=None, crop_analyzer=None):
+        """优化的帧提取和处理 - 流水线处理提高效率，一次返回所有帧"""
+        frames = list(self.iter_processed_frames(
+            input_file, start_time, end_time, fps,
+            target_width, target_height, max_colors,
+            crop_params, progress_callback, crop_analyzer
+        ))
+        
+        if not frames:
+            raise Exception("所有帧处理失败")
+        return frames
+    
+    def iter_processed_frames(self, input_file, start_time, end_time, fps,
+                              target_width, target_height, max_colors,
+                              crop_params=None, progress_callback=None, crop_analyzer=None):
+        """流式帧提取和处理 - 按帧顺序逐个产出，内存占用只与流水线窗口有关
+        
+        指定crop_analyzer（TemporalCropAnalyzer）且没有crop_params时，用解码循环中最先解码的帧分析裁切参数。
+        各阶段的帧数据内存预估与峰值见MemoryBudget，结束后保存在last_memory_report中。
+        """
+        memory = MemoryBudget(self.memory_budget)
+        frame_iter = self._iter_ordered_frames(
+            input_file, start_time, end_time, fps,
+            target_width, target_height, max_colors,
+            crop_params, progress_callback, crop_analyzer, memory=memory
+        )
+        
+        delivered = 0
+        if self.palette_mode == 'global':
+            # 全局调色板需要所有帧的像素样本，只能先收集（缩放后的）全部帧再映射；超出内存预算时转存磁盘
+            frames = []
+            store = None
+            try:
+                for frame in frame_iter:
+                    if memory.spill:
+                        if store is None:
+                            store = FrameSpillStore(self.spill_dir, memory.frame_count, *frame.size)
+                        store.append(frame)
+                        memory.track('spill', store.nbytes - memory.usage['spill'])
+                    else:
+                        frames.append(frame)
+                        memory.track('palette', frame.width * frame.height * 3)
+                    del frame
+                if store is not None:
+                    print(f"全局调色板帧转存磁盘: {len(store)} 帧，{store.nbytes / 1024 ** 2:.1f}MB")
+                    frames = store
+                
+                if frames:
+                    if progress_callback:
+                        progress_callback("构建全局调色板中...")
+                    global_palette = GlobalPalette.from_frames(frames, max_colors)
+                    print(f"全局调色板: {len(global_palette.colors)} 色")
+                    for i in range(len(frames)):
+                        frame = frames[i]
+                        mapped = global_palette.map_frame(frame, self.dither)
+                        if 'frame_hold' in frame.info:
+                            mapped.info['frame_hold'] = frame.info['frame_hold']
+                        yield mapped
+                        if store is None:
+                            frames[i] = None
+                            memory.track('palette', -frame.width * frame.height * 3)
+                        del frame
+                        delivered += 1
+            finally:
+                if store is not None:
+                    store.close()
+        else:
+            for frame in frame_iter:
+                yield frame
+                delivered += 1
+        
+        print(f"成功处理了 {delivered} 帧")
+        memory.print_report()
+        self.last_memory_report = memory.report()
+    
+    def iter_rgb_frames(self, input_file, start_time, end_time, fps, target_width, target_height,
+                        crop_params=None, progress_callback=None, crop_analyzer=None):
+        """产出裁切缩放后未量化的RGB帧（用于试编码和大小估算，不合并重复帧、不按运动量取帧以保持固定帧间隔）"""
+        # 256色时不量化；全局调色板模式下解码循环本身也不量化
+        return self._iter_ordered_frames(
+            input_file, start_time, end_time, fps,
+            target_width, target_height, 256,
+            crop_params, progress_callback, crop_analyzer, dedup_threshold=0, sampling='fixed',
+            memory=MemoryBudget(self.memory_budget)
+        )
+    
+    def _iter_ordered_frames(self, input_file, start_time, end_time, fps,
+                             target_width, target_height, max_colors,
+                             crop_params=None, progress_callback=None, crop_analyzer=None, dedup_threshold=None,
+                             sampling=None, memory=None):
+        """解码与并行处理流水线，按帧顺序产出处理结果"""
+        ffmpeg_path = find_ffmpeg() if self.decoder in ('auto', 'ffmpeg') else None
+        if self.decoder == 'ffmpeg' and ffmpeg_path is None:
+            print("未找到ffmpeg，改用OpenCV解码")
+        
+        # 运动自适应取帧：先低分辨率解码一遍测量运动量，决定要取的源帧和各帧显示时长
+        frame_indices = frame_holds = None
+        target_frame_count = int((end_time - start_time) * fps)
+        if (sampling or self.sampling) == 'adaptive':
+            if progress_callback:
+                progress_callback("分析画面运动量...")
+            plan = MotionAdaptiveSampler(ffmpeg_path).plan(input_file, start_time, end_time, fps)
+            if plan:
+                frame_indices, frame_holds = plan
+                target_frame_count = len(frame_indices)
+        
+        # 按解码帧大小和目标帧数预估内存，超出预算时收紧流水线窗口
+        if memory is None:
+            memory = MemoryBudget(self.memory_budget)
+        # 需要分析裁切参数时两种解码器都交付原始分辨率的帧，由解码循环在前几帧上分析（不再单独解码一遍）
+        analyze_crop = crop_params is None and crop_analyzer is not None
+        if ffmpeg_path and not analyze_crop:
+            decode_size = (target_width, target_height)
+            crop_buffer_frames = 0
+        else:
+            decode_size = self._probe_source_size(input_file) or (target_width, target_height)
+            crop_buffer_frames = crop_analyzer.buffer_frames if analyze_crop else 0
+        window_size = memory.plan(decode_size, (target_width, target_height), target_frame_count,
+                                  self.pipeline_window, self.palette_mode, crop_buffer_frames)
+        
+        if ffmpeg_path and analyze_crop:
+            # FFmpeg只抽帧，交付原始分辨率的BGR帧，裁切分析和裁切缩放与OpenCV解码相同
+            frame_source = FFmpegFrameDecoder(ffmpeg_path).iter_source_frames(
+                input_file, start_time, end_time, fps, frame_indices
+            )
+            yield from self._process_frames(
+                frame_source, target_frame_count, target_width, target_height, max_colors,
+                crop_params, progress_callback, crop_analyzer=crop_analyzer, dedup_threshold=dedup_threshold,
+                frame_holds=frame_holds, memory=memory, window_size=window_size
+            )
+        elif ffmpeg_path:
+            # FFmpeg解码：裁切、缩放、抽帧都在滤镜中完成，交付的帧已是目标尺寸的RGB
+            decoder = FFmpegFrameDecoder(ffmpeg_path)
+            frame_source = decoder.iter_frames(
+                input_file, start_time, end_time, fps, target_width, target_height, crop_params, frame_indices
+            )
+            yield from self._process_frames(
+                frame_source, target_frame_count, target_width, target_height, max_colors,
+                crop_params, progress_callback, rgb_input=True, dedup_threshold=dedup_threshold,
+                frame_holds=frame_holds, memory=memory, window_size=window_size
+            )
+        else:
+            frame_source = self._iter_opencv_frames(input_file, start_time, end_time, fps, frame_indices)
+            yield from self._process_frames(
+                frame_source, target_frame_count, target_width, target_height, max_colors,
+                crop_params, progress_callback, crop_analyzer=crop_analyzer, dedup_threshold=dedup_threshold,
+                frame_holds=frame_holds, memory=memory, window_size=window_size
+            )
+    
+    @staticmethod
+    def _probe_source_size(input_file):
+        """OpenCV读取源视频分辨率 (宽, 高)，失败时返回None"""
+        if not CV2_AVAILABLE:
+            return None
+        cap = cv2.VideoCapture(input_file)
+        try:
+            if not cap.isOpened():
+                return None
+            return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+    
+    def _iter_opencv_frames(self, input_file, start_time, end_time, fps, frame_indices=None):
+        """OpenCV解码，按帧间隔（或指定的片段内源帧序号）产出原始BGR帧"""
+        if not CV2_AVAILABLE:
+            raise Exception("需要OpenCV支持")
+        
+        cap = cv2.VideoCapture(input_file)
+        
+        if not cap.isOpened():
+            raise Exception(f"无法打开视频文件: {input_file}")
+        
+        try:
+            # 获取视频信息
+            video_fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            
+            # 计算需要提取的帧
+            duration = end_time - start_time
+            target_frame_count = int(duration * fps)
+            
+            # 设置起始位置
+            start_frame = int(start_time * video_fps)
+            end_frame = min(int(end_time * video_fps), total_frames)
+            
+            # 优化的帧间隔计算
+            available_frames = end_frame - start_frame
+            frame_step = max(1, available_frames // target_frame_count)
+            
+            print(f"视频信息: FPS={video_fps:.2f}, 总帧数={total_frames}")
+            print(f"提取范围: 第{start_frame}帧到第{end_frame}帧，间隔{frame_step}帧")
+            print(f"预计提取 {target_frame_count} 帧")
+            
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            
+            if frame_indices is not None:
+                yield from self._read_selected_frames(cap, input_file, start_frame, frame_indices)
+                return
+            
+            # 跳帧策略：需要跳帧时按步长和关键帧间隔选择grab或seek
+            keyframes = None
+            if frame_step > 1 and self.seek_strategy in ('auto', 'keyframe'):
+                keyframes = FrameSeeker.read_keyframes(input_file)
+            seeker = FrameSeeker(cap, self.seek_strategy, keyframes)
+            
+            current_frame_pos = start_frame
+            extracted_count = 0
+            while current_frame_pos < end_frame and extracted_count < target_frame_count:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                
+                # 只处理需要的帧（cap.read每次返回新数组，无需再拷贝）
+                if (current_frame_pos - start_frame) % frame_step == 0:
+                    yield frame
+                    extracted_count += 1
+                
+                del frame
+                current_frame_pos += 1
+                
+                # 跳帧以提高速度
+                if frame_step > 1:
+                    next_pos = current_frame_pos + frame_step - 1
+                    seeker.skip_to(current_frame_pos, next_pos)
+                    current_frame_pos = next_pos
+            
+            if frame_step > 1:
+                print(f"跳帧策略: {seeker.describe()}")
+        finally:
+            cap.release()
+    
+    def _read_selected_frames(self, cap, input_file, start_frame, frame_indices):
+        """按片段内的源帧序号读取，帧之间用跳帧策略前进"""
+        keyframes = None
+        if self.seek_strategy in ('auto', 'keyframe'):
+            keyframes = FrameSeeker.read_keyframes(input_file)
+        seeker = FrameSeeker(cap, self.seek_strategy, keyframes)
+        
+        print(f"按运动量提取 {len(frame_indices)} 帧")
+        current_frame_pos = start_frame
+        for index in frame_indices:
+            target_pos = start_frame + int(index)
+            seeker.skip_to(current_frame_pos, target_pos)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            del frame
+            current_frame_pos = target_pos + 1
+        print(f"跳帧策略: {seeker.describe()}")
+    
+    def _process_frames(self, frame_source, target_frame_count, target_width, target_height, max_colors,
+                        crop_params=None, progress_callback=None, crop_analyzer=None, rgb_input=False,
+                        dedup_threshold=None, frame_holds=None, memory=None, window_size=None):
+        """并行处理解码出的帧，按帧顺序产出处理结果
+        
+        流水线方式：当前线程负责解码（生产者），线程池负责处理（消费者）
+        用信号量限制在途的原始帧数量，解码与处理重叠进行且内存占用有上限
+        合并重复帧时，近似重复的帧在提交处理前丢弃，不再做裁切、缩放、量化和编码
+        frame_holds为各解码帧的显示时长（以目标帧间隔为单位，运动自适应取帧时给出），默认每帧为1
+        window_size为内存预算给出的流水线窗口（默认pipeline_window），memory记录各阶段持有的帧数据
+        """
+        frame_slots = None
+        window_size = window_size or self.pipeline_window
+        memory = memory or MemoryBudget()
+        window = threading.BoundedSemaphore(window_size)
+        # 全局调色板模式下工作线程只做裁切和缩放，量化在所有帧完成后统一进行
+        quantize = self.palette_mode == 'local'
+        futures = []
+        next_index = 0
+        extracted_count = 0
+        
+        # 每个提交的帧的显示时长（自身 + 之后被合并的重复帧）
+        if dedup_threshold is None:
+            dedup_threshold = self.dedup_threshold
+        holds = []
+        submitted_count = 0
+        last_thumbnail = None
+        dropped_count = 0
+        # 合并重复帧时最后提交的帧的时长还可能增加，暂不交付
+        held_back = 1 if dedup_threshold > 0 else 0
+        
+        # 需要分析裁切参数时，先暂存最初解码的帧，分析完成后再提交处理
+        pending_frames = []
+        pending_bytes = 0
+        if crop_params is None and crop_analyzer is not None:
+            if progress_callback:
+                progress_callback("分析裁切参数中...")
+            crop_buffer_frames = crop_analyzer.buffer_frames
+            if memory.crop_buffer_frames:
+                crop_buffer_frames = min(crop_buffer_frames, memory.crop_buffer_frames)
+        else:
+            crop_analyzer = None
+        
+        try:
+            with self._create_executor() as executor:
+                # 登记在途原始帧和待交付结果的内存占用
+                result_bytes = target_width * target_height * (1 if quantize else 3)
+                
+                def frame_done(nbytes):
+                    memory.track('decode', -nbytes)
+                    memory.track('process', result_bytes)
+                
+                def submit(frame):
+                    nonlocal frame_slots, last_thumbnail, dropped_count, submitted_count
+                    hold = 1 if frame_holds is None or submitted_count >= len(frame_holds) else \
+                        float(frame_holds[submitted_count])
+                    submitted_count += 1
+                    if dedup_threshold > 0:
+                        thumbnail = self.frame_thumbnail(frame)
+                        if (last_thumbnail is not None and
+                                self.thumbnail_difference(thumbnail, last_thumbnail) < dedup_threshold):
+                            holds[-1] += hold
+                            dropped_count += 1
+                            return
+                        last_thumbnail = thumbnail
+                    
+                    frame_index = len(futures)
+                    if self.engine == 'process':
+                        # 进程引擎：帧拷贝进共享内存槽，槽用尽时阻塞解码
+                        if frame_slots is None:
+                            frame_slots = SharedFrameSlots(window_size, frame.nbytes)
+                        slot_index, shm_name = frame_slots.put(frame)
+                        memory.track('decode', frame.nbytes)
+                        future = executor.submit(
+                            _process_shared_frame,
+                            shm_name,
+                            frame.shape,
+                            frame_index,
+                            target_width,
+                            target_height,
+                            max_colors,
+                            crop_params,
+                            quantize,
+                            rgb_input,
+                            self.dither
+                        )
+                        future.add_done_callback(lambda f, i=slot_index: frame_slots.release(i))
+                        future.add_done_callback(lambda f, n=frame.nbytes: frame_done(n))
+                    else:
+                        # 窗口已满时阻塞解码，等待工作线程处理完释放名额
+                        window.acquire()
+                        memory.track('decode', frame.nbytes)
+                        future = executor.submit(
+                            self.process_frame_batch_optimized,
+                            (frame, frame_index),
+                            target_width,
+                            target_height,
+                            max_colors,
+                            crop_params,
+                            quantize,
+                            rgb_input,
+                            self.dither
+                        )
+                        future.add_done_callback(lambda f: window.release())
+                        future.add_done_callback(lambda f, n=frame.nbytes: frame_done(n))
+                    futures.append(future)
+                    holds.append(hold)
+                
+                for frame in frame_source:
+                    if crop_analyzer is not None:
+                        pending_frames.append(frame)
+                        pending_bytes += frame.nbytes
+                        memory.track('crop', frame.nbytes)
+                        if len(pending_frames) >= crop_buffer_frames:
+                            crop_params = crop_analyzer.analyze(pending_frames)
+                            crop_analyzer = None
+                            for pending_frame in pending_frames:
+                                submit(pending_frame)
+                            pending_frames = []
+                            memory.track('crop', -pending_bytes)
+                    else:
+                        submit(frame)
+                    extracted_count += 1
+                    del frame
+                    
+                    # 更新进度
+                    if progress_callback and extracted_count % 30 == 0:
+                        progress_callback(f"提取并处理帧中... 已解码{extracted_count} 已交付{next_index}/{target_frame_count}")
+                    
+                    # 按顺序交付已完成的帧，乱序完成的结果暂存在各自的future中
+                    delivered_index = next_index
+                    ready_frames, next_index = self._pop_ready_frames(
+                        futures, next_index, holds=holds, limit=len(futures) - held_back
+                    )
+                    memory.track('process', -(next_index - delivered_index) * result_bytes)
+                    yield from ready_frames
+                    del ready_frames
+                
+                # 片段较短，全部帧都在暂存区内：用整个片段的取样分析裁切参数
+                if pending_frames:
+                    crop_params = crop_analyzer.analyze(pending_frames)
+                    for pending_frame in pending_frames:
+                        submit(pending_frame)
+                    pending_frames = []
+                    memory.track('crop', -pending_bytes)
+                
+                print(f"实际提取了 {extracted_count} 帧")
+                if dropped_count:
+                    print(f"合并近似重复帧: 丢弃 {dropped_count} 帧，时长并入前一帧")
+                
+                if not futures:
+                    raise Exception("未能提取到任何帧")
+                
+                # 等待并交付剩余的帧（大部分帧在解码期间已处理完成）
+                if progress_callback:
+                    progress_callback(f"处理剩余帧中... {len(futures) - next_index}/{len(futures)}")
+                while next_index < len(futures):
+                    delivered_index = next_index
+                    ready_frames, next_index = self._pop_ready_frames(futures, next_index, block=True, holds=holds)
+                    memory.track('process', -(next_index - delivered_index) * result_bytes)
+                    yield from ready_frames
+                    del ready_frames
+            
+        finally:
+            # 提前结束时关闭解码器（释放VideoCapture或结束ffmpeg进程）
+            frame_source.close()
+            if frame_slots is not None:
+                frame_slots.close()
+    
+    @staticmethod
+    def _pop_ready_frames(futures, next_index, block=False, holds=None, limit=None):
+        """按帧顺序取出已完成的处理结果，block=True时等待下一帧完成，返回 (帧列表, 新的next_index)
+        
+        holds为各帧的显示时长（以目标帧间隔为单位，不为1时写入info['frame_hold']），limit为本次最多交付到的帧序号。
+        """
+        ready_frames = []
+        limit = len(futures) if limit is None else limit
+        while next_index < limit and (block or futures[next_index].done()):
+            future = futures[next_index]
+            futures[next_index] = None  # 交付后释放结果引用
+            next_index += 1
+            try:
+                _, processed_frame = future.result()
+            except Exception as e:
+                # 丢弃这一帧会让之后的帧整体提前显示，直接中止转换
+                raise Exception(f"处理第{next_index - 1}帧时出错: {e}") from e
+            if processed_frame is None:
+                # 工作者内部出错（错误已输出）
+                raise Exception(f"处理第{next_index - 1}帧失败")
+            if holds and holds[next_index - 1] != 1:
+                processed_frame.info['frame_hold'] = holds[next_index - 1]
+            ready_frames.append(processed_frame)
+            if block:
+                break
+        return ready_frames, next_index
+    
+    def _create_executor(self):
+        """按所选引擎创建帧处理执行器，常驻模式下返回共享的执行器（with结束时不关闭）"""
+        if self.persistent:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = self._new_executor()
+                return nullcontext(self._executor)
+        return self._new_executor()
+    
+    def _new_executor(self):
+        if self.engine == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_process_worker)
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+    
+    def warm_up(self):
+        """常驻模式下提前启动所有工作线程/进程并完成导入"""
+        if not self.persistent:
+            return
+        from PIL import Image  # 提前完成PIL导入，第一次转换不再承担导入开销
+        with self._create_executor() as executor:
+            # 执行器按需启动工作者，提交与工作者数量相同的短任务让它们全部启动
+            list(executor.map(time.sleep, [0.05] * self.max_workers))
+    
+    def close(self):
+        """关闭常驻执行器"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+class GifDeltaEncoder:
+    """帧间差分编码 - 只保留相对上一帧变化的矩形区域，区域内未变化的像素标记为透明"""
+    
+    def __init__(self, threshold=0):
+        # threshold: 通道差值不超过该值视为未变化（0为无损）
+        self.threshold = threshold
+        self.canvas = None  # 当前画面（观看者看到的合成结果）
+    
+    @staticmethod
+    def _to_palette(img):
+        """转换为P模式，RGB帧量化为255色以预留一个透明色索引"""
+        if img.mode == 'P':
+            return img
+        return img.convert('RGB').quantize(colors=255)
+    
+    def encode(self, img):
+        """编码一帧，返回 (裁切后的P模式帧, 偏移(x, y), 透明色索引或None)"""
+        from PIL import Image
+        
+        frame = self._to_palette(img)
+        rgb = np.asarray(frame.convert('RGB'))
+        
+        palette = frame.getpalette() or []
+        color_count = len(palette) // 3
+        
+        # 第一帧或尺寸变化时输出完整画面
+        if self.canvas is None or self.canvas.shape != rgb.shape:
+            self.canvas = rgb.copy()
+            if color_count < 256:
+                # 同样预留透明色，使共用调色板的帧颜色表保持一致
+                frame = frame.copy()
+                frame.putpalette(palette + [0, 0, 0])
+            return frame, (0, 0), None
+        
+        # 向量化比较当前帧与画布
+        if self.threshold > 0:
+            diff = np.abs(rgb.astype(np.int16) - self.canvas.astype(np.int16))
+            changed = (diff > self.threshold).any(axis=2)
+        else:
+            changed = (rgb != self.canvas).any(axis=2)
+        
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        if rows.size == 0:
+            # 与上一帧完全相同，只输出1x1像素占位
+            top, bottom, left, right = 0, 1, 0, 1
+        else:
+            top, bottom = rows[0], rows[-1] + 1
+            left, right = cols[0], cols[-1] + 1
+        
+        changed_box = changed[top:bottom, left:right]
+        indices = np.array(frame)[top:bottom, left:right]
+        
+        # 调色板有空位时用额外索引表示透明，否则只裁切不透明
+        transparency = None
+        if color_count < 256:
+            transparency = color_count
+            indices[~changed_box] = transparency
+            palette = palette + [0, 0, 0]
+        
+        # 更新画布：只有变化的像素会被覆盖
+        canvas_box = self.canvas[top:bottom, left:right]
+        canvas_box[changed_box] = rgb[top:bottom, left:right][changed_box]
+        
+        delta_frame = Image.frombytes('P', (right - left, bottom - top), np.ascontiguousarray(indices).tobytes())
+        delta_frame.putpalette(palette)
+        return delta_frame, (int(left), int(top)), transparency
+
+class GifFrameWriter:
+    """GIF逐帧写入器 - 每帧由PIL完成LZW编码，再按帧偏移、透明色和处置方式拼接写入文件"""
+    
+    def __init__(self, output_file, size=None, loop=0):
+        # size为None时使用第一帧的尺寸作为画布尺寸
+        self.size = size
+        self.loop = loop
+        self.global_table = None
+        self.frame_count = 0
+        # 也可以写入已打开的文件对象（如io.BytesIO），此时不负责关闭
+        self.owns_fp = not hasattr(output_file, 'write')
+        self.fp = open(output_file, 'wb') if self.owns_fp else output_file
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @staticmethod
+    def _skip_sub_blocks(data, pos):
+        """跳过数据子块，返回终止符之后的位置"""
+        while data[pos]:
+            pos += data[pos] + 1
+        return pos + 1
+    
+    @classmethod
+    def _encode_frame(cls, img):
+        """用PIL编码单帧，返回 (颜色表, 隔行标志, LZW图像数据)"""
+        buffer = io.BytesIO()
+        # 关闭调色板优化以保持像素索引（透明色索引）不被重映射
+        img.save(buffer, format='GIF', optimize=False, interlace=False)
+        data = buffer.getvalue()
+        
+        pos = 13
+        color_table = b''
+        if data[10] & 0x80:
+            table_size = 3 << ((data[10] & 0x07) + 1)
+            color_table = data[pos:pos + table_size]
+            pos += table_size
+        
+        # 跳过扩展块，找到图像描述符
+        while data[pos] != 0x2C:
+            if data[pos] != 0x21:
+                raise Exception("GIF帧数据格式异常")
+            pos = cls._skip_sub_blocks(data, pos + 2)
+        
+        image_flags = data[pos + 9]
+        interlace = image_flags & 0x40
+        pos += 10
+        if image_flags & 0x80:
+            table_size = 3 << ((image_flags & 0x07) + 1)
+            color_table = data[pos:pos + table_size]
+            pos += table_size
+        
+        # LZW最小码长 + 图像数据子块
+        image_data_start = pos
+        pos = cls._skip_sub_blocks(data, pos + 1)
+        return color_table, interlace, data[image_data_start:pos]
+    
+    @staticmethod
+    def _table_size_bits(color_table):
+        """颜色表长度对应的描述符尺寸位"""
+        return (len(color_table) // 3).bit_length() - 2
+    
+    def _write_header(self):
+        """写入文件头、逻辑屏幕描述符、全局颜色表和循环扩展"""
+        width, height = self.size
+        flags = 0x80 | 0x70 | self._table_size_bits(self.global_table)
+        self.fp.write(b'GIF89a' + struct.pack('<HHBBB', width, height, flags, 0, 0))
+        self.fp.write(self.global_table)
+        if self.loop is not None:
+            self.fp.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', self.loop) + b'\x00')
+    
+    def add_frame(self, img, duration, offset=(0, 0), disposal=1, transparency=None):
+        """写入一帧（duration单位毫秒）"""
+        color_table, interlace, image_data = self._encode_frame(img)
+        if self.frame_count == 0:
+            if self.size is None:
+                self.size = img.size
+            self.global_table = color_table
+            self._write_header()
+        
+        # 图形控制扩展：处置方式、延迟、透明色
+        gce_flags = (disposal & 0x07) << 2
+        if transparency is not None:
+            gce_flags |= 0x01
+        delay = int(round(duration / 10))
+        self.fp.write(b'\x21\xf9\x04' + struct.pack('<BHB', gce_flags, delay, transparency or 0) + b'\x00')
+        
+        # 图像描述符，颜色表与全局颜色表相同时省略局部颜色表
+        left, top = offset
+        width, height = img.size
+        image_flags = interlace
+        include_color_table = color_table != self.global_table
+        if include_color_table:
+            image_flags |= 0x80 | self._table_size_bits(color_table)
+        self.fp.write(b'\x2c' + struct.pack('<HHHHB', left, top, width, height, image_flags))
+        if include_color_table:
+            self.fp.write(color_table)
+        self.fp.write(image_data)
+        self.frame_count += 1
+    
+    def close(self):
+        """写入结束符并关闭文件"""
+        if self.fp.closed:
+            return
+        try:
+            if self.frame_count:
+                self.fp.write(b'\x3b')
+        finally:
+            if self.owns_fp:
+                self.fp.close()
+
+class VideoCache:
+    """下载缓存 - 按规范化视频ID、格式和时间范围寻址，原子写入，按LRU在磁盘配额内淘汰"""
+    
+    INDEX_FILE = 'index.json'
+    
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = self._load_index()
+        # 已交给任务、尚未release的缓存文件（文件名 -> 引用数），淘汰时跳过
+        self.pins = {}
+    
+    @staticmethod
+    def normalize_video_id(url):
+        """从链接中提取规范化的视频ID（BV号或av号加分P），无法识别时返回None"""
+        part_match = re.search(r'[?&]p=(\d+)', url)
+        part = int(part_match.group(1)) if part_match else 1
+        
+        bv_match = re.search(r'[Bb][Vv]([0-9A-Za-z]{10})', url)
+        if bv_match:
+            return f"BV{bv_match.group(1)}_p{part}"
+        av_match = re.search(r'/av(\d+)', url)
+        if av_match:
+            return f"av{av_match.group(1)}_p{part}"
+        return None
+    
+    def _load_index(self):
+        """读取缓存索引，丢弃文件已不存在的条目"""
+        index_path = self.cache_dir / self.INDEX_FILE
+        try:
+            entries = json.loads(index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        return {key: entry for key, entry in entries.items()
+                if (self.cache_dir / entry['file']).exists()}
+    
+    def _save_index(self):
+        """原子写入缓存索引"""
+        index_path = self.cache_dir / self.INDEX_FILE
+        temp_path = index_path.with_name(index_path.name + '.tmp')
+        temp_path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=1), encoding='utf-8')
+        os.replace(temp_path, index_path)
+    
+    def total_size(self):
+        """缓存占用的总字节数"""
+        return sum(entry['size'] for entry in self.entries.values())
+    
+    def lookup(self, video_id, start_time=None, end_time=None, fmt=None):
+        """查找覆盖[start_time, end_time]的缓存文件，返回 (路径, 文件起点时间) 或 None
+        
+        fmt为要求的格式（或格式列表），只返回以该格式下载的文件；None时不限格式
+        """
+        formats = (fmt,) if isinstance(fmt, str) else fmt
+        with self.lock:
+            best_key = None
+            for key, entry in self.entries.items():
+                if entry['video_id'] != video_id:
+                    continue
+                if formats is not None and entry.get('format') not in formats:
+                    continue
+                if start_time is not None and entry['start'] > start_time:
+                    continue
+                if entry['end'] is not None and (end_time is None or entry['end'] < end_time):
+                    continue
+                # 优先使用覆盖范围更小（起点更近）的文件，解码时需要跳过的数据更少
+                if best_key is None or entry['start'] > self.entries[best_key]['start']:
+                    best_key = key
+            
+            if best_key is None:
+                return None
+            entry = self.entries[best_key]
+            entry['last_access'] = time.time()
+            self.pins[entry['file']] = self.pins.get(entry['file'], 0) + 1
+            self._save_index()
+            return self.cache_dir / entry['file'], entry['start']
+    
+    def put(self, video_id, fmt, src_path, start_time=0.0, end_time=None):
+        """把下载好的文件原子地移入缓存并按配额淘汰，返回缓存中的路径（与lookup一样需要release）"""
+        src_path = Path(src_path)
+        key = f"{video_id}|{fmt}|{start_time}|{end_time}"
+        file_name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + src_path.suffix
+        cache_path = self.cache_dir / file_name
+        
+        with self.lock:
+            os.replace(src_path, cache_path)
+            self.entries[key] = {
+                'file': file_name,
+                'video_id': video_id,
+                'format': fmt,
+                'start': start_time,
+                'end': end_time,
+                'size': cache_path.stat().st_size,
+                'last_access': time.time()
+            }
+            self.pins[file_name] = self.pins.get(file_name, 0) + 1
+            self._evict(keep_key=key)
+            self._save_index()
+        return cache_path
+    
+    def contains(self, path):
+        """判断文件是否为缓存条目"""
+        path = Path(path)
+        return path.parent == self.cache_dir and any(
+            entry['file'] == path.name for entry in self.entries.values()
+        )
+    
+    def release(self, path):
+        """任务用完lookup/put返回的文件后调用，解除淘汰保护；path不是缓存条目时返回False"""
+        path = Path(path)
+        with self.lock:
+            if not self.contains(path):
+                return False
+            count = self.pins.get(path.name, 0) - 1
+            if count > 0:
+                self.pins[path.name] = count
+            else:
+                self.pins.pop(path.name, None)
+                # 使用期间因占用而没有淘汰的条目，现在补上
+                self._evict()
+                self._save_index()
+            return True
+    
+    def _evict(self, keep_key=None):
+        """按最近最少使用顺序淘汰条目，直到总大小不超过配额（正在被任务使用的条目不淘汰）"""
+        total = self.total_size()
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep_key:
+                continue
+            entry = self.entries[key]
+            if self.pins.get(entry['file']):
+                continue
+            try:
+                (self.cache_dir / entry['file']).unlink(missing_ok=True)
+            except OSError:
+                # 文件正在被使用（Windows），下次再淘汰
+                continue
+            total -= entry['size']
+            del self.entries[key]
+            print(f"缓存淘汰: {entry['video_id']} ({entry['size'] / (1024 * 1024):.1f}MB)")
+
+class VideoInfoCache:
+    """视频信息缓存 - 缓存yt-dlp的extract_info结果，内存与磁盘两级存储，超过TTL后失效"""
+    
+    def __init__(self, cache_dir, ttl=1800):
+        # 默认30分钟：信息中的视频流地址有时效，不宜缓存太久
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.memory = {}  # key -> (保存时间, info)
+    
+    def _path(self, key):
+        return self.cache_dir / (hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '.json')
+    
+    def get(self, key):
+        """读取未过期的视频信息，没有时返回None"""
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached is None:
+                try:
+                    data = json.loads(self._path(key).read_text(encoding='utf-8'))
+                    cached = (data['saved_at'], data['info'])
+                    self.memory[key] = cached
+                except (OSError, ValueError, KeyError):
+                    return None
+            
+            saved_at, info = cached
+            if time.time() - saved_at > self.ttl:
+                self.memory.pop(key, None)
+                return None
+            return info
+    
+    def put(self, key, info):
+        """保存视频信息到内存和磁盘（原子写入）"""
+        saved_at = time.time()
+        path = self._path(key)
+        temp_path = path.with_name(path.name + '.tmp')
+        with self.lock:
+            self.memory[key] = (saved_at, info)
+            try:
+                temp_path.write_text(json.dumps({'saved_at': saved_at, 'info': info}, ensure_ascii=False),
+                                     encoding='utf-8')
+                os.replace(temp_path, path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"视频信息缓存写入失败: {e}")
+    
+    def invalidate(self, key):
+        """删除缓存的视频信息"""
+        with self.lock:
+            self.memory.pop(key, None)
+            try:
+                self._path(key).unlink(missing_ok=True)
+            except OSError:
+                pass
+
+class VideoDownloader:
+    """视频下载器 - 通过yt-dlp下载bilibili视频，支持只下载所需时间段的分片"""
+    
+    HTTP_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    
+    # 优化的格式选择策略 - 避免需要合并的格式
+    FORMAT_OPTIONS = [
+        # 优先选择单一的完整格式，不需要合并
+        'best[ext=mp4][vcodec!=none][acodec!=none]',  # 优先mp4完整格式
+        'best[vcodec!=none][acodec!=none]',  # 任何完整格式
+        'best[ext=flv]',  # bilibili经常有flv格式
+        'worst[height>=360][vcodec!=none][acodec!=none]',  # 至少360p的完整格式
+        # 如果都没有，选择仅视频格式（无音频也可以转GIF）
+        'best[vcodec!=none]',  
+        'bestvideo[ext=mp4]',
+        'bestvideo',
+        # 最后的备选方案
+        'best'
+    ]
+    
+    DOWNLOAD_ERROR = ("无法下载视频，可能的原因：\n"
+                      "1. 网络连接问题\n"
+                      "2. 视频链接无效或已失效\n"
+                      "3. bilibili限制访问\n"
+                      "4. 视频需要登录或有地区限制\n"
+                      "\n建议：检查网络连接或尝试其他视频链接")
+    
+    def __init__(self, temp_dir, segment_download=True, cache=None, info_cache=None):
+        self.temp_dir = Path(temp_dir)
+        # 分段下载：只下载覆盖目标时间段的DASH分片，失败时自动回退到完整下载
+        self.segment_download = segment_download
+        # 下载缓存（VideoCache）和视频信息缓存（VideoInfoCache），为None时不缓存
+        self.cache = cache
+        self.info_cache = info_cache
+        self._short_links = {}  # 短链接 -> 视频ID
+    
+    def resolve_video_id(self, url):
+        """获取规范化视频ID，b23.tv短链接先解析跳转"""
+        video_id = VideoCache.normalize_video_id(url)
+        if video_id is None and 'b23.tv' in url:
+            if url in self._short_links:
+                return self._short_links[url]
+            try:
+                import requests
+                response = requests.head(url, headers=self.HTTP_HEADERS, allow_redirects=True, timeout=10)
+                video_id = VideoCache.normalize_video_id(response.url)
+                self._short_links[url] = video_id
+            except Exception as e:
+                print(f"短链接解析失败: {e}")
+        return video_id
+    
+    def extract_info(self, url, use_cache=True):
+        """获取视频信息，优先使用信息缓存"""
+        import yt_dlp
+        
+        cache_key = self.resolve_video_id(url) or url
+        if self.info_cache and use_cache:
+            info = self.info_cache.get(cache_key)
+            if info is not None:
+                print(f"使用缓存的视频信息: {cache_key}")
+                return info
+        
+        ydl_opts = {
+            'quiet': False,
+            'no_warnings': False,
+            'noplaylist': True,
+            'http_headers': dict(self.HTTP_HEADERS)
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # 转换为可JSON序列化的结构，便于写入磁盘缓存
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        
+        if self.info_cache:
+            self.info_cache.put(cache_key, info)
+        return info
+    
+    def invalidate_info(self, url):
+        """删除缓存的视频信息（例如其中的视频流地址已过期）"""
+        if self.info_cache:
+            self.info_cache.invalidate(self.resolve_video_id(url) or url)
+    
+    def download(self, url, start_time=None, end_time=None, allow_full=True):
+        """下载视频（优先使用缓存），返回 (本地文件路径, 文件起点对应的原视频时间(秒))；
+        allow_full为False时只使用缓存或分段下载，都不可用时抛出异常而不下载完整视频"""
+        video_id = self.resolve_video_id(url) if self.cache else None
+        
+        # 视频信息只解析一次（通常已由"获取视频信息"缓存），分段和完整下载共用；
+        # 缓存按视频ID和格式查找，先由视频信息确定本次会选择的分段格式
+        try:
+            info = self.extract_info(url)
+        except Exception as e:
+            print(f"获取视频信息失败，由yt-dlp下载时解析: {e}")
+            info = None
+        
+        segment_fmt = None
+        if self.segment_download and info and start_time is not None and end_time is not None:
+            segment_fmt = self._select_segment_format(info)
+        
+        if segment_fmt:
+            if video_id:
+                cached = self.cache.lookup(video_id, start_time, end_time, segment_fmt.get('format_id', 'dash'))
+                if cached:
+                    print(f"使用缓存视频: {video_id} -> {cached[0].name}")
+                    return cached
+            try:
+                temp_video, time_offset, fmt = self.download_segment(url, start_time, end_time, info, segment_fmt)
+                if video_id:
+                    temp_video = self.cache.put(video_id, fmt, temp_video, time_offset, end_time)
+                return temp_video, time_offset
+            except Exception as e:
+                if not allow_full:
+                    raise
+                print(f"分段下载不可用，改为下载完整视频: {e}")
+        
+        # 完整下载按FORMAT_OPTIONS顺序选择格式，以其中任一格式缓存的完整视频都可使用
+        if video_id:
+            cached = self.cache.lookup(video_id, start_time, end_time, self.FORMAT_OPTIONS)
+            if cached:
+                print(f"使用缓存视频: {video_id} -> {cached[0].name}")
+                return cached
+        if not allow_full:
+            raise Exception("分段下载不可用")
+        try:
+            temp_video, fmt = self.download_full(url, info)
+        except Exception:
+            if info is None:
+                raise
+            # 缓存信息中的视频流地址可能已过期，丢弃后由yt-dlp重新解析下载
+            self.invalidate_info(url)
+            temp_video, fmt = self.download_full(url)
+        if video_id:
+            temp_video = self.cache.put(video_id, fmt, temp_video)
+        return temp_video, 0.0
+    
+    def release(self, path):
+        """转换结束后清理下载文件，缓存中的文件保留（解除使用中的保护）"""
+        if self.cache and self.cache.release(path):
+            return
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
+    
+    @staticmethod
+    def _temp_name():
+        """每次下载唯一的临时文件名（并发任务在同一秒开始下载也不会写入或找到同一个文件）"""
+        return f"temp_video_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    
+    def download_full(self, url, info=None):
+        """下载完整视频，返回 (文件路径, 使用的格式)；提供info时不再重新解析视频信息"""
+        import yt_dlp
+        
+        # 临时视频文件 - 让yt-dlp决定扩展名
+        temp_video_base = self.temp_dir / self._temp_name()
+        
+        for format_selector in self.FORMAT_OPTIONS:
+            ydl_opts = {
+                'outtmpl': str(temp_video_base) + '.%(ext)s',
+                'quiet': False,
+                'no_warnings': False,
+                'format': format_selector,
+                # 关键：不要尝试合并格式
+                'noplaylist': True,
+                'no_check_certificates': True,
+                'http_headers': dict(self.HTTP_HEADERS)
+            }
+            
+            try:
+                print(f"尝试格式: {format_selector}")
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    if info:
+                        ydl.process_ie_result(copy.deepcopy(info), download=True)
+                    else:
+                        ydl.download([url])
+                
+                # 查找实际下载的文件
+                temp_video = None
+                for file in self.temp_dir.glob(f"{temp_video_base.name}.*"):
+                    if file.suffix in ('.part', '.ytdl'):
+                        continue
+                    if file.is_file() and file.stat().st_size > 1024:  # 至少1KB
+                        temp_video = file
+                        print(f"找到下载文件: {temp_video}")
+                        break
+                
+                if temp_video and temp_video.exists():
+                    file_size = temp_video.stat().st_size / (1024*1024)
+                    print(f"下载成功! 文件: {temp_video.name}, 大小: {file_size:.2f}MB")
+                    return temp_video, format_selector
+                else:
+                    print(f"格式 '{format_selector}' 下载后未找到有效文件")
+                
+            except Exception as format_error:
+                print(f"格式 '{format_selector}' 下载失败: {str(format_error)}")
+                continue
+        
+        raise Exception(self.DOWNLOAD_ERROR)
+    
+    def download_segment(self, url, start_time, end_time, info=None, fmt=None):
+        """只下载覆盖[start_time, end_time]的分片，返回 (文件路径, 文件起点时间, 格式ID)；fmt为None时自动选择格式"""
+        if info is None:
+            info = self.extract_info(url)
+        
+        fmt = fmt or self._select_segment_format(info)
+        if not fmt:
+            raise Exception("没有可分段下载的DASH视频流")
+        print(f"分段下载格式: {fmt.get('format_id')} {fmt.get('width')}x{fmt.get('height')} {fmt.get('vcodec')}")
+        
+        headers = dict(self.HTTP_HEADERS)
+        headers.update(fmt.get('http_headers') or {})
+        output_path = self.temp_dir / f"{self._temp_name()}_part.mp4"
+        temp_video, time_offset = self.fetch_fmp4_range(fmt['url'], start_time, end_time, output_path, headers)
+        return temp_video, time_offset, fmt.get('format_id', 'dash')
+    
+    @staticmethod
+    def _select_segment_format(info):
+        """选择可按字节范围下载的仅视频DASH流，优先OpenCV能解码的AVC编码"""
+        candidates = []
+        for fmt in info.get('formats') or []:
+            if fmt.get('vcodec') in (None, 'none') or not fmt.get('url'):
+                continue
+            if fmt.get('protocol') not in ('http', 'https') or fmt.get('ext') != 'mp4':
+                continue
+            is_avc = str(fmt.get('vcodec', '')).startswith('avc')
+            candidates.append((is_avc, fmt.get('height') or 0, fmt))
+        if not candidates:
+            return None
+        return max(candidates, key=lambda c: (c[0], c[1]))[2]
+    
+    @staticmethod
+    def _http_range(url, start, end, headers=None, fp=None, allow_short=False):
+        """HTTP Range请求[start, end]字节；服务器忽略Range时跳过多余数据。fp为None时返回bytes"""
+        import requests
+        
+        request_headers = dict(headers or {})
+        request_headers['Range'] = f"bytes={start}-{end}"
+        with requests.get(url, headers=request_headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            skip = start if response.status_code == 200 else 0
+            remaining = end - start + 1
+            chunks = []
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk = chunk[skip:]
+                    skip = 0
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+                if fp is None:
+                    chunks.append(chunk)
+                else:
+                    fp.write(chunk)
+                if remaining <= 0:
+                    break
+        if remaining > 0 and not allow_short:
+            raise Exception(f"Range请求数据不完整: 缺少{remaining}字节")
+        return b''.join(chunks)
+    
+    @staticmethod
+    def _parse_sidx(data):
+        """解析sidx盒子内容，返回 (时间刻度, 起始时间, 首分片偏移, [(大小, 时长, 是否以关键帧开始)])"""
+        version = data[0]
+        pos = 4
+        _, timescale = struct.unpack('>II', data[pos:pos + 8])
+        pos += 8
+        if version == 0:
+            earliest_time, first_offset = struct.unpack('>II', data[pos:pos + 8])
+            pos += 8
+        else:
+            earliest_time, first_offset = struct.unpack('>QQ', data[pos:pos + 16])
+            pos += 16
+        _, reference_count = struct.unpack('>HH', data[pos:pos + 4])
+        pos += 4
+        
+        references = []
+        for _ in range(reference_count):
+            ref_info, duration, sap_info = struct.unpack('>III', data[pos:pos + 12])
+            pos += 12
+            if ref_info >> 31:
+                raise Exception("不支持多级sidx索引")
+            references.append((ref_info & 0x7FFFFFFF, duration, bool(sap_info >> 31)))
+        return timescale, earliest_time, first_offset, references
+    
+    @classmethod
+    def fetch_fmp4_range(cls, media_url, start_time, end_time, output_path, headers=None):
+        """按sidx索引只下载覆盖时间段的fMP4分片（从之前的关键帧开始），返回 (文件路径, 文件起点时间)"""
+        # 读取顶层盒子直到sidx：ftyp + moov 为初始化段，sidx 为分片索引
+        head = b''
+        pos = 0
+        init_end = None
+        sidx = None
+        while sidx is None:
+            if len(head) < pos + 16:
+                fetch_end = max(pos + 16, len(head) + 64 * 1024) - 1
+                head += cls._http_range(media_url, len(head), fetch_end, headers, allow_short=True)
+                if len(head) < pos + 8:
+                    raise Exception("视频流没有sidx分片索引")
+            box_size, box_type = struct.unpack('>I4s', head[pos:pos + 8])
+            header_size = 8
+            if box_size == 1:
+                box_size = struct.unpack('>Q', head[pos + 8:pos + 16])[0]
+                header_size = 16
+            if box_size < header_size or box_type in (b'moof', b'mdat'):
+                raise Exception("视频流没有sidx分片索引")
+            
+            if box_type == b'sidx':
+                if len(head) < pos + box_size:
+                    head += cls._http_range(media_url, len(head), pos + box_size - 1, headers)
+                sidx = cls._parse_sidx(head[pos + header_size:pos + box_size])
+                sidx_end = pos + box_size
+            elif box_type == b'moov':
+                init_end = pos + box_size
+            pos += box_size
+        
+        if init_end is None:
+            raise Exception("视频流缺少moov初始化段")
+        if len(head) < init_end:
+            head += cls._http_range(media_url, len(head), init_end - 1, headers)
+        
+        # 计算各分片的字节范围和时间范围
+        timescale, earliest_time, first_offset, references = sidx
+        segments = []
+        offset = sidx_end + first_offset
+        seg_time = earliest_time
+        for size, duration, starts_with_sap in references:
+            segments.append((offset, size, seg_time / timescale, (seg_time + duration) / timescale, starts_with_sap))
+            offset += size
+            seg_time += duration
+        
+        # 从包含开始时间的分片之前最近的关键帧分片开始，到覆盖结束时间的分片为止
+        first = 0
+        for i, (_, _, seg_start, _, starts_with_sap) in enumerate(segments):
+            if seg_start > start_time:
+                break
+            if starts_with_sap:
+                first = i
+        last = first
+        while last + 1 < len(segments) and segments[last][3] < end_time:
+            last += 1
+        
+        range_start = segments[first][0]
+        range_end = segments[last][0] + segments[last][1] - 1
+        segment_start_time = segments[first][2]
+        print(f"分段下载: 分片{first}-{last}，时间{segment_start_time:.2f}-{segments[last][3]:.2f}秒，"
+              f"{(range_end - range_start + 1) / (1024 * 1024):.2f}MB")
+        
+        # 写入临时文件后再重命名，避免留下不完整的文件
+        output_path = Path(output_path)
+        partial_path = output_path.with_name(output_path.name + '.tmp')
+        try:
+            with open(partial_path, 'wb') as fp:
+                fp.write(head[:init_end])
+                cls._http_range(media_url, range_start, range_end, headers, fp)
+            os.replace(partial_path, output_path)
+        finally:
+            if partial_path.exists():
+                partial_path.unlink()
+        
+        return output_path, segment_start_time
+
+class GifConversionPipeline:
+    """GIF转换流水线 - 不依赖GUI，图形界面和命令行模式共用"""
+    
+    QUALITY_COLORS = {"高": 256, "中": 128, "低": 64}
+    # pil: 逐帧量化后由GifFrameWriter写入；ffmpeg: 整个片段在一个ffmpeg滤镜图中完成
+    ENCODERS = ('pil', 'ffmpeg')
+    
+    def __init__(self, frame_processor=None, encoder='pil', dither='sierra2_4a', stats_file=None):
+        if encoder not in self.ENCODERS:
+            raise ValueError(f"未知的编码引擎: {encoder}")
+        if dither not in FFmpegGifEncoder.DITHER_MODES:
+            raise ValueError(f"未知的抖动方式: {dither}")
+        self.frame_processor = frame_processor or OptimizedFrameProcessor()
+        self.encoder = encoder
+        self.dither = dither
+        # 每次转换的编码引擎、耗时和输出大小追加到该JSON Lines文件，便于按场景选择引擎
+        self.stats_file = Path(stats_file) if stats_file else None
+        self.last_stats = None
+    
+    @staticmethod
+    def output_filename(output_dir, title):
+        """根据视频标题生成输出文件路径"""
+        safe_title = re.sub(r'[^\w\s-]', '', title or 'video')
+        safe_title = re.sub(r'[-\s]+', '-', safe_title)
+        return Path(output_dir) / f"{safe_title}_{int(time.time())}.gif"
+    
+    def convert(self, input_file, output_file, start_time, end_time, width, height, fps, quality,
+                remove_black_borders, remove_watermark, delta_encoding=False,
+                progress_callback=None, cancel_check=None, encoder=None):
+        """进行转换；cancel_check返回False时取消转换，encoder为None时使用默认编码引擎，返回写入的帧数"""
+        started = time.perf_counter()
+        encoder = encoder or self.encoder
+        if encoder not in self.ENCODERS:
+            raise ValueError(f"未知的编码引擎: {encoder}")
+        try:
+            ffmpeg_path = find_ffmpeg() if encoder == 'ffmpeg' else ''
+            if encoder == 'ffmpeg' and not ffmpeg_path:
+                print("未找到ffmpeg，改用PIL编码")
+                encoder = 'pil'
+            
+            # 裁切参数由解码循环用已解码的帧分析，不再单独打开视频
+            crop_analyzer = self.create_crop_analyzer(remove_black_borders, remove_watermark)
+            
+            if encoder == 'ffmpeg':
+                frame_count = self._convert_with_ffmpeg(
+                    ffmpeg_path, input_file, output_file, start_time, end_time, width, height, fps,
+                    quality, crop_analyzer, delta_encoding, progress_callback, cancel_check
+                )
+            else:
+                # 流式处理：每帧处理完成后立即按顺序写入GIF文件，内存中不再保留所有帧
+                frame_iter = self.iter_frames(
+                    input_file, start_time, end_time, fps, width, height, quality,
+                    progress_callback=progress_callback, crop_analyzer=crop_analyzer
+                )
+                frame_count = self.write_gif(frame_iter, output_file, fps, delta_encoding, cancel_check)
+                
+        except Exception as e:
+            print(f"优化转换失败: {str(e)}")
+            raise
+        
+        self._record_stats({
+            'encoder': encoder,
+            'dither': self.dither if encoder == 'ffmpeg' else None,
+            'delta_encoding': bool(delta_encoding),
+            'input': Path(input_file).name,
+            'duration': round(end_time - start_time, 3),
+            'width': width,
+            'height': height,
+            'fps': fps,
+            'colors': self.QUALITY_COLORS.get(quality, 128),
+            'frames': frame_count,
+            'wall_time': round(time.perf_counter() - started, 3),
+            'size': Path(output_file).stat().st_size,
+            'memory_mb': self.frame_processor.last_memory_report if encoder == 'pil' else None,
+        })
+        return frame_count
+    
+    def convert_to_size(self, input_file, output_file, start_time, end_time, width, height, fps, quality,
+                        target_bytes, remove_black_borders, remove_watermark, delta_encoding=False,
+                        progress_callback=None, cancel_check=None, encoder=None):
+        """目标大小模式：先用采样窗口以实际编码引擎试编码，选出不超过target_bytes的参数，再做一次完整编码，返回所选参数"""
+        plan = TargetSizePlanner(self).plan(
+            input_file, start_time, end_time, width, height, fps, quality, target_bytes,
+            remove_black_borders, remove_watermark, delta_encoding, progress_callback, encoder
+        )
+        if cancel_check and not cancel_check():
+            raise Exception("转换被取消")
+        print(f"目标大小 {target_bytes / (1024 * 1024):.2f}MB: 使用 {plan['width']}x{plan['height']} "
+              f"{plan['fps']}fps 质量{plan['quality']}")
+        
+        plan['frames'] = self.convert(
+            input_file, output_file, start_time, end_time, plan['width'], plan['height'], plan['fps'],
+            plan['quality'], remove_black_borders, remove_watermark, delta_encoding,
+            progress_callback, cancel_check, encoder
+        )
+        actual = Path(output_file).stat().st_size
+        plan['actual_size'] = actual
+        print(f"预估 {plan['estimated_size'] / (1024 * 1024):.2f}MB, 实际 {actual / (1024 * 1024):.2f}MB")
+        if actual > target_bytes:
+            print("警告: 输出超过目标大小")
+        return plan
+    
+    def _convert_with_ffmpeg(self, ffmpeg_path, input_file, output_file, start_time, end_time, width, height,
+                             fps, quality, crop_analyzer, delta_encoding, progress_callback, cancel_check):
+        """FFmpeg编码引擎：裁切参数由关键帧分析得到，其余步骤都在ffmpeg滤镜图中完成"""
+        crop_params = None
+        if crop_analyzer:
+            if progress_callback:
+                progress_callback("分析裁切区域...")
+            crop_params = FFmpegFrameDecoder(ffmpeg_path).analyze_crop(
+                input_file, start_time, end_time, crop_analyzer
+            )
+        
+        if self.frame_processor.sampling == 'adaptive':
+            print("FFmpeg编码引擎不支持运动自适应取帧，按固定帧率取帧")
+        
+        # 帧间差分编码对应paletteuse的rectangle差分模式
+        encoder = FFmpegGifEncoder(
+            ffmpeg_path, self.dither, 'rectangle' if delta_encoding else 'none',
+            dedup=self.frame_processor.dedup_threshold > 0
+        )
+        frame_count = encoder.encode(
+            input_file, output_file, start_time, end_time, fps, width, height,
+            self.QUALITY_COLORS.get(quality, 128), crop_params, progress_callback, cancel_check
+        )
+        
+        if not Path(output_file).exists() or Path(output_file).stat().st_size == 0:
+            raise Exception("GIF保存失败")
+        print(f"共写入 {frame_count} 帧")
+        file_size = Path(output_file).stat().st_size / (1024 * 1024)
+        print(f"GIF转换完成，文件大小: {file_size:.2f}MB")
+        return frame_count
+    
+    def _record_stats(self, stats):
+        """记录本次转换的编码引擎、耗时和输出大小"""
+        self.last_stats = stats
+        print(f"编码引擎 {stats['encoder']}: 耗时 {stats['wall_time']:.2f}秒, "
+              f"输出 {stats['size'] / 1024:.0f}KB, {stats['frames']}帧")
+        if not self.stats_file:
+            return
+        stats = dict(stats, time=time.strftime('%Y-%m-%d %H:%M:%S'))
+        try:
+            self.stats_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.stats_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(stats, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"编码统计写入失败: {e}")
+    
+    @staticmethod
+    def load_stats(stats_file):
+        """读取编码统计，按引擎汇总平均耗时与输出大小"""
+        summary = {}
+        path = Path(stats_file)
+        if not path.exists():
+            return summary
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    stats = json.loads(line)
+                except ValueError:
+                    continue
+                entry = summary.setdefault(stats['encoder'], {'runs': 0, 'wall_time': 0.0, 'size': 0})
+                entry['runs'] += 1
+                entry['wall_time'] += stats['wall_time']
+                entry['size'] += stats['size']
+        for entry in summary.values():
+            entry['avg_wall_time'] = round(entry['wall_time'] / entry['runs'], 3)
+            entry['avg_size'] = int(entry['size'] / entry['runs'])
+        return summary
+    
+    @staticmethod
+    def create_crop_analyzer(remove_black_borders, remove_watermark):
+        """需要智能裁切且OpenCV可用时返回多帧裁切分析器，裁切参数在解码过程中确定"""
+        if (remove_black_borders or remove_watermark) and CV2_AVAILABLE:
+            print("使用智能裁切方法")
+            return TemporalCropAnalyzer(remove_black_borders, remove_watermark)
+        return None
+    
+    def iter_frames(self, input_file, start_time, end_time, fps, width, height, quality,
+                    crop_params=None, progress_callback=None, crop_analyzer=None):
+        """按顺序产出处理好的帧（解码阶段）"""
+        # 质量设置
+        quality_colors = self.QUALITY_COLORS.get(quality, 128)
+        return self.frame_processor.iter_processed_frames(
+            input_file, start_time, end_time, fps, 
+            width, height, quality_colors, 
+            crop_params, progress_callback, crop_analyzer
+        )
+    
+    def write_gif(self, frames, output_file, fps, delta_encoding=False, cancel_check=None):
+        """把帧流式写入GIF文件（编码阶段），失败时删除写了一半的文件"""
+        # 帧间差分编码时每帧只写入变化区域，帧之间叠加显示(disposal=1)
+        # 否则写入完整帧并恢复到背景色(disposal=2)
+        encoder = GifDeltaEncoder() if delta_encoding else None
+        
+        # 每帧时长为目标帧间隔乘以frame_hold（合并重复帧、运动自适应取帧时不为1），
+        # 舍入到GIF的10ms精度时把误差累计到下一帧，总时长与片段保持一致（最短20ms避免太快）
+        scheduled = 0.0
+        written = 0
+        
+        print("开始流式写入GIF")
+        try:
+            with GifFrameWriter(output_file) as writer:
+                for frame in frames:
+                    if cancel_check and not cancel_check():
+                        raise Exception("转换被取消")
+                    
+                    scheduled += 1000 / fps * frame.info.get('frame_hold', 1)
+                    duration = max(20, int(round((scheduled - written) / 10)) * 10)
+                    written += duration
+                    if encoder:
+                        delta_frame, offset, transparency = encoder.encode(frame)
+                        writer.add_frame(delta_frame, duration, offset, disposal=1, transparency=transparency)
+                    else:
+                        writer.add_frame(frame, duration, disposal=2)
+                    del frame
+            
+            if writer.frame_count == 0:
+                raise Exception("帧提取失败或转换被取消")
+        except Exception:
+            # 停止流水线并删除写了一半的文件
+            if hasattr(frames, 'close'):
+                frames.close()
+            Path(output_file).unlink(missing_ok=True)
+            raise
+        
+        print(f"共写入 {writer.frame_count} 帧")
+        gc.collect()
+        
+        if not Path(output_file).exists() or Path(output_file).stat().st_size == 0:
+            raise Exception("GIF保存失败")
+        
+        file_size = Path(output_file).stat().st_size / (1024 * 1024)
+        print(f"GIF转换完成，文件大小: {file_size:.2f}MB")
+        return writer.frame_count
+
+class TargetSizePlanner:
+    """目标文件大小规划 - 在几个短采样窗口上试编码候选参数（分辨率、颜色数、帧率），
+    外推整段大小，选出不超过目标大小的最佳参数，只做一次完整编码"""
+    
+    # 候选缩放比例、帧率与颜色数（颜色数对应质量档位）
+    SCALES = (1.0, 0.85, 0.7, 0.6, 0.5, 0.4)
+    FPS_CHOICES = (30, 25, 20, 15, 12, 10, 8)
+    # 颜色数对大小的大致影响，只用于候选参数排序
+    COLOR_WEIGHTS = {256: 1.0, 128: 0.85, 64: 0.7}
+    MIN_SIDE = 64
+    
+    def __init__(self, pipeline, sample_windows=3, window_seconds=0.6, max_trials=7):
+        self.pipeline = pipeline
+        self.sample_windows = max(1, sample_windows)
+        self.window_seconds = window_seconds
+        self.max_trials = max(1, max_trials)
+    
+    def sample_ranges(self, start_time, end_time):
+        """片段内等间隔的几个短窗口 [(开始, 结束)]"""
+        duration = end_time - start_time
+        window = min(self.window_seconds, duration / self.sample_windows)
+        return [(start_time + (duration - window) * (i + 0.5) / self.sample_windows,
+                 start_time + (duration - window) * (i + 0.5) / self.sample_windows + window)
+                for i in range(self.sample_windows)]
+    
+    def collect_samples(self, input_file, start_time, end_time, fps, width, height,
+                        remove_black_borders, remove_watermark):
+        """在片段内等间隔取几个短窗口，按最高参数（请求的尺寸和帧率、不量化）只解码一次，试编码都复用这些帧"""
+        crop_analyzer = self.pipeline.create_crop_analyzer(remove_black_borders, remove_watermark)
+        crop_params = None
+        
+        windows = []
+        for window_start, window_end in self.sample_ranges(start_time, end_time):
+            # 第一个窗口分析裁切参数，后续窗口沿用
+            frames = [
+                np.asarray(frame.convert('RGB'))
+                for frame in self.pipeline.frame_processor.iter_rgb_frames(
+                    input_file, window_start, window_end, fps, width, height,
+                    crop_params, crop_analyzer=crop_analyzer
+                )
+            ]
+            if crop_analyzer:
+                crop_params = crop_analyzer.crop_params
+                crop_analyzer = None
+            if frames:
+                windows.append(frames)
+        
+        if not windows:
+            raise Exception("采样帧提取失败")
+        return windows
+    
+    @staticmethod
+    def trial_encode(windows, sample_fps, fps, width, height, max_colors, delta_encoding, dither='none'):
+        """用与完整编码相同的量化和写入方式编码采样帧，返回每个窗口的逐帧字节数"""
+        from PIL import Image
+        
+        step = sample_fps / fps
+        frame_duration = max(20, int(1000 / fps))
+        results = []
+        for frames in windows:
+            encoder = GifDeltaEncoder() if delta_encoding else None
+            buffer = io.BytesIO()
+            frame_sizes = []
+            with GifFrameWriter(buffer) as writer:
+                position = 0.0
+                while int(position) < len(frames):
+                    rgb = frames[int(position)]
+                    position += step
+                    if rgb.shape[1] != width or rgb.shape[0] != height:
+                        if CV2_AVAILABLE:
+                            rgb = cv2.resize(rgb, (width, height), interpolation=cv2.INTER_AREA)
+                        else:
+                            rgb = np.asarray(Image.fromarray(rgb).resize((width, height), Image.Resampling.LANCZOS))
+                    frame = OptimizedFrameProcessor._quantize_image(Image.fromarray(rgb), max_colors, dither)
+                    
+                    before = buffer.tell()
+                    if encoder:
+                        delta_frame, offset, transparency = encoder.encode(frame)
+                        writer.add_frame(delta_frame, frame_duration, offset, disposal=1, transparency=transparency)
+                    else:
+                        writer.add_frame(frame, frame_duration, disposal=2)
+                    frame_sizes.append(buffer.tell() - before)
+            results.append(frame_sizes)
+        return results
+    
+    def trial_encode_ffmpeg(self, ffmpeg_path, input_file, ranges, crop_params, fps, width, height, max_colors,
+                            delta_encoding):
+        """FFmpeg编码引擎的试编码：用与完整编码相同的滤镜图编码每个采样窗口，返回每个窗口的逐帧字节数"""
+        encoder = FFmpegGifEncoder(
+            ffmpeg_path, self.pipeline.dither, 'rectangle' if delta_encoding else 'none',
+            dedup=self.pipeline.frame_processor.dedup_threshold > 0
+        )
+        fd, trial_path = tempfile.mkstemp(suffix='.gif')
+        os.close(fd)
+        results = []
+        try:
+            for window_start, window_end in ranges:
+                encoder.encode(input_file, trial_path, window_start, window_end, fps, width, height,
+                               max_colors, crop_params)
+                frame_sizes = self.gif_frame_sizes(Path(trial_path).read_bytes())
+                if frame_sizes:
+                    results.append(frame_sizes)
+        finally:
+            Path(trial_path).unlink(missing_ok=True)
+        if not results:
+            raise Exception("采样试编码失败")
+        return results
+    
+    @staticmethod
+    def gif_frame_sizes(data):
+        """按GIF块结构统计每帧的字节数（文件头、全局调色板和扩展块计入紧随其后的帧）"""
+        pos = 13
+        if len(data) < pos:
+            return []
+        if data[10] & 0x80:
+            pos += 3 * (2 << (data[10] & 7))
+        frame_sizes = []
+        frame_start = 0
+        while pos < len(data):
+            block = data[pos]
+            if block == 0x21:
+                pos += 2
+            elif block == 0x2C:
+                flags = data[pos + 9] if pos + 9 < len(data) else 0
+                pos += 10
+                if flags & 0x80:
+                    pos += 3 * (2 << (flags & 7))
+                pos += 1  # LZW最小码长
+            else:
+                break  # 0x3B文件结束或数据异常
+            # 数据子块，长度为0的子块结束
+            while pos < len(data) and data[pos]:
+                pos += data[pos] + 1
+            pos += 1
+            if block == 0x2C:
+                frame_sizes.append(pos - frame_start)
+                frame_start = pos
+        return frame_sizes
+    
+    @staticmethod
+    def extrapolate(results, frame_count):
+        """外推整段大小：第一帧（含文件头）按完整帧计，其余帧按采样窗口中后续帧的平均字节数计"""
+        first = sum(sizes[0] for sizes in results) / len(results)
+        rest = [size for sizes in results for size in sizes[1:]]
+        per_frame = sum(rest) / len(rest) if rest else first
+        return int(first + per_frame * max(0, frame_count - 1) + 1)
+    
+    def candidates(self, width, height, fps, quality):
+        """候选参数，按预期大小（像素数 × 帧率 × 颜色权重）从高到低排序"""
+        max_colors = GifConversionPipeline.QUALITY_COLORS.get(quality, 128)
+        fps_choices = [fps] + [f for f in self.FPS_CHOICES if f < fps]
+        qualities = [q for q, colors in GifConversionPipeline.QUALITY_COLORS.items() if colors <= max_colors]
+        
+        result = []
+        for scale in self.SCALES:
+            w, h = int(round(width * scale)), int(round(height * scale))
+            if min(w, h) < self.MIN_SIDE and scale != 1.0:
+                continue
+            for candidate_fps in fps_choices:
+                for q in qualities:
+                    colors = GifConversionPipeline.QUALITY_COLORS[q]
+                    score = w * h * candidate_fps * self.COLOR_WEIGHTS.get(colors, 1.0)
+                    result.append((score, w, h, candidate_fps, q))
+        result.sort(key=lambda c: -c[0])
+        return [c[1:] for c in result]
+    
+    def plan(self, input_file, start_time, end_time, width, height, fps, quality, target_bytes,
+             remove_black_borders, remove_watermark, delta_encoding=False, progress_callback=None, encoder=None):
+        """先试编码请求的参数，超出目标时二分查找候选参数（假设大小随候选顺序单调递减），最多试编码max_trials次
+        
+        试编码使用实际编码的引擎（encoder为None时为流水线的默认引擎），没有ffmpeg时与完整编码一样改用PIL。
+        """
+        if progress_callback:
+            progress_callback("采样试编码中...")
+        started = time.perf_counter()
+        ffmpeg_path = find_ffmpeg() if (encoder or self.pipeline.encoder) == 'ffmpeg' else None
+        if ffmpeg_path:
+            # 与完整编码相同：裁切参数由关键帧分析，各窗口直接由ffmpeg解码编码
+            ranges = self.sample_ranges(start_time, end_time)
+            crop_analyzer = self.pipeline.create_crop_analyzer(remove_black_borders, remove_watermark)
+            crop_params = FFmpegFrameDecoder(ffmpeg_path).analyze_crop(
+                input_file, start_time, end_time, crop_analyzer
+            ) if crop_analyzer else None
+        else:
+            windows = self.collect_samples(
+                input_file, start_time, end_time, fps, width, height, remove_black_borders, remove_watermark
+            )
+        candidates = self.candidates(width, height, fps, quality)
+        duration = end_time - start_time
+        
+        trials = []
+        best = None
+        middle = 0
+        low, high = 1, len(candidates) - 1
+        while len(trials) < self.max_trials:
+            w, h, candidate_fps, q = candidates[middle]
+            if ffmpeg_path:
+                results = self.trial_encode_ffmpeg(
+                    ffmpeg_path, input_file, ranges, crop_params, candidate_fps, w, h,
+                    GifConversionPipeline.QUALITY_COLORS[q], delta_encoding
+                )
+            else:
+                results = self.trial_encode(
+                    windows, fps, candidate_fps, w, h,
+                    GifConversionPipeline.QUALITY_COLORS[q], delta_encoding, self.pipeline.frame_processor.dither
+                )
+            estimated = self.extrapolate(results, max(1, int(duration * candidate_fps)))
+            trial = {'width': w, 'height': h, 'fps': candidate_fps, 'quality': q, 'estimated_size': estimated}
+            trials.append(trial)
+            print(f"试编码 {w}x{h} {candidate_fps}fps 质量{q}: 预估 {estimated / (1024 * 1024):.2f}MB")
+            if estimated <= target_bytes:
+                best = trial
+                if middle == 0:
+                    break
+                high = middle - 1
+            else:
+                low = middle + 1
+            if low > high:
+                break
+            middle = (low + high) // 2
+        
+        if best is None:
+            # 所有试过的参数都超出目标，使用最小的候选参数
+            trial = min(trials, key=lambda t: t['estimated_size'])
+            print("警告: 无法满足目标大小，使用最小参数")
+        else:
+            trial = best
+        
+        print(f"目标大小规划: {len(trials)}次试编码, 耗时 {time.perf_counter() - started:.2f}秒")
+        return dict(trial, trials=trials)
+
+class GifSizeEstimator:
+    """GIF大小估算器 - 每个视频只试编码一次采样帧，测出各颜色数的每像素字节数、帧间相似度
+    和分辨率、帧率对大小的影响，之后任意参数的估算只是简单计算"""
+    
+    # 校准使用的参考尺寸（长边）和帧率
+    REFERENCE_EDGE = 480
+    REFERENCE_FPS = 20
+    COLOR_LEVELS = (64, 128, 256)
+    
+    def __init__(self, pipeline=None, sample_windows=3, window_seconds=0.5):
+        self.pipeline = pipeline or GifConversionPipeline()
+        self.sample_windows = sample_windows
+        self.window_seconds = window_seconds
+        self.coefficients = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def cache_key(source, remove_black_borders, remove_watermark):
+        """系数按视频和裁切选项缓存"""
+        return f"{source}|{int(bool(remove_black_borders))}{int(bool(remove_watermark))}"
+    
+    def get(self, key):
+        with self.lock:
+            return self.coefficients.get(key)
+    
+    @staticmethod
+    def _frame_bytes(results):
+        """(第一帧平均字节数, 后续帧平均字节数)"""
+        first = sum(sizes[0] for sizes in results) / len(results)
+        rest = [size for sizes in results for size in sizes[1:]]
+        return first, (sum(rest) / len(rest) if rest else first)
+    
+    def calibrate(self, key, input_file, start_time, end_time, source_width, source_height,
+                  remove_black_borders=True, remove_watermark=True):
+        """解码并试编码采样帧，计算并缓存该视频的估算系数"""
+        cached = self.get(key)
+        if cached:
+            return cached
+        
+        started = time.perf_counter()
+        scale = min(1.0, self.REFERENCE_EDGE / max(source_width, source_height))
+        width = max(16, int(source_width * scale) // 2 * 2)
+        height = max(16, int(source_height * scale) // 2 * 2)
+        pixels = width * height
+        fps = self.REFERENCE_FPS
+        dither = self.pipeline.frame_processor.dither
+        
+        windows = TargetSizePlanner(self.pipeline, self.sample_windows, self.window_seconds).collect_samples(
+            input_file, start_time, end_time, fps, width, height, remove_black_borders, remove_watermark
+        )
+        
+        # 各颜色数下完整帧的每像素字节数，以及差分帧与完整帧的字节比（帧间越相似越小）
+        key_bpp = {}
+        delta_ratio = {}
+        for colors in self.COLOR_LEVELS:
+            first, rest = self._frame_bytes(TargetSizePlanner.trial_encode(
+                windows, fps, fps, width, height, colors, True, dither
+            ))
+            key_bpp[colors] = first / pixels
+            delta_ratio[colors] = min(1.0, rest / first)
+        
+        # 帧率减半（帧间隔加倍）时差分帧比例的变化
+        first, rest = self._frame_bytes(TargetSizePlanner.trial_encode(
+            windows, fps, fps / 2, width, height, 128, True, dither
+        ))
+        interval_factor = max(1.0, (rest / first) / max(delta_ratio[128], 1e-6))
+        
+        # 分辨率减半时每像素字节数的变化，拟合 每像素字节数 ∝ 像素数^scale_exponent
+        half_width, half_height = max(16, width // 2), max(16, height // 2)
+        first, _ = self._frame_bytes(TargetSizePlanner.trial_encode(
+            windows[:1], fps, fps, half_width, half_height, 128, True, dither
+        ))
+        half_bpp = first / (half_width * half_height)
+        scale_exponent = float(np.clip(np.log(half_bpp / key_bpp[128]) / np.log(half_width * half_height / pixels), -0.5, 0.2))
+        
+        coefficients = {
+            'reference_pixels': pixels,
+            'reference_fps': fps,
+            'key_bpp': key_bpp,
+            'delta_ratio': delta_ratio,
+            'interval_factor': interval_factor,
+            'scale_exponent': scale_exponent,
+            'similarity': 1.0 - delta_ratio[128],
+        }
+        with self.lock:
+            self.coefficients[key] = coefficients
+        print(f"大小估算校准: {width}x{height}, 帧间相似度 {coefficients['similarity']:.2f}, "
+              f"128色 {key_bpp[128]:.3f}字节/像素, 耗时 {time.perf_counter() - started:.2f}秒")
+        return coefficients
+    
+    @classmethod
+    def _interpolate_colors(cls, table, colors):
+        """按log2(颜色数)在已测颜色数之间线性插值"""
+        levels = cls.COLOR_LEVELS
+        x = np.log2(np.clip(colors, levels[0], levels[-1]))
+        return float(np.interp(x, np.log2(levels), [table[c] for c in levels]))
+    
+    @classmethod
+    def estimate(cls, coefficients, width, height, duration, fps, colors, delta_encoding=True):
+        """估算GIF文件大小（字节）"""
+        pixels = width * height
+        bpp = cls._interpolate_colors(coefficients['key_bpp'], colors)
+        bpp *= (pixels / coefficients['reference_pixels']) ** coefficients['scale_exponent']
+        key_bytes = bpp * pixels
+        
+        if delta_encoding:
+            # 帧间隔每加倍一次，差分帧比例乘以interval_factor
+            ratio = cls._interpolate_colors(coefficients['delta_ratio'], colors)
+            ratio *= coefficients['interval_factor'] ** np.log2(coefficients['reference_fps'] / fps)
+            ratio = min(1.0, ratio)
+        else:
+            ratio = 1.0
+        
+        frame_count = max(1, int(duration * fps))
+        return int(key_bytes * (1 + ratio * (frame_count - 1)))
+
+class GifPreviewer:
+    """预览生成器 - 先用低帧率、小尺寸、少颜色快速生成预览，再在后台按完整参数细化；
+    参数改变时取消，完整参数的预览结果直接作为最终转换的输出，不再重复解码和编码"""
+    
+    PREVIEW_EDGE = 160
+    PREVIEW_FPS = 4
+    PREVIEW_COLORS = 32
+    # 快速预览最多帧数，片段较长时进一步降低帧率
+    PREVIEW_MAX_FRAMES = 24
+    
+    def __init__(self, pipeline, preview_dir):
+        self.pipeline = pipeline
+        self.preview_dir = Path(preview_dir)
+        self.generation = 0
+        self.result = None  # (参数键, 完整预览文件)
+        self.lock = threading.Lock()
+    
+    def params_key(self, input_file, start_time, end_time, width, height, fps, quality,
+                   remove_black_borders, remove_watermark, delta_encoding):
+        """影响输出的参数（含帧处理器的抖动、重复帧和取帧设置），用于判断完整预览能否直接作为最终输出"""
+        processor = self.pipeline.frame_processor
+        return json.dumps([str(input_file), start_time, end_time, width, height, fps, quality,
+                           bool(remove_black_borders), bool(remove_watermark), bool(delta_encoding),
+                           processor.dither, processor.dedup_threshold, processor.sampling])
+    
+    def cancel(self):
+        """参数改变时取消正在生成的预览"""
+        with self.lock:
+            self.generation += 1
+    
+    def take_result(self, key):
+        """参数与完整预览一致时返回预览文件"""
+        with self.lock:
+            if self.result and self.result[0] == key and self.result[1].exists():
+                return self.result[1]
+        return None
+    
+    def _cleanup(self, keep=None):
+        """删除旧的预览文件"""
+        for path in self.preview_dir.glob('preview_*.gif'):
+            if path != keep:
+                path.unlink(missing_ok=True)
+    
+    def render(self, input_file, start_time, end_time, width, height, fps, quality,
+               remove_black_borders, remove_watermark, delta_encoding=False, stage_callback=None):
+        """依次生成快速预览和完整预览，每完成一个阶段调用stage_callback(阶段, 文件, 耗时)；
+        被新的预览或cancel()取消时抛出"转换被取消"异常"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self._cleanup()
+            self.result = None
+        cancel_check = lambda: generation == self.generation
+        self.preview_dir.mkdir(parents=True, exist_ok=True)
+        key = self.params_key(input_file, start_time, end_time, width, height, fps, quality,
+                              remove_black_borders, remove_watermark, delta_encoding)
+        
+        # 快速预览：与正式转换相同的提取和裁切流程，只是尺寸、帧率和颜色数更低
+        started = time.perf_counter()
+        duration = end_time - start_time
+        scale = min(1.0, self.PREVIEW_EDGE / max(width, height))
+        preview_width = max(16, int(width * scale) // 2 * 2)
+        preview_height = max(16, int(height * scale) // 2 * 2)
+        preview_fps = min(fps, self.PREVIEW_FPS, self.PREVIEW_MAX_FRAMES / duration)
+        crop_analyzer = self.pipeline.create_crop_analyzer(remove_black_borders, remove_watermark)
+        
+        quick_file = self.preview_dir / f"preview_{generation}_quick.gif"
+        frames = self.pipeline.frame_processor.iter_processed_frames(
+            input_file, start_time, end_time, preview_fps, preview_width, preview_height,
+            self.PREVIEW_COLORS, crop_analyzer=crop_analyzer
+        )
+        self.pipeline.write_gif(frames, quick_file, preview_fps, False, cancel_check)
+        # 裁切参数在原始分辨率下分析，完整预览直接沿用
+        crop_params = crop_analyzer.crop_params if crop_analyzer else None
+        elapsed = time.perf_counter() - started
+        print(f"快速预览: {preview_width}x{preview_height} {preview_fps:.1f}fps, 耗时 {elapsed:.2f}秒")
+        if stage_callback and cancel_check():
+            stage_callback('quick', quick_file, elapsed)
+        
+        # 完整预览：按完整参数编码，参数不变时即为最终输出
+        full_file = self.preview_dir / f"preview_{generation}_full.gif"
+        frames = self.pipeline.iter_frames(
+            input_file, start_time, end_time, fps, width, height, quality, crop_params
+        )
+        self.pipeline.write_gif(frames, full_file, fps, delta_encoding, cancel_check)
+        elapsed = time.perf_counter() - started
+        print(f"完整预览: {width}x{height} {fps}fps, 耗时 {elapsed:.2f}秒")
+        with self.lock:
+            if not cancel_check():
+                full_file.unlink(missing_ok=True)
+                raise Exception("转换被取消")
+            self.result = (key, full_file)
+        if stage_callback:
+            stage_callback('full', full_file, elapsed)
+        return full_file
+
+class BatchScheduler:
+    """批量转换调度器 - 下载、解码、编码三个阶段分别限制并发，不同任务的下载与CPU处理重叠进行"""
+    
+    # 解码与编码之间的帧队列长度（背压：编码跟不上时阻塞解码）
+    FRAME_QUEUE_SIZE = 32
+    # 任务状态
+    STATUSES = ('pending', 'downloading', 'queued', 'decoding', 'encoding', 'done', 'failed')
+    
+    _END = object()  # 帧队列结束标记
+    
+    def __init__(self, downloader, output_dir, download_workers=2, decode_workers=1, encode_workers=1,
+                 frame_processor=None, status_callback=None, encoder='pil', dither='sierra2_4a'):
+        self.downloader = downloader
+        self.output_dir = Path(output_dir)
+        self.download_workers = max(1, download_workers)
+        self.decode_workers = max(1, decode_workers)
+        self.encode_workers = max(1, encode_workers)
+        # encoder/dither为任务的默认编码引擎和ffmpeg抖动方式
+        self.pipeline = GifConversionPipeline(frame_processor, encoder=encoder, dither=dither)
+        self.status_callback = status_callback
+        
+        self.jobs = []
+        self._download_executor = self._decode_executor = self._encode_executor = None
+        self.cancelled = threading.Event()
+        self.condition = threading.Condition()
+        self.remaining = 0
+        self.start_time = None
+    
+    @staticmethod
+    def _parse_bool(value, default):
+        if value is None or value == '':
+            return default
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'y', 'on', '是')
+        return bool(value)
+    
+    @classmethod
+    def normalize_job(cls, raw, index, defaults=None):
+        """把JSON/CSV中的一条任务整理为统一格式，缺省参数取defaults"""
+        job = dict(defaults or {})
+        raw = {k: v for k, v in raw.items() if v is not None and v != ''}
+        # start/end是start_time/end_time的简写，任务中写明的时间优先于defaults
+        for alias, key in (('start', 'start_time'), ('end', 'end_time')):
+            if alias in raw and key not in raw:
+                raw[key] = raw.pop(alias)
+        job.update(raw)
+        
+        source = str(job.get('source') or job.get('url') or '').strip()
+        if not source:
+            raise Exception(f"第{index + 1}个任务缺少source")
+        
+        try:
+            start_time = float(job.get('start_time', job.get('start', 0)))
+            end_time = float(job.get('end_time', job.get('end', start_time + 10)))
+            if job.get('size'):
+                width, height = map(int, re.split(r'[xX*]', str(job['size'])))
+            else:
+                width, height = int(job.get('width', 640)), int(job.get('height', 360))
+            fps = int(job.get('fps', 20))
+        except (TypeError, ValueError):
+            raise Exception(f"第{index + 1}个任务参数无效: {raw}")
+        
+        if start_time < 0 or start_time >= end_time:
+            raise Exception(f"第{index + 1}个任务开始时间必须小于结束时间")
+        if width <= 0 or height <= 0 or fps <= 0 or fps > 60:
+            raise Exception(f"第{index + 1}个任务分辨率或帧率无效")
+        
+        encoder = str(job.get('encoder') or 'pil')
+        if encoder not in GifConversionPipeline.ENCODERS:
+            raise Exception(f"第{index + 1}个任务编码引擎无效: {encoder}")
+        try:
+            target_size = float(job['target_size']) if job.get('target_size') else None
+        except (TypeError, ValueError):
+            raise Exception(f"第{index + 1}个任务目标大小无效: {job.get('target_size')}")
+        if target_size is not None and target_size <= 0:
+            raise Exception(f"第{index + 1}个任务目标大小无效: {target_size}")
+        
+        quality = str(job.get('quality', '中'))
+        return {
+            'id': str(job.get('id') or index + 1),
+            'source': source,
+            'is_local_file': Path(source).is_file(),
+            'start_time': start_time,
+            'end_time': end_time,
+            'width': width,
+            'height': height,
+            'fps': fps,
+            'quality': {"high": "高", "medium": "中", "low": "低"}.get(quality, quality),
+            'remove_black_borders': cls._parse_bool(job.get('remove_black_borders'), True),
+            'remove_watermark': cls._parse_bool(job.get('remove_watermark'), True),
+            'delta_encoding': cls._parse_bool(job.get('delta_encoding'), True),
+            'encoder': encoder,
+            'target_size': target_size,
+            'output': job.get('output'),
+            'status': 'pending',
+            'error': None,
+            'output_file': None,
+            'frames_written': 0,
+            'expected_frames': max(1, int((end_time - start_time) * fps)),
+            'stage_times': {}
+        }
+    
+    @classmethod
+    def load_jobs(cls, job_file, defaults=None):
+        """读取任务列表：JSON（数组或{"jobs": [...]}）或带表头的CSV"""
+        job_file = Path(job_file)
+        if job_file.suffix.lower() == '.csv':
+            import csv
+            with open(job_file, newline='', encoding='utf-8-sig') as f:
+                raw_jobs = list(csv.DictReader(f))
+        else:
+            raw_jobs = json.loads(job_file.read_text(encoding='utf-8'))
+            if isinstance(raw_jobs, dict):
+                raw_jobs = raw_jobs.get('jobs', [])
+        
+        return [cls.normalize_job(raw, i, defaults) for i, raw in enumerate(raw_jobs)]
+    
+    def run(self, jobs):
+        """运行所有任务直到完成，返回汇总信息"""
+        print(f"批量转换 {len(jobs)} 个任务：下载并发{self.download_workers}，"
+              f"解码并发{self.decode_workers}，编码并发{self.encode_workers}")
+        self.start()
+        try:
+            for job in jobs:
+                self.submit(job)
+            self.wait()
+        except KeyboardInterrupt:
+            # 取消后正在运行的阶段会尽快结束，执行器关闭时等待它们退出
+            self.cancel()
+            raise
+        finally:
+            self.shutdown()
+        
+        return self.summary()
+    
+    def start(self):
+        """创建各阶段的执行器，之后可以随时提交任务（常驻服务使用）"""
+        self.start_time = time.time()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 编码任务在解码开始时才提交，编码执行器按解码开始的顺序运行，不会出现互相等待
+        self._download_executor = ThreadPoolExecutor(max_workers=self.download_workers)
+        self._decode_executor = ThreadPoolExecutor(max_workers=self.decode_workers)
+        self._encode_executor = ThreadPoolExecutor(max_workers=self.encode_workers)
+    
+    def submit(self, job):
+        """提交一个已整理好的任务"""
+        with self.condition:
+            self.jobs.append(job)
+            self.remaining += 1
+        
+        if job['is_local_file']:
+            job['video_file'] = Path(job['source'])
+            job['time_offset'] = 0.0
+            job['title'] = Path(job['source']).stem
+            self._set_status(job, 'queued')
+            self._decode_executor.submit(self._decode_stage, job)
+        else:
+            self._download_executor.submit(self._download_stage, job)
+    
+    def wait(self):
+        """等待所有已提交的任务结束"""
+        with self.condition:
+            while self.remaining > 0:
+                self.condition.wait(timeout=1)
+    
+    def wait_job(self, job, timeout=None):
+        """等待单个任务结束，返回任务是否已结束"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.condition:
+            while job['status'] not in ('done', 'failed'):
+                remaining = deadline - time.time() if deadline is not None else 1
+                if remaining <= 0:
+                    return False
+                self.condition.wait(timeout=min(remaining, 1))
+        return True
+    
+    def forget(self, job):
+        """从任务列表中移除已结束的任务"""
+        with self.condition:
+            if job in self.jobs and job['status'] in ('done', 'failed'):
+                self.jobs.remove(job)
+    
+    def shutdown(self):
+        """关闭各阶段执行器，等待正在运行的阶段结束"""
+        for executor in (self._download_executor, self._decode_executor, self._encode_executor):
+            executor.shutdown(wait=True)
+    
+    def cancel(self):
+        """取消所有未完成的任务"""
+        self.cancelled.set()
+    
+    def summary(self):
+        """汇总任务状态与吞吐量（每分钟完成的片段数）"""
+        elapsed = time.time() - self.start_time if self.start_time else 0.0
+        completed = sum(1 for job in self.jobs if job['status'] == 'done')
+        failed = sum(1 for job in self.jobs if job['status'] == 'failed')
+        return {
+            'total': len(self.jobs),
+            'completed': completed,
+            'failed': failed,
+            'elapsed': round(elapsed, 2),
+            'clips_per_minute': round(completed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            'jobs': self.status()
+        }
+    
+    def status(self):
+        """各任务当前状态的快照"""
+        with self.condition:
+            return [self.job_status(job) for job in self.jobs]
+    
+    @staticmethod
+    def job_status(job):
+        """单个任务的状态快照，progress为已写入帧数占预计帧数的比例"""
+        keys = ('id', 'source', 'start_time', 'end_time', 'status', 'error', 'output_file',
+                'frames_written', 'stage_times')
+        status = {key: (str(job[key]) if key == 'output_file' and job[key] else job[key]) for key in keys}
+        status['progress'] = 1.0 if job['status'] == 'done' else round(
+            min(job['frames_written'] / job['expected_frames'], 0.99), 3)
+        return status
+    
+    def _set_status(self, job, status, expected=None):
+        """更新任务状态；指定expected时只在当前状态相符时更新"""
+        with self.condition:
+            if expected is not None and job['status'] != expected:
+                return
+            job['status'] = status
+        if self.status_callback:
+            self.status_callback(job)
+    
+    @staticmethod
+    def _put_frame(frame_queue, item, aborted):
+        """放入帧队列，队列满时等待编码；编码已终止时返回False"""
+        while not aborted.is_set():
+            try:
+                frame_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _finish(self, job, error=None):
+        """任务结束（成功或失败），释放下载的临时文件"""
+        if error is not None:
+            job['error'] = str(error)
+            print(f"任务{job['id']}失败: {error}")
+        if not job['is_local_file'] and job.get('video_file'):
+            self.downloader.release(job['video_file'])
+        
+        self._set_status(job, 'failed' if error is not None else 'done')
+        with self.condition:
+            job['finished_at'] = time.time()
+            self.remaining -= 1
+            self.condition.notify_all()
+    
+    def _download_stage(self, job):
+        try:
+            if self.cancelled.is_set():
+                raise Exception("转换被取消")
+            self._set_status(job, 'downloading')
+            stage_start = time.time()
+            job['video_file'], job['time_offset'] = self.downloader.download(
+                job['source'], job['start_time'], job['end_time']
+            )
+            try:
+                job['title'] = self.downloader.extract_info(job['source']).get('title', 'video')
+            except Exception:
+                job['title'] = 'video'
+            job['stage_times']['download'] = round(time.time() - stage_start, 2)
+        except Exception as e:
+            self._finish(job, e)
+            return
+        
+        self._set_status(job, 'queued')
+        self._decode_executor.submit(self._decode_stage, job)
+    
+    def _decode_stage(self, job):
+        frame_queue = queue.Queue(maxsize=self.FRAME_QUEUE_SIZE)
+        aborted = threading.Event()
+        try:
+            if self.cancelled.is_set():
+                raise Exception("转换被取消")
+            self._set_status(job, 'decoding')
+            stage_start = time.time()
+            
+            if job['output'] and Path(job['output']).suffix.lower() == '.gif':
+                job['output_file'] = Path(job['output'])
+                job['output_file'].parent.mkdir(parents=True, exist_ok=True)
+            else:
+                output_dir = Path(job['output']) if job['output'] else self.output_dir
+                output_dir.mkdir(parents=True, exist_ok=True)
+                job['output_file'] = GifConversionPipeline.output_filename(
+                    output_dir, f"{job['title']}_{job['id']}"
+                )
+            
+            input_file = str(job['video_file'])
+            start_time = job['start_time'] - job['time_offset']
+            end_time = job['end_time'] - job['time_offset']
+            if job['encoder'] == 'ffmpeg' or job['target_size']:
+                # FFmpeg编码和目标大小模式不经过帧队列，在解码并发内完成整个转换
+                self._convert_whole(job, input_file, start_time, end_time, stage_start)
+                return
+            frames = self.pipeline.iter_frames(
+                input_file, start_time, end_time, job['fps'], job['width'], job['height'], job['quality'],
+                crop_analyzer=self.pipeline.create_crop_analyzer(job['remove_black_borders'], job['remove_watermark'])
+            )
+        except Exception as e:
+            self._finish(job, e)
+            return
+        
+        self._encode_executor.submit(self._encode_stage, job, frame_queue, aborted)
+        try:
+            for frame in frames:
+                # 编码失败或取消时停止解码
+                if not self._put_frame(frame_queue, frame, aborted):
+                    frames.close()
+                    break
+            else:
+                self._put_frame(frame_queue, self._END, aborted)
+                self._set_status(job, 'encoding', expected='decoding')
+        except Exception as e:
+            self._put_frame(frame_queue, e, aborted)
+        finally:
+            job['stage_times']['decode'] = round(time.time() - stage_start, 2)
+    
+    def _convert_whole(self, job, input_file, start_time, end_time, stage_start):
+        """由流水线完成整个转换（FFmpeg编码引擎或目标大小模式）"""
+        cancel_check = lambda: not self.cancelled.is_set()
+        try:
+            if job['target_size']:
+                plan = self.pipeline.convert_to_size(
+                    input_file, job['output_file'], start_time, end_time, job['width'], job['height'], job['fps'],
+                    job['quality'], int(job['target_size'] * 1024 * 1024), job['remove_black_borders'],
+                    job['remove_watermark'], job['delta_encoding'], cancel_check=cancel_check, encoder=job['encoder']
+                )
+                job['frames_written'] = plan['frames']
+            else:
+                job['frames_written'] = self.pipeline.convert(
+                    input_file, job['output_file'], start_time, end_time, job['width'], job['height'], job['fps'],
+                    job['quality'], job['remove_black_borders'], job['remove_watermark'], job['delta_encoding'],
+                    cancel_check=cancel_check, encoder=job['encoder']
+                )
+        except Exception as e:
+            self._finish(job, e)
+            return
+        finally:
+            job['stage_times']['decode'] = round(time.time() - stage_start, 2)
+        self._finish(job)
+    
+    def _encode_stage(self, job, frame_queue, aborted):
+        def queued_frames():
+            while True:
+                item = frame_queue.get()
+                if item is self._END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                job['frames_written'] += 1
+                yield item
+        
+        stage_start = time.time()
+        try:
+            self.pipeline.write_gif(
+                queued_frames(), job['output_file'], job['fps'], job['delta_encoding'],
+                cancel_check=lambda: not self.cancelled.is_set()
+            )
+        except Exception as e:
+            aborted.set()
+            self._finish(job, e)
+            return
+        finally:
+            job['stage_times']['encode'] = round(time.time() - stage_start, 2)
+        
+        self._finish(job)
+
+class ConversionServer:
+    """本地HTTP转换服务 - 接收转换任务，查询状态和进度，完成后流式返回GIF
+    
+    POST /jobs            提交任务（JSON，字段同批量任务），返回任务ID
+    POST /convert         提交任务并等待完成，直接返回GIF
+    GET  /jobs            所有任务状态
+    GET  /jobs/<id>       任务状态和进度
+    GET  /jobs/<id>/gif   下载GIF（?wait=1 时等待任务完成）
+    DELETE /jobs/<id>     删除已结束的任务及其GIF
+    GET  /health          服务状态
+    """
+    
+    # 保留的已结束任务数量，超出后删除最早的任务和GIF
+    MAX_FINISHED_JOBS = 200
+    # 等待任务完成的最长时间（秒）
+    WAIT_TIMEOUT = 600
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, temp_dir, host='127.0.0.1', port=8765, download_workers=2, decode_workers=1,
+                 encode_workers=1, frame_processor=None, defaults=None, dither='sierra2_4a'):
+        self.temp_dir = Path(temp_dir)
+        self.host = host
+        self.port = port
+        self.defaults = defaults or {}
+        
+        # 帧处理器常驻：所有请求共用同一个预热好的工作池
+        if frame_processor is None:
+            frame_processor = OptimizedFrameProcessor(persistent=True)
+        self.frame_processor = frame_processor
+        
+        downloader = VideoDownloader(
+            self.temp_dir,
+            cache=VideoCache(self.temp_dir / "video_cache"),
+            info_cache=VideoInfoCache(self.temp_dir / "info_cache")
+        )
+        self.scheduler = BatchScheduler(
+            downloader, self.temp_dir / "server_output",
+            download_workers=download_workers,
+            decode_workers=decode_workers,
+            encode_workers=encode_workers,
+            frame_processor=frame_processor,
+            dither=dither
+        )
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.httpd = None
+    
+    def submit(self, raw_job):
+        """整理并提交一个任务，返回任务"""
+        raw_job = dict(raw_job)
+        raw_job['id'] = uuid.uuid4().hex[:12]
+        raw_job['output'] = None  # 输出统一放在服务目录中
+        job = BatchScheduler.normalize_job(raw_job, 0, self.defaults)
+        
+        with self.jobs_lock:
+            self.jobs[job['id']] = job
+        self._evict_finished()
+        self.scheduler.submit(job)
+        return job
+    
+    def get_job(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+    
+    def job_counts(self):
+        """各状态的任务数（其他请求线程会同时增删任务，需持有jobs_lock遍历）"""
+        with self.jobs_lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+        return {status: statuses.count(status) for status in BatchScheduler.STATUSES if status in statuses}
+    
+    def delete_job(self, job_id):
+        """删除已结束的任务，返回是否删除"""
+        with self.jobs_lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] not in ('done', 'failed'):
+                return False
+            del self.jobs[job_id]
+        self._discard(job)
+        return True
+    
+    def _discard(self, job):
+        self.scheduler.forget(job)
+        if job.get('output_file'):
+            Path(job['output_file']).unlink(missing_ok=True)
+    
+    def _evict_finished(self):
+        with self.jobs_lock:
+            finished = sorted((job for job in self.jobs.values() if job['status'] in ('done', 'failed')),
+                              key=lambda job: job.get('finished_at', 0))
+            expired = finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]
+            for job in expired:
+                del self.jobs[job['id']]
+        for job in expired:
+            self._discard(job)
+    
+    def serve_forever(self):
+        """启动服务，直到被中断"""
+        from http.server import ThreadingHTTPServer
+        
+        self.frame_processor.warm_up()
+        self.scheduler.start()
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.httpd.daemon_threads = True
+        print(f"转换服务已启动: http://{self.host}:{self.httpd.server_port}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+            self.scheduler.cancel()
+            self.scheduler.shutdown()
+            self.frame_processor.close()
+    
+    def shutdown(self):
+        """从其他线程停止服务"""
+        if self.httpd:
+            self.httpd.shutdown()
+    
+    def _make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+        from urllib.parse import parse_qs
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, format, *args):
+                print(f"[HTTP] {self.address_string()} {format % args}")
+            
+            def _send_json(self, code, data):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _send_gif(self, job):
+                if job['status'] == 'failed':
+                    self._send_json(500, BatchScheduler.job_status(job))
+                    return
+                path = Path(job['output_file'])
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/gif')
+                self.send_header('Content-Length', str(path.stat().st_size))
+                self.send_header('X-Job-Id', job['id'])
+                self.end_headers()
+                with open(path, 'rb') as f:
+                    while True:
+                        chunk = f.read(server.CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+            
+            def _read_job(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    raw_job = json.loads(self.rfile.read(length) or b'{}')
+                    if not isinstance(raw_job, dict):
+                        raise ValueError("任务必须是JSON对象")
+                    return server.submit(raw_job)
+                except Exception as e:
+                    self._send_json(400, {'error': str(e)})
+                    return None
+            
+            def _route(self):
+                parts = [part for part in urlparse(self.path).path.split('/') if part]
+                query = parse_qs(urlparse(self.path).query)
+                return parts, query
+            
+            def do_GET(self):
+                parts, query = self._route()
+                if parts == ['health']:
+                    self._send_json(200, {'status': 'ok', 'jobs': server.job_counts()})
+                elif parts == ['jobs']:
+                    self._send_json(200, server.scheduler.status())
+                elif len(parts) in (2, 3) and parts[0] == 'jobs':
+                    job = server.get_job(parts[1])
+                    if job is None:
+                        self._send_json(404, {'error': "任务不存在"})
+                    elif len(parts) == 2:
+                        self._send_json(200, BatchScheduler.job_status(job))
+                    elif parts[2] != 'gif':
+                        self._send_json(404, {'error': "未知路径"})
+                    elif query.get('wait', ['0'])[0] in ('1', 'true'):
+                        if server.scheduler.wait_job(job, server.WAIT_TIMEOUT):
+                            self._send_gif(job)
+                        else:
+                            self._send_json(504, BatchScheduler.job_status(job))
+                    elif job['status'] in ('done', 'failed'):
+                        self._send_gif(job)
+                    else:
+                        self._send_json(409, BatchScheduler.job_status(job))
+                else:
+                    self._send_json(404, {'error': "未知路径"})
+            
+            def do_POST(self):
+                parts, _ = self._route()
+                if parts == ['jobs']:
+                    job = self._read_job()
+                    if job:
+                        self._send_json(202, {'id': job['id'], 'status': job['status'],
+                                              'status_url': f"/jobs/{job['id']}",
+                                              'gif_url': f"/jobs/{job['id']}/gif"})
+                elif parts == ['convert']:
+                    job = self._read_job()
+                    if job:
+                        if server.scheduler.wait_job(job, server.WAIT_TIMEOUT):
+                            self._send_gif(job)
+                        else:
+                            self._send_json(504, BatchScheduler.job_status(job))
+                else:
+                    self._send_json(404, {'error': "未知路径"})
+            
+            def do_DELETE(self):
+                parts, _ = self._route()
+                if len(parts) == 2 and parts[0] == 'jobs':
+                    if server.delete_job(parts[1]):
+                        self._send_json(200, {'deleted': parts[1]})
+                    else:
+                        self._send_json(409, {'error': "任务不存在或尚未结束"})
+                else:
+                    self._send_json(404, {'error': "未知路径"})
+        
+        return Handler
+
+class BilibiliToGifConverter:
+    """bilibili视频转GIF转换器"""
+    
+    # 预览窗口最多显示的帧数
+    PREVIEW_DISPLAY_FRAMES = 60
+    
+    def __init__(self, root):
+        self.root = root
+        self.setup_directories()
+        self.setup_logging()
+        self.setup_gui()
+        
+        # 转换参数
+        self.video_info = None
+        self.conversion_thread = None
+        self.is_converting = False
+        self.is_local_file = False  # 新增：标记是否为本地文件
+        self.local_file_path = None  # 新增：本地文件路径
+        
+        # 初始化优化的帧处理器和转换流水线
+        self.frame_processor = OptimizedFrameProcessor(
+            dedup_threshold=OptimizedFrameProcessor.DEDUP_THRESHOLD if self.dedup_var.get() else 0,
+            sampling='adaptive' if self.adaptive_fps_var.get() else 'fixed',
+            memory_budget=MemoryBudget.DEFAULT_BUDGET_MB * 1024 ** 2, spill_dir=self.temp_dir
+        )
+        self.dedup_var.trace('w', self._on_dedup_change)
+        self.adaptive_fps_var.trace('w', self._on_sampling_change)
+        self.pipeline = GifConversionPipeline(
+            self.frame_processor, stats_file=self.log_dir / "encoder_stats.jsonl"
+        )
+        
+        # 视频下载器，重复转换同一视频时直接使用缓存
+        self.downloader = VideoDownloader(
+            self.temp_dir,
+            cache=VideoCache(self.temp_dir / "video_cache"),
+            info_cache=VideoInfoCache(self.temp_dir / "info_cache")
+        )
+        
+        # 预览生成器，完整预览与转换参数一致时直接作为转换结果
+        self.previewer = GifPreviewer(self.pipeline, self.temp_dir / "preview")
+        self.preview_window = None
+        self.preview_frames = []
+        self.preview_index = 0
+        self.preview_job = None
+        
+        # 采样校准的大小估算器，校准完成前使用固定系数模型
+        self.size_estimator = GifSizeEstimator()
+        self.size_estimate_key = None
+        self.size_coefficients = None
+        
+    def setup_directories(self):
+        """设置目录结构"""
+        self.base_dir = Path(__file__).parent
+        self.output_dir = self.base_dir / "output"
+        self.log_dir = self.base_dir / "logs"
+        self.temp_dir = self.base_dir / "temp"
+        
+        for dir_path in [self.output_dir, self.log_dir, self.temp_dir]:
+            dir_path.mkdir(exist_ok=True)
+    
+    def setup_logging(self):
+        """设置日志"""
+        log_file = self.log_dir / f"bilibili_to_gif_{int(time.time())}.log"
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            handlers=[
+                logging.FileHandler(log_file, encoding='utf-8'),
+                logging.StreamHandler()
+            ]
+        )
+        self.logger = logging.getLogger(__name__)
+    
+    def setup_gui(self):
+        """设置GUI界面"""
+        self.root.title(" Bilibili视频转GIF工具By:丶樱流 ")
+        self.root.geometry("950x800")
+        self.root.minsize(900, 750)
+        self.root.resizable(True, True)
+        
+        # 设置高DPI适配
+        try:
+            from ctypes import windll
+            windll.shcore.SetProcessDpiAwareness(1)
+        except:
+            pass
+        
+        # 直接创建主框架，不使用滚动条，确保所有内容在默认大小下可见
+        main_frame = ttk.Frame(self.root, padding="15")
+        main_frame.pack(fill="both", expand=True)
+        
+        # 配置网格权重
+        main_frame.columnconfigure(1, weight=1)
+        
+        row = 0
+        
+        # 输入方式选择
+        input_frame = ttk.LabelFrame(main_frame, text="输入方式", padding="5")
+        input_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        
+        self.input_method_var = tk.StringVar(value="url")
+        ttk.Radiobutton(input_frame, text="Bilibili链接", variable=self.input_method_var, 
+                       value="url", command=self.on_input_method_change).pack(side=tk.LEFT, padx=(0, 20))
+        ttk.Radiobutton(input_frame, text="本地视频文件", variable=self.input_method_var, 
+                       value="file", command=self.on_input_method_change).pack(side=tk.LEFT)
+        row += 1
+        
+        # URL输入框
+        self.url_frame = ttk.Frame(main_frame)
+        self.url_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        self.url_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(self.url_frame, text="Bilibili视频链接:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.url_var = tk.StringVar()
+        url_entry = ttk.Entry(self.url_frame, textvariable=self.url_var, width=60)
+        url_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        ttk.Button(self.url_frame, text="获取视频信息", command=self.get_video_info).grid(
+            row=0, column=2, padx=(10, 0), pady=5)
+        
+        # 本地文件选择框
+        self.file_frame = ttk.Frame(main_frame)
+        self.file_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(self.file_frame, text="本地视频文件:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.file_path_var = tk.StringVar()
+        ttk.Entry(self.file_frame, textvariable=self.file_path_var, width=60, state="readonly").grid(
+            row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        ttk.Button(self.file_frame, text="选择文件", command=self.select_local_file).grid(
+            row=0, column=2, padx=(10, 0), pady=5)
+        
+        row += 1
+        
+        # 视频信息显示
+        self.info_text = tk.Text(main_frame, height=4, wrap=tk.WORD)
+        self.info_text.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        row += 1
+        
+        # 时间设置框架
+        time_frame = ttk.LabelFrame(main_frame, text="时间设置", padding="5")
+        time_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        time_frame.columnconfigure(1, weight=1)
+        time_frame.columnconfigure(3, weight=1)
+        
+        ttk.Label(time_frame, text="开始时间(秒):").grid(row=0, column=0, sticky=tk.W)
+        self.start_time_var = tk.StringVar(value="0")
+        ttk.Entry(time_frame, textvariable=self.start_time_var, width=10).grid(
+            row=0, column=1, sticky=tk.W, padx=(5, 20)
+        )
+        
+        ttk.Label(time_frame, text="结束时间(秒):").grid(row=0, column=2, sticky=tk.W)
+        self.end_time_var = tk.StringVar(value="10")
+        ttk.Entry(time_frame, textvariable=self.end_time_var, width=10).grid(
+            row=0, column=3, sticky=tk.W, padx=(5, 0)
+        )
+        row += 1
+        
+        # GIF设置框架
+        gif_frame = ttk.LabelFrame(main_frame, text="GIF设置", padding="5")
+        gif_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        gif_frame.columnconfigure(1, weight=1)
+        gif_frame.columnconfigure(3, weight=1)
+        
+        # 分辨率设置
+        ttk.Label(gif_frame, text="输出分辨率:").grid(row=0, column=0, sticky=tk.W)
+        self.resolution_var = tk.StringVar()
+        self.resolution_combo = ttk.Combobox(
+            gif_frame, textvariable=self.resolution_var, 
+            values=["480x270", "640x360", "854x480", "1280x720", "自定义"], 
+            state="readonly", width=20
+        )
+        self.resolution_combo.grid(row=0, column=1, sticky=tk.W, padx=(5, 20))
+        self.resolution_combo.set("640x360")
+        
+        # 压缩比例显示
+        self.compression_label = ttk.Label(gif_frame, text="", foreground="blue")
+        self.compression_label.grid(row=0, column=2, sticky=tk.W, padx=(10, 0))
+        
+        # 帧率设置
+        ttk.Label(gif_frame, text="帧率(FPS):").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        self.fps_var = tk.StringVar(value="20")  # 进一步提高默认帧率以改善流畅度
+        ttk.Entry(gif_frame, textvariable=self.fps_var, width=8).grid(
+            row=1, column=1, sticky=tk.W, padx=(5, 20), pady=(5, 0)
+        )
+        
+        # 质量设置
+        ttk.Label(gif_frame, text="质量:").grid(row=1, column=2, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+        self.quality_var = tk.StringVar(value="中")
+        quality_combo = ttk.Combobox(
+            gif_frame, textvariable=self.quality_var,
+            values=["高", "中", "低"],
+            state="readonly", width=8
+        )
+        quality_combo.grid(row=1, column=3, sticky=tk.W, padx=(5, 0), pady=(5, 0))
+        
+        # 视频处理设置
+        processing_frame = ttk.LabelFrame(gif_frame, text="视频优化", padding="5")
+        processing_frame.grid(row=2, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
+        
+        self.auto_crop_var = tk.BooleanVar(value=True)
+        auto_crop_check = ttk.Checkbutton(
+            processing_frame, 
+            text="自动去除黑边", 
+            variable=self.auto_crop_var
+        )
+        auto_crop_check.pack(side=tk.LEFT, padx=(0, 20))
+        
+        self.remove_watermark_var = tk.BooleanVar(value=True)
+        watermark_check = ttk.Checkbutton(
+            processing_frame, 
+            text="智能裁切bilibili水印", 
+            variable=self.remove_watermark_var
+        )
+        watermark_check.pack(side=tk.LEFT, padx=(0, 20))
+        
+        # 添加水印位置说明
+        watermark_info = ttk.Label(
+            processing_frame, 
+            text="(自动识别右下角水印区域)",
+            font=('TkDefaultFont', 8),
+            foreground='gray'
+        )
+        watermark_info.pack(side=tk.LEFT)
+        
+        # 帧间差分编码：只保存变化区域，静态背景的视频体积大幅减小
+        self.delta_encoding_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            processing_frame,
+            text="帧间差分压缩",
+            variable=self.delta_encoding_var
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # 合并重复帧：静止画面只保留一帧并延长显示时间
+        self.dedup_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            processing_frame,
+            text="合并重复帧",
+            variable=self.dedup_var
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # 运动自适应帧率：总帧数不变，动作快的片段多取帧、静止片段少取帧
+        self.adaptive_fps_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            processing_frame,
+            text="运动自适应帧率",
+            variable=self.adaptive_fps_var
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # FFmpeg编码：调色板生成与映射在ffmpeg中完成，没有ffmpeg时自动改用PIL编码
+        self.ffmpeg_encoder_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            processing_frame,
+            text="FFmpeg编码",
+            variable=self.ffmpeg_encoder_var
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # 目标大小：先用采样帧试编码自动降低分辨率/颜色/帧率，再做一次完整转换
+        self.target_size_enabled_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            processing_frame,
+            text="限制大小(MB):",
+            variable=self.target_size_enabled_var
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        self.target_size_var = tk.StringVar(value="4")
+        ttk.Entry(processing_frame, textvariable=self.target_size_var, width=5).pack(side=tk.LEFT)
+        
+        # 如果OpenCV不可用，显示警告并禁用智能处理选项
+        if not CV2_AVAILABLE:
+            auto_crop_check.config(state=tk.DISABLED)
+            watermark_check.config(state=tk.DISABLED)
+            self.auto_crop_var.set(False)
+            self.remove_watermark_var.set(False)
+            
+            warning_label = ttk.Label(
+                processing_frame,
+                text="(需要安装opencv-python库可用智能处理)",
+                font=('TkDefaultFont', 8),
+                foreground='red'
+            )
+            warning_label.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 智能推荐框架
+        self.recommend_frame = ttk.LabelFrame(gif_frame, text="智能推荐", padding="5")
+        self.recommend_frame.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.recommend_frame.columnconfigure(0, weight=1)
+        
+        # 推荐信息显示
+        self.recommend_text = tk.Text(self.recommend_frame, height=3, wrap=tk.WORD)
+        self.recommend_text.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.recommend_text.insert(1.0, "请先获取视频信息以查看智能推荐")
+        self.recommend_text.config(state=tk.DISABLED)
+        
+        # 推荐按钮框架
+        recommend_btn_frame = ttk.Frame(self.recommend_frame)
+        recommend_btn_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        self.recommend_buttons = []
+        
+        # 自定义分辨率
+        self.custom_frame = ttk.Frame(gif_frame)
+        self.custom_frame.grid(row=4, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=5)
+        
+        ttk.Label(self.custom_frame, text="自定义宽度:").pack(side=tk.LEFT)
+        self.custom_width_var = tk.StringVar(value="640")
+        ttk.Entry(self.custom_frame, textvariable=self.custom_width_var, width=8).pack(
+            side=tk.LEFT, padx=(5, 20)
+        )
+        
+        ttk.Label(self.custom_frame, text="高度:").pack(side=tk.LEFT)
+        self.custom_height_var = tk.StringVar(value="360")
+        ttk.Entry(self.custom_frame, textvariable=self.custom_height_var, width=8).pack(
+            side=tk.LEFT, padx=(5, 0)
+        )
+        
+        # 预估文件大小
+        ttk.Label(self.custom_frame, text="预估大小:").pack(side=tk.LEFT, padx=(20, 5))
+        self.size_estimate_label = ttk.Label(self.custom_frame, text="--")
+        self.size_estimate_label.pack(side=tk.LEFT)
+        
+        # 绑定事件
+        self.resolution_combo.bind('<<ComboboxSelected>>', self.on_resolution_change)
+        self.custom_width_var.trace('w', self.update_size_estimate)
+        self.custom_height_var.trace('w', self.update_size_estimate)
+        self.fps_var.trace('w', self.update_size_estimate)
+        self.quality_var.trace('w', self.update_size_estimate)
+        # 绑定时间变化事件，用于重新计算推荐
+        self.start_time_var.trace('w', self.on_time_change)
+        self.end_time_var.trace('w', self.on_time_change)
+        # 参数改变时取消正在生成的预览
+        for var in (self.resolution_var, self.custom_width_var, self.custom_height_var, self.fps_var,
+                    self.quality_var, self.start_time_var, self.end_time_var, self.auto_crop_var,
+                    self.remove_watermark_var, self.delta_encoding_var):
+            var.trace('w', self._invalidate_preview)
+        
+        self.custom_frame.pack_forget()  # 初始隐藏自定义分辨率
+        row += 1
+        
+        # 输出路径设置
+        output_frame = ttk.Frame(main_frame)
+        output_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        output_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(output_frame, text="输出路径:").grid(row=0, column=0, sticky=tk.W)
+        self.output_path_var = tk.StringVar(value=str(self.output_dir))
+        ttk.Entry(output_frame, textvariable=self.output_path_var).grid(
+            row=0, column=1, sticky=(tk.W, tk.E), padx=(5, 5)
+        )
+        ttk.Button(output_frame, text="浏览", command=self.browse_output_path).grid(
+            row=0, column=2
+        )
+        row += 1
+        
+        # 控制按钮
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=row, column=0, columnspan=3, pady=20)
+        
+        self.convert_button = ttk.Button(
+            button_frame, text="开始转换", command=self.start_conversion
+        )
+        self.convert_button.pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Button(
+            button_frame, text="预览", command=self.start_preview
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.stop_button = ttk.Button(
+            button_frame, text="停止转换", command=self.stop_conversion, state=tk.DISABLED
+        )
+        self.stop_button.pack(side=tk.LEFT)
+        row += 1
+        
+        # 进度条
+        self.progress_var = tk.StringVar(value="就绪")
+        ttk.Label(main_frame, textvariable=self.progress_var).grid(
+            row=row, column=0, columnspan=3, pady=5
+        )
+        row += 1
+        
+        self.progress_bar = ttk.Progressbar(
+            main_frame, mode='indeterminate'
+        )
+        self.progress_bar.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        
+        # 初始化输入方式显示
+        self.on_input_method_change()
+    
+    def on_input_method_change(self):
+        """输入方式改变时的回调"""
+        if self.input_method_var.get() == "url":
+            self.url_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+            self.file_frame.grid_remove()
+            self.is_local_file = False
+        else:
+            self.file_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+            self.url_frame.grid_remove()
+            self.is_local_file = True
+    
+    def select_local_file(self):
+        """选择本地视频文件"""
+        file_types = [
+            ("视频文件", "*.mp4 *.avi *.mkv *.mov *.wmv *.flv *.webm *.m4v"),
+            ("所有文件", "*.*")
+        ]
+        
+        file_path = filedialog.askopenfilename(
+            title="选择视频文件",
+            filetypes=file_types
+        )
+        
+        if file_path:
+            self.file_path_var.set(file_path)
+            self.local_file_path = file_path
+            # 自动获取本地文件信息
+            self.get_video_info()
+    
+    def on_resolution_change(self, event):
+        """分辨率选择改变事件"""
+        if self.resolution_var.get() == "自定义":
+            self.custom_frame.pack(fill=tk.X, pady=5)
+        else:
+            self.custom_frame.pack_forget()
+        
+        # 更新压缩比例显示
+        self.update_compression_info()
+        self.update_size_estimate()
+    
+    def on_time_change(self, *args):
+        """时间设置改变时的回调"""
+        # 更新文件大小预估
+        self.update_size_estimate()
+        
+        # 如果有视频信息，重新计算推荐（延迟执行避免频繁计算）
+        if hasattr(self, 'video_info') and self.video_info:
+            # 取消之前的延迟任务
+            if hasattr(self, '_update_recommendations_job'):
+                self.root.after_cancel(self._update_recommendations_job)
+            
+            # 延迟500ms执行更新，避免用户快速输入时频繁计算
+            self._update_recommendations_job = self.root.after(500, self._delayed_update_recommendations)
+    
+    def _delayed_update_recommendations(self):
+        """延迟更新推荐"""
+        if hasattr(self, 'video_info') and self.video_info:
+            formats = self.video_info.get('formats', [])
+            best_video = None
+            for fmt in formats:
+                if fmt.get('vcodec') != 'none' and fmt.get('height'):
+                    if not best_video or fmt.get('height', 0) > best_video.get('height', 0):
+                        best_video = fmt
+            
+            if best_video and best_video.get('width') and best_video.get('height'):
+                self._suggest_gif_resolution(best_video.get('width'), best_video.get('height'))
+    
+    def update_compression_info(self):
+        """更新压缩比例信息"""
+        if not self.video_info:
+            self.compression_label.config(text="")
+            return
+        
+        # 获取视频原始分辨率
+        formats = self.video_info.get('formats', [])
+        best_video = None
+        for fmt in formats:
+            if fmt.get('vcodec') != 'none' and fmt.get('height'):
+                if not best_video or fmt.get('height', 0) > best_video.get('height', 0):
+                    best_video = fmt
+        
+        if not best_video:
+            return
+        
+        orig_width = best_video.get('width', 0)
+        orig_height = best_video.get('height', 0)
+        
+        if orig_width == 0 or orig_height == 0:
+            return
+        
+        # 获取目标分辨率
+        if self.resolution_var.get() == "自定义":
+            try:
+                target_width = int(self.custom_width_var.get())
+                target_height = int(self.custom_height_var.get())
+            except ValueError:
+                return
+        else:
+            try:
+                target_width, target_height = map(int, self.resolution_var.get().split('x'))
+            except ValueError:
+                return
+        
+        # 计算压缩比例和限制检查
+        compression_ratio = (target_width * target_height) / (orig_width * orig_height)
+        compression_percent = compression_ratio * 100
+        max_edge = max(target_width, target_height)
+        
+        # 构建显示文本
+        if compression_percent < 100:
+            text = f"压缩至 {compression_percent:.1f}%"
+            color = "green"
+        elif compression_percent == 100:
+            text = "原始大小"
+            color = "blue" 
+        else:
+            text = f"放大至 {compression_percent:.1f}%"
+            color = "orange"
+        
+        # 修改限制警告逻辑 - 只提示不拒绝
+        if max_edge > 500:
+            text += f" (提示: 超出推荐边长)"
+            color = "orange"  # 改为橙色提示而不是红色错误
+        
+        self.compression_label.config(text=text, foreground=color)
+    
+    def update_size_estimate(self, *args):
+        """更新文件大小预估"""
+        if not hasattr(self, 'video_info') or not self.video_info:
+            self.size_estimate_label.config(text="--")
+            return
+        
+        try:
+            # 获取参数
+            if self.resolution_var.get() == "自定义":
+                width = int(self.custom_width_var.get())
+                height = int(self.custom_height_var.get())
+            else:
+                width, height = map(int, self.resolution_var.get().split('x'))
+            
+            fps = int(self.fps_var.get())
+            start_time = float(self.start_time_var.get())
+            end_time = float(self.end_time_var.get())
+            quality = self.quality_var.get()
+            
+            # 计算持续时间
+            duration = end_time - start_time
+            
+            if duration <= 0:
+                self.size_estimate_label.config(text="--")
+                return
+            
+            # 根据质量获取颜色数
+            quality_colors = {"高": 256, "中": 128, "低": 64}.get(quality, 128)
+            
+            # 使用改进的文件大小预估
+            estimated_size_mb = self._estimate_gif_size(width, height, duration, fps, quality_colors)
+            
+            # 检查是否超过限制
+            max_edge = max(width, height)
+            
+            size_text = f"{estimated_size_mb:.1f}MB"
+            
+            # 修改警告标识 - 只提示不拒绝
+            warnings = []
+            if estimated_size_mb > 4.0:
+                warnings.append("大文件提示")
+            if max_edge > 500:
+                warnings.append("高分辨率")
+            
+            if warnings:
+                size_text += f" ({', '.join(warnings)})"
+                self.size_estimate_label.config(text=size_text, foreground="orange")  # 改为橙色提示
+            else:
+                size_text += " ✓"
+                self.size_estimate_label.config(text=size_text, foreground="green")
+            
+        except (ValueError, ZeroDivisionError):
+            self.size_estimate_label.config(text="--")
+    
+    def browse_output_path(self):
+        """浏览输出路径"""
+        path = filedialog.askdirectory(initialdir=self.output_path_var.get())
+        if path:
+            self.output_path_var.set(path)
+    
+    def get_video_info(self):
+        """获取视频信息"""
+        if self.is_local_file:
+            # 处理本地文件
+            if not self.local_file_path or not os.path.exists(self.local_file_path):
+                messagebox.showerror("错误", "请选择有效的本地视频文件")
+                return
+            file_path = self.local_file_path
+        else:
+            # 处理在线链接
+            url = self.url_var.get().strip()
+            if not url:
+                messagebox.showerror("错误", "请输入视频链接")
+                return
+            
+            if not self.is_bilibili_url(url):
+                messagebox.showerror("错误", "请输入有效的bilibili视频链接")
+                return
+            file_path = url
+        
+        self.progress_var.set("获取视频信息中...")
+        self.progress_bar.start()
+        
+        # 在新线程中获取视频信息
+        threading.Thread(target=self._get_video_info_thread, args=(file_path,), daemon=True).start()
+    
+    def is_bilibili_url(self, url):
+        """检查是否为bilibili链接"""
+        bilibili_patterns = [
+            r'bilibili\.com/video/[ABab][Vv]\w+',
+            r'b23\.tv/\w+',
+            r'bilibili\.com/video/BV\w+',
+            r'bilibili\.com/video/av\d+'
+        ]
+        return any(re.search(pattern, url) for pattern in bilibili_patterns)
+    
+    def _get_video_info_thread(self, source):
+        """获取视频信息线程"""
+        try:
+            if self.is_local_file:
+                # 处理本地文件
+                self._get_local_video_info(source)
+            else:
+                # 处理在线链接（视频信息缓存命中时立即返回）
+                print(f"正在获取视频信息: {source}")
+                
+                info = self.downloader.extract_info(source)
+                self.video_info = info
+                
+                print(f"视频标题: {info.get('title', '未知')}")
+                print(f"视频时长: {info.get('duration', 0)}秒")
+                
+                # 显示可用格式信息
+                formats = info.get('formats', [])
+                print(f"可用格式数量: {len(formats)}")
+                
+                for i, fmt in enumerate(formats[:5]):  # 只显示前5个格式
+                    print(f"格式{i+1}: {fmt.get('format_id', 'unknown')} - "
+                          f"{fmt.get('ext', 'unknown')} - "
+                          f"{fmt.get('width', '?')}x{fmt.get('height', '?')} - "
+                          f"{fmt.get('vcodec', 'unknown')}")
+                
+                # 更新GUI
+                self.root.after(0, self._update_video_info, info)
+                
+        except Exception as e:
+            error_msg = str(e)
+            print(f"获取视频信息失败: {error_msg}")
+            self.logger.error(f"获取视频信息失败: {error_msg}")
+            self.root.after(0, lambda msg=error_msg: messagebox.showerror("错误", f"获取视频信息失败: {msg}"))
+        finally:
+            self.root.after(0, self._stop_progress)
+    
+    def _get_local_video_info(self, file_path):
+        """获取本地视频信息"""
+        try:
+            if CV2_AVAILABLE:
+                # 使用OpenCV获取视频信息
+                cap = cv2.VideoCapture(file_path)
+                if not cap.isOpened():
+                    raise Exception(f"无法打开视频文件: {file_path}")
+                
+                # 获取基本信息
+                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                duration = frame_count / fps if fps > 0 else 0
+                
+                cap.release()
+                
+                # 构建伪造的info结构以兼容现有代码
+                file_name = Path(file_path).stem
+                self.video_info = {
+                    'title': file_name,
+                    'duration': duration,
+                    'uploader': '本地文件',
+                    'formats': [{
+                        'width': width,
+                        'height': height,
+                        'fps': fps,
+                        'vcodec': 'unknown',
+                        'ext': Path(file_path).suffix[1:]
+                    }]
+                }
+                
+                print(f"本地视频信息: {width}x{height}, {duration:.1f}秒")
+                
+            else:
+                # 如果没有OpenCV，使用ffprobe
+                try:
+                    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', file_path]
+                    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+                    probe_data = json.loads(result.stdout)
+                    
+                    # 找到视频流
+                    video_stream = None
+                    for stream in probe_data.get('streams', []):
+                        if stream.get('codec_type') == 'video':
+                            video_stream = stream
+                            break
+                    
+                    if not video_stream:
+                        raise Exception("未找到视频流")
+                    
+                    width = int(video_stream.get('width', 0))
+                    height = int(video_stream.get('height', 0))
+                    duration = float(probe_data.get('format', {}).get('duration', 0))
+                    fps = eval(video_stream.get('r_frame_rate', '0/1'))
+                    
+                    file_name = Path(file_path).stem
+                    self.video_info = {
+                        'title': file_name,
+                        'duration': duration,
+                        'uploader': '本地文件',
+                        'formats': [{
+                            'width': width,
+                            'height': height,
+                            'fps': fps,
+                            'vcodec': video_stream.get('codec_name', 'unknown'),
+                            'ext': Path(file_path).suffix[1:]
+                        }]
+                    }
+                    
+                except (subprocess.CalledProcessError, FileNotFoundError, json.JSONDecodeError):
+                    # 如果ffprobe也失败，使用基本信息
+                    file_name = Path(file_path).stem
+                    file_size = os.path.getsize(file_path) / (1024*1024)  # MB
+                    
+                    self.video_info = {
+                        'title': file_name,
+                        'duration': 60,  # 假设60秒
+                        'uploader': '本地文件',
+                        'formats': [{
+                            'width': 1920,  # 假设1080p
+                            'height': 1080,
+                            'fps': 25,
+                            'vcodec': 'unknown',
+                            'ext': Path(file_path).suffix[1:]
+                        }]
+                    }
+                    
+                    print(f"无法获取详细信息，使用默认值. 文件大小: {file_size:.1f}MB")
+            
+            # 更新GUI
+            self.root.after(0, self._update_video_info, self.video_info)
+            
+        except Exception as e:
+            error_msg = f"读取本地视频失败: {str(e)}"
+            print(error_msg)
+            self.root.after(0, lambda msg=error_msg: messagebox.showerror("错误", msg))
+    
+    def _update_video_info(self, info):
+        """更新视频信息显示"""
+        self.info_text.delete(1.0, tk.END)
+        
+        title = info.get('title', '未知')
+        duration = info.get('duration', 0) or 0  # 确保duration不为None
+        uploader = info.get('uploader', '未知')
+        
+        # 获取最佳视频格式信息
+        formats = info.get('formats', [])
+        best_video = None
+        for fmt in formats:
+            if fmt.get('vcodec') != 'none' and fmt.get('height'):
+                if not best_video or fmt.get('height', 0) > best_video.get('height', 0):
+                    best_video = fmt
+        
+        width = best_video.get('width', '未知') if best_video else '未知'
+        height = best_video.get('height', '未知') if best_video else '未知'
+        
+        # 将duration转换为整数进行格式化
+        duration_int = int(duration) if isinstance(duration, (int, float)) else 0
+        minutes = duration_int // 60
+        seconds = duration_int % 60
+        
+        info_text = f"标题: {title}\n"
+        info_text += f"时长: {minutes}:{seconds:02d}\n"
+        info_text += f"UP主: {uploader}\n"
+        info_text += f"分辨率: {width}x{height}"
+        
+        self.info_text.insert(1.0, info_text)
+        
+        # 自动设置结束时间
+        if duration and duration > 0:
+            # 设置为视频长度和10秒中的较小值
+            end_time = min(int(duration), 10)
+            self.end_time_var.set(str(end_time))
+        
+        # 根据视频分辨率推荐GIF分辨率
+        if best_video and best_video.get('width') and best_video.get('height'):
+            self._suggest_gif_resolution(best_video.get('width'), best_video.get('height'))
+            self._start_size_calibration(best_video.get('width'), best_video.get('height'), duration)
+        else:
+            # 如果没有找到视频信息，显示默认提示
+            self.recommend_text.config(state=tk.NORMAL)
+            self.recommend_text.delete(1.0, tk.END)
+            self.recommend_text.insert(1.0, "无法获取视频分辨率信息，请手动选择GIF分辨率")
+            self.recommend_text.config(state=tk.DISABLED)
+    
+    def _start_size_calibration(self, video_width, video_height, duration):
+        """后台试编码采样帧校准大小估算（每个视频一次），完成后刷新推荐和预估"""
+        source = self.local_file_path if self.is_local_file else self.url_var.get().strip()
+        remove_black_borders = self.auto_crop_var.get()
+        remove_watermark = self.remove_watermark_var.get()
+        key = GifSizeEstimator.cache_key(source, remove_black_borders, remove_watermark)
+        self.size_estimate_key = key
+        self.size_coefficients = self.size_estimator.get(key)
+        if self.size_coefficients or not source or not duration:
+            return
+        
+        # 在选择的时间段内采样，时间段无效时使用整个视频
+        try:
+            start_time = max(0.0, float(self.start_time_var.get()))
+            end_time = min(float(duration), float(self.end_time_var.get()))
+        except (ValueError, AttributeError):
+            start_time, end_time = 0.0, float(duration)
+        if end_time <= start_time:
+            start_time, end_time = 0.0, float(duration)
+        
+        threading.Thread(
+            target=self._size_calibration_thread,
+            args=(key, source, self.is_local_file, video_width, video_height, start_time, end_time,
+                  remove_black_borders, remove_watermark),
+            daemon=True
+        ).start()
+    
+    def _size_calibration_thread(self, key, source, is_local_file, video_width, video_height, start_time, end_time,
+                                 remove_black_borders, remove_watermark):
+        """大小估算校准线程 - 在线视频只使用缓存或分段下载选择的时间段（进入视频缓存，转换时可直接使用），
+        两者都不可用时不为校准下载完整视频"""
+        temp_video = None
+        try:
+            if is_local_file:
+                input_file, time_offset = source, 0.0
+            else:
+                temp_video, time_offset = self.downloader.download(source, start_time, end_time, allow_full=False)
+                input_file = str(temp_video)
+            coefficients = self.size_estimator.calibrate(
+                key, input_file, start_time - time_offset, end_time - time_offset, video_width, video_height,
+                remove_black_borders, remove_watermark
+            )
+            self.root.after(0, self._size_calibration_done, key, coefficients, video_width, video_height)
+        except Exception as e:
+            print(f"大小估算校准失败，继续使用固定系数模型: {e}")
+        finally:
+            if temp_video:
+                self.downloader.release(temp_video)
+    
+    def _size_calibration_done(self, key, coefficients, video_width, video_height):
+        """校准完成：刷新推荐列表中的预估大小（不改变已选择的分辨率）"""
+        if key != self.size_estimate_key:
+            return
+        self.size_coefficients = coefficients
+        self._suggest_gif_resolution(video_width, video_height, auto_select=False)
+    
+    def _suggest_gif_resolution(self, video_width, video_height, auto_select=True):
+        """根据视频分辨率智能推荐GIF分辨率 - 限制最大边500px，文件大小4MB"""
+        if video_width == 0 or video_height == 0:
+            return
+        
+        aspect_ratio = video_width / video_height
+        
+        # 获取当前时长设置用于文件大小计算
+        try:
+            duration = float(self.end_time_var.get()) - float(self.start_time_var.get())
+            fps = int(self.fps_var.get())
+        except (ValueError, AttributeError):
+            duration = 10  # 默认值
+            fps = 20  # 提高默认帧率
+        
+        if duration <= 0:
+            duration = 10
+        
+        # 生成智能推荐选项
+        recommendations = []
+        
+        # 1. 计算最大边为500的分辨率（最高质量选项）
+        if video_width >= video_height:  # 横屏视频
+            max_width = min(500, video_width)
+            max_height = int(max_width / aspect_ratio)
+        else:  # 竖屏视频
+            max_height = min(500, video_height)
+            max_width = int(max_height * aspect_ratio)
+        
+        # 确保尺寸为偶数
+        max_width = max_width if max_width % 2 == 0 else max_width - 1
+        max_height = max_height if max_height % 2 == 0 else max_height - 1
+        
+        # 2. 生成不同质量级别的推荐
+        quality_levels = [
+            {"name": "最佳质量", "scale": 1.0, "colors": 256, "quality_desc": "高"},
+            {"name": "推荐", "scale": 0.8, "colors": 192, "quality_desc": "中"},
+            {"name": "标准", "scale": 0.65, "colors": 128, "quality_desc": "中"},
+            {"name": "小文件", "scale": 0.5, "colors": 96, "quality_desc": "低"}
+        ]
+        
+        for level in quality_levels:
+            # 计算该级别的分辨率
+            width = int(max_width * level["scale"])
+            height = int(max_height * level["scale"])
+            
+            # 确保尺寸为偶数且不小于最小值
+            width = max(width if width % 2 == 0 else width - 1, 160)
+            height = max(height if height % 2 == 0 else height - 1, 90)
+            
+            # 预估文件大小
+            estimated_size_mb = self._estimate_gif_size(width, height, duration, fps, level["colors"])
+            
+            # 计算相对于原视频的压缩比
+            compression = (width * height) / (video_width * video_height)
+            
+            recommendations.append({
+                'width': width,
+                'height': height,
+                'name': level["name"],
+                'desc': f'{width}x{height}',
+                'size_mb': estimated_size_mb,
+                'compression': compression,
+                'colors': level["colors"],
+                'quality': level["quality_desc"],
+                'is_recommended': level["name"] == "推荐"
+            })
+        
+        # 3. 去重并排序（按分辨率大小排序，最大的在前面）
+        seen = set()
+        unique_recommendations = []
+        for rec in recommendations:
+            key = (rec['width'], rec['height'])
+            if key not in seen:
+                seen.add(key)
+                unique_recommendations.append(rec)
+        
+        # 按分辨率大小排序（从大到小）
+        unique_recommendations.sort(key=lambda x: x['width'] * x['height'], reverse=True)
+        
+        # 更新UI
+        self._update_recommendations_ui(unique_recommendations, video_width, video_height, duration)
+        
+        # 自动选择推荐的分辨率
+        if unique_recommendations and auto_select:
+            # 优先选择标记为推荐的，否则选择第一个
+            best_rec = None
+            for rec in unique_recommendations:
+                if rec.get('is_recommended'):
+                    best_rec = rec
+                    break
+            
+            if not best_rec:
+                best_rec = unique_recommendations[0]
+            
+            self.resolution_var.set(f"{best_rec['width']}x{best_rec['height']}")
+            self.custom_width_var.set(str(best_rec['width']))
+            self.custom_height_var.set(str(best_rec['height']))
+            
+            # 根据推荐自动设置质量
+            if best_rec['colors'] >= 200:
+                self.quality_var.set("高")
+            elif best_rec['colors'] >= 128:
+                self.quality_var.set("中")
+            else:
+                self.quality_var.set("低")
+        
+        # 更新压缩信息
+        self.update_compression_info()
+        self.update_size_estimate()
+    
+    def _estimate_gif_size(self, width, height, duration, fps, colors):
+        """预估GIF文件大小（MB）"""
+        # 已用采样帧校准时使用校准系数
+        if self.size_coefficients:
+            return GifSizeEstimator.estimate(
+                self.size_coefficients, width, height, duration, fps, colors, self.delta_encoding_var.get()
+            ) / (1024 * 1024)
+        
+        # GIF文件大小预估算法
+        # 基于：分辨率 × 时长 × 帧率 × 颜色数量
+        
+        total_frames = duration * fps
+        pixels_per_frame = width * height
+        
+        # 颜色数量影响系数
+        color_factor = colors / 256
+        
+        # 基础字节数每像素（经验值）
+        base_bytes_per_pixel = 0.8
+        
+        # GIF压缩效率（相邻帧的相似性）
+        compression_efficiency = 0.4  # GIF压缩通常能减少60%的重复数据
+        
+        # 计算估算大小
+        estimated_bytes = (pixels_per_frame * total_frames * base_bytes_per_pixel * 
+                          color_factor * compression_efficiency)
+        
+        # 添加文件头和调色板开销
+        overhead_bytes = 1024 + (colors * 3)  # 文件头 + 调色板
+        
+        total_bytes = estimated_bytes + overhead_bytes
+        
+        # 转换为MB
+        size_mb = total_bytes / (1024 * 1024)
+        
+        return size_mb
+    
+    def _update_recommendations_ui(self, recommendations, orig_width, orig_height, duration=10):
+        """更新推荐UI"""
+        # 清除旧的推荐按钮
+        for btn in self.recommend_buttons:
+            btn.destroy()
+        self.recommend_buttons.clear()
+        
+        # 更新推荐文本
+        self.recommend_text.config(state=tk.NORMAL)
+        self.recommend_text.delete(1.0, tk.END)
+        
+        max_edge = max(orig_width, orig_height)
+        info_text = f"视频分辨率: {orig_width}x{orig_height} (最大边: {max_edge}px)\n"
+        info_text += f"时长: {duration:.1f}秒 | 建议: 最大边≤500px, 文件≤4MB\n"
+        
+        if recommendations:
+            info_text += f"为您推荐 {len(recommendations)} 个优化GIF配置:"
+        else:
+            info_text += "无法生成推荐配置，请手动调整参数"
+        
+        self.recommend_text.insert(1.0, info_text)
+        self.recommend_text.config(state=tk.DISABLED)
+        
+        # 创建推荐按钮
+        if not recommendations:
+            return
+            
+        btn_frame = ttk.Frame(self.recommend_frame)
+        btn_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        # 计算按钮列数（最多4列）
+        num_buttons = min(len(recommendations), 4)
+        for i in range(num_buttons):
+            btn_frame.columnconfigure(i, weight=1)
+        
+        for i, rec in enumerate(recommendations[:4]):  # 最多显示4个推荐
+            # 构建按钮文本
+            compression_percent = rec['compression'] * 100
+            max_edge = max(rec['width'], rec['height'])
+            
+            btn_text = f"{rec['name']}\n"
+            btn_text += f"{rec['desc']}\n"
+            btn_text += f"≈{rec['size_mb']:.1f}MB"
+            
+            # 如果是推荐选项，添加标识
+            if rec.get('is_recommended'):
+                btn_text = f"⭐ {btn_text}"
+            
+            btn = ttk.Button(
+                btn_frame, 
+                text=btn_text,
+                command=lambda r=rec: self._apply_recommendation(r),
+                width=15
+            )
+            btn.grid(row=0, column=i, padx=(0, 5) if i < 3 else (0, 0), sticky=(tk.W, tk.E))
+            self.recommend_buttons.append(btn)
+        
+        # 如果有更多推荐，显示提示
+        if len(recommendations) > 4:
+            info_label = ttk.Label(
+                btn_frame, 
+                text=f"(还有{len(recommendations)-4}个选项可在自定义中设置)",
+                font=('TkDefaultFont', 8),
+                foreground='gray'
+            )
+            info_label.grid(row=1, column=0, columnspan=4, pady=(5, 0))
+    
+    def _apply_recommendation(self, recommendation):
+        """应用推荐的分辨率"""
+        width = recommendation['width']
+        height = recommendation['height']
+        
+        # 更新下拉框选项，如果不存在则添加
+        current_values = list(self.resolution_combo['values'])
+        new_resolution = f"{width}x{height}"
+        
+        if new_resolution not in current_values[:-1]:  # 排除"自定义"选项
+            current_values.insert(-1, new_resolution)  # 在"自定义"前插入
+            self.resolution_combo['values'] = current_values
+        
+        # 设置选中的分辨率
+        self.resolution_var.set(new_resolution)
+        self.custom_width_var.set(str(width))
+        self.custom_height_var.set(str(height))
+        
+        # 根据推荐自动设置质量
+        if 'quality' in recommendation and recommendation['quality'] in ['高', '中', '低']:
+            self.quality_var.set(recommendation['quality'])
+        elif 'colors' in recommendation:
+            if recommendation['colors'] >= 200:
+                self.quality_var.set("高")
+            elif recommendation['colors'] >= 128:
+                self.quality_var.set("中")
+            else:
+                self.quality_var.set("低")
+        
+        # 隐藏自定义框架
+        self.custom_frame.pack_forget()
+        
+        # 更新相关信息
+        self.update_compression_info()
+        self.update_size_estimate()
+        
+        # 视觉反馈 - 临时高亮选中的按钮
+        for btn in self.recommend_buttons:
+            btn.config(state=tk.NORMAL)
+        
+        # 临时禁用选中的按钮表示已选择
+        for btn in self.recommend_buttons:
+            if f"{width}x{height}" in btn.cget('text'):
+                original_text = btn.cget('text')
+                btn.config(text=f"✓ 已选择\n{width}x{height}", state=tk.DISABLED)
+                # 2秒后恢复原始文本
+                self.root.after(2000, lambda b=btn, t=original_text: (
+                    b.config(text=t, state=tk.NORMAL)
+                ))
+                break
+    
+    def _stop_progress(self):
+        """停止进度条"""
+        self.progress_bar.stop()
+        self.progress_var.set("就绪")
+    
+    def _validate_conversion_params(self, width, height, fps, duration, estimated_size_mb):
+        """验证转换参数是否合理 - 修改为只警告不拒绝"""
+        warnings = []
+        errors = []
+        
+        # 检查基础参数
+        if width <= 0 or height <= 0:
+            errors.append("分辨率必须大于0")
+        
+        if fps <= 0 or fps > 60:
+            errors.append("帧率必须在1-60之间")
+        
+        if duration <= 0:
+            errors.append("时长必须大于0")
+        
+        # 修改分辨率和文件大小检查 - 只警告不拒绝
+        max_edge = max(width, height)
+        if max_edge > 800:
+            warnings.append(f"分辨率很大({max_edge}px)，转换可能较慢，建议使用推荐设置")
+        elif max_edge > 500:
+            warnings.append(f"分辨率较大({max_edge}px)，转换可能较慢")
+        
+        # 检查文件大小 - 只警告不拒绝
+        if estimated_size_mb > 10:
+            warnings.append(f"预估文件很大({estimated_size_mb:.1f}MB)，转换可能较慢且占用较多空间")
+        elif estimated_size_mb > 4:
+            warnings.append(f"预估文件较大({estimated_size_mb:.1f}MB)，转换可能较慢")
+        
+        # 检查帧数
+        total_frames = duration * fps
+        if total_frames > 500:
+            warnings.append(f"总帧数较多({int(total_frames)}帧)，转换可能较慢")
+        
+        return warnings, errors
+    
+    def _read_gif_params(self):
+        """读取时间段、帧率和分辨率，输入无效时提示并返回None"""
+        try:
+            start_time = float(self.start_time_var.get())
+            end_time = float(self.end_time_var.get())
+            fps = int(self.fps_var.get())
+            
+            if start_time >= end_time:
+                messagebox.showerror("错误", "开始时间必须小于结束时间")
+                return None
+            
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的数字")
+            return None
+        
+        # 获取分辨率
+        if self.resolution_var.get() == "自定义":
+            try:
+                width = int(self.custom_width_var.get())
+                height = int(self.custom_height_var.get())
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的自定义分辨率")
+                return None
+        else:
+            width, height = map(int, self.resolution_var.get().split('x'))
+        
+        return start_time, end_time, fps, width, height
+    
+    def start_preview(self):
+        """生成预览：先快速显示低清预览，再在后台按完整参数细化"""
+        if not self.video_info:
+            messagebox.showerror("错误", "请先获取视频信息")
+            return
+        
+        gif_params = self._read_gif_params()
+        if not gif_params:
+            return
+        start_time, end_time, fps, width, height = gif_params
+        
+        params = {
+            'source': self.local_file_path if self.is_local_file else self.url_var.get(),
+            'is_local_file': self.is_local_file,
+            'start_time': start_time,
+            'end_time': end_time,
+            'width': width,
+            'height': height,
+            'fps': fps,
+            'quality': self.quality_var.get(),
+            'remove_black_borders': self.auto_crop_var.get(),
+            'remove_watermark': self.remove_watermark_var.get(),
+            'delta_encoding': self.delta_encoding_var.get()
+        }
+        self.previewer.cancel()
+        self.progress_var.set("生成预览中...")
+        threading.Thread(target=self._preview_thread, args=(params,), daemon=True).start()
+    
+    def _preview_thread(self, params):
+        """预览线程 - 在线视频下载所选时间段（进入视频缓存，正式转换时直接使用）"""
+        temp_video = None
+        try:
+            if params['is_local_file']:
+                input_file, time_offset = params['source'], 0.0
+            else:
+                temp_video, time_offset = self.downloader.download(
+                    params['source'], params['start_time'], params['end_time']
+                )
+                input_file = temp_video
+            
+            self.previewer.render(
+                str(input_file),
+                params['start_time'] - time_offset,
+                params['end_time'] - time_offset,
+                params['width'],
+                params['height'],
+                params['fps'],
+                params['quality'],
+                params['remove_black_borders'],
+                params['remove_watermark'],
+                params['delta_encoding'],
+                stage_callback=lambda stage, path, elapsed: self.root.after(
+                    0, self._show_preview, stage, path, elapsed
+                )
+            )
+        except Exception as e:
+            if str(e) != "转换被取消":
+                error_msg = str(e)
+                print(f"预览失败: {error_msg}")
+                self.root.after(0, lambda msg=error_msg: self.progress_var.set(f"预览失败: {msg}"))
+        finally:
+            if temp_video:
+                self.downloader.release(temp_video)
+    
+    def _on_dedup_change(self, *args):
+        """切换合并重复帧"""
+        self.frame_processor.dedup_threshold = OptimizedFrameProcessor.DEDUP_THRESHOLD if self.dedup_var.get() else 0
+        self._invalidate_preview()
+    
+    def _on_sampling_change(self, *args):
+        """切换运动自适应帧率"""
+        self.frame_processor.sampling = 'adaptive' if self.adaptive_fps_var.get() else 'fixed'
+        self._invalidate_preview()
+    
+    def _invalidate_preview(self, *args):
+        """参数改变时取消正在生成的预览"""
+        if hasattr(self, 'previewer'):
+            self.previewer.cancel()
+    
+    def _show_preview(self, stage, path, elapsed):
+        """在预览窗口中循环播放预览GIF"""
+        from PIL import Image, ImageSequence, ImageTk
+        
+        if not self.preview_window or not self.preview_window.winfo_exists():
+            self.preview_window = tk.Toplevel(self.root)
+            self.preview_window.title("预览")
+            self.preview_label = ttk.Label(self.preview_window)
+            self.preview_label.pack(padx=10, pady=10)
+            self.preview_status = ttk.Label(self.preview_window, foreground='gray')
+            self.preview_status.pack(pady=(0, 10))
+        
+        # 帧数较多时抽帧显示，限制预览窗口占用的内存
+        with Image.open(path) as gif:
+            step = max(1, -(-gif.n_frames // self.PREVIEW_DISPLAY_FRAMES))
+            frames = []
+            for index, frame in enumerate(ImageSequence.Iterator(gif)):
+                if index % step == 0:
+                    duration = frame.info.get('duration', 100) * step
+                    frames.append((ImageTk.PhotoImage(frame.convert('RGB')), duration))
+        
+        self.preview_frames = frames
+        self.preview_index = 0
+        stage_text = "低清预览" if stage == 'quick' else "完整预览（参数不变时开始转换将直接使用）"
+        size_kb = Path(path).stat().st_size / 1024
+        self.preview_status.config(text=f"{stage_text} - {elapsed:.2f}秒, {size_kb:.0f}KB")
+        self.progress_var.set("预览完成" if stage == 'full' else "低清预览完成，细化中...")
+        
+        if self.preview_job is None:
+            self._animate_preview()
+    
+    def _animate_preview(self):
+        """逐帧播放预览"""
+        self.preview_job = None
+        if not self.preview_frames or not self.preview_window or not self.preview_window.winfo_exists():
+            return
+        image, duration = self.preview_frames[self.preview_index % len(self.preview_frames)]
+        self.preview_label.config(image=image)
+        self.preview_index += 1
+        self.preview_job = self.root.after(max(20, duration), self._animate_preview)
+    
+    def start_conversion(self):
+        """开始转换"""
+        if self.is_converting:
+            return
+        
+        # 验证输入
+        if not self.video_info:
+            messagebox.showerror("错误", "请先获取视频信息")
+            return
+        
+        gif_params = self._read_gif_params()
+        if not gif_params:
+            return
+        start_time, end_time, fps, width, height = gif_params
+        duration = end_time - start_time
+        
+        # 目标大小模式
+        target_size = None
+        if self.target_size_enabled_var.get():
+            try:
+                target_size_mb = float(self.target_size_var.get())
+                if target_size_mb <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的目标大小")
+                return
+            target_size = int(target_size_mb * 1024 * 1024)
+        
+        # 预估文件大小用于参数验证
+        quality_colors = {"高": 256, "中": 128, "低": 64}.get(self.quality_var.get(), 128)
+        estimated_size_mb = self._estimate_gif_size(width, height, duration, fps, quality_colors)
+        if target_size:
+            # 目标大小模式下输出不会超过目标大小
+            estimated_size_mb = min(estimated_size_mb, target_size_mb)
+        
+        # 验证转换参数
+        warnings, errors = self._validate_conversion_params(width, height, fps, duration, estimated_size_mb)
+        
+        if errors:
+            messagebox.showerror("参数错误", "\n".join(errors))
+            return
+        
+        if warnings:
+            warning_msg = "\n".join(warnings) + "\n\n是否继续转换？"
+            if not messagebox.askyesno("参数提示", warning_msg):
+                return
+        
+        # 检查输出路径
+        output_path = Path(self.output_path_var.get())
+        if not output_path.exists():
+            try:
+                output_path.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                messagebox.showerror("错误", f"无法创建输出目录: {str(e)}")
+                return
+        
+        # 开始转换
+        self.is_converting = True
+        self.convert_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.NORMAL)
+        self.progress_bar.start()
+        
+        # 转换参数
+        conversion_params = {
+            'source': self.local_file_path if self.is_local_file else self.url_var.get(),
+            'is_local_file': self.is_local_file,
+            'start_time': start_time,
+            'end_time': end_time,
+            'width': width,
+            'height': height,
+            'fps': fps,
+            'quality': self.quality_var.get(),
+            'output_path': output_path,
+            'remove_black_borders': self.auto_crop_var.get(),
+            'remove_watermark': self.remove_watermark_var.get(),
+            'delta_encoding': self.delta_encoding_var.get(),
+            'encoder': 'ffmpeg' if self.ffmpeg_encoder_var.get() else 'pil',
+            'target_size': target_size
+        }
+        
+        # 启动转换线程
+        self.conversion_thread = threading.Thread(
+            target=self._conversion_thread, 
+            args=(conversion_params,), 
+            daemon=True
+        )
+        self.conversion_thread.start()
+    
+    def stop_conversion(self):
+        """停止转换"""
+        self.is_converting = False
+        self.progress_var.set("正在停止...")
+    
+    def _conversion_thread(self, params):
+        """转换线程 - 使用优化的转换方法"""
+        temp_video = None
+        try:
+            if params['is_local_file']:
+                # 处理本地文件
+                self.root.after(0, lambda: self.progress_var.set("处理本地视频中..."))
+                temp_video = params['source']
+                time_offset = 0.0
+            else:
+                # 处理在线链接 - 只下载所需时间段，不支持时下载完整视频
+                self.root.after(0, lambda: self.progress_var.set("下载视频中..."))
+                temp_video, time_offset = self.downloader.download(
+                    params['source'], params['start_time'], params['end_time']
+                )
+            
+            if not self.is_converting:
+                return
+            
+            self.root.after(0, lambda: self.progress_var.set("转换为GIF中..."))
+            
+            # 生成输出文件名
+            output_file = GifConversionPipeline.output_filename(
+                params['output_path'], self.video_info.get('title', 'video')
+            )
+            
+            # 使用优化的转换方法
+            self._convert_with_super_optimized_method(
+                str(temp_video),
+                str(output_file),
+                # 分段下载的文件从time_offset开始，换算为文件内时间
+                params['start_time'] - time_offset,
+                params['end_time'] - time_offset,
+                params['width'],
+                params['height'],
+                params['fps'],
+                params['quality'],
+                params['remove_black_borders'],
+                params['remove_watermark'],
+                params['delta_encoding'],
+                params['encoder'],
+                params['target_size']
+            )
+            
+            if self.is_converting:
+                self.root.after(0, lambda: self._conversion_complete(output_file))
+            
+        except Exception as e:
+            error_msg = str(e)
+            self.logger.error(f"转换失败: {error_msg}")
+            self.root.after(0, lambda msg=error_msg: self._conversion_error(msg))
+        finally:
+            # 清理临时文件（只清理下载的文件，不清理本地文件和缓存）；取消或失败时同样解除缓存的使用保护
+            if not params['is_local_file'] and temp_video:
+                self.downloader.release(temp_video)
+            self.root.after(0, self._conversion_finished)
+    
+    def _convert_with_super_optimized_method(self, input_file, output_file, start_time, end_time, width, height, fps, quality, remove_black_borders, remove_watermark, delta_encoding=False, encoder='pil', target_size=None):
+        """进行转换；指定target_size（字节）时使用目标大小模式"""
+        # 进度回调函数
+        def progress_callback(msg):
+            if self.is_converting:  # 只有在转换状态才更新进度
+                self.root.after(0, lambda m=msg: self.progress_var.set(m))
+        
+        # 参数与完整预览一致时直接使用预览结果
+        if not target_size and encoder == 'pil':
+            preview_file = self.previewer.take_result(self.previewer.params_key(
+                input_file, start_time, end_time, width, height, fps, quality,
+                remove_black_borders, remove_watermark, delta_encoding
+            ))
+            if preview_file:
+                print(f"使用完整预览结果: {preview_file.name}")
+                shutil.copyfile(preview_file, output_file)
+                return
+        
+        if target_size:
+            self.pipeline.convert_to_size(
+                input_file, output_file, start_time, end_time, width, height, fps, quality, target_size,
+                remove_black_borders, remove_watermark, delta_encoding,
+                progress_callback=progress_callback,
+                cancel_check=lambda: self.is_converting,
+                encoder=encoder
+            )
+            return
+        
+        self.pipeline.convert(
+            input_file, output_file, start_time, end_time, width, height, fps, quality,
+            remove_black_borders, remove_watermark, delta_encoding,
+            progress_callback=progress_callback,
+            cancel_check=lambda: self.is_converting,
+            encoder=encoder
+        )
+    
+    def _conversion_complete(self, output_file):
+        """转换完成"""
+        self.progress_var.set("转换完成")
+        messagebox.showinfo("完成", f"GIF已保存到: {output_file}")
+        
+        # 询问是否打开文件夹
+        if messagebox.askyesno("打开文件夹", "是否打开输出文件夹？"):
+            try:
+                if os.name == 'nt':  # Windows
+                    os.startfile(output_file.parent)
+                elif os.name == 'posix':  # macOS和Linux
+                    subprocess.run(['open' if sys.platform == 'darwin' else 'xdg-open', output_file.parent])
+            except Exception as e:
+                print(f"无法打开文件夹: {e}")
+    
+    def _conversion_error(self, error_msg):
+        """转换错误"""
+        self.progress_var.set("转换失败")
+        messagebox.showerror("错误", f"转换失败: {error_msg}")
+    
+    def _conversion_finished(self):
+        """转换结束清理"""
+        self.is_converting = False
+        self.convert_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
+        self.progress_bar.stop()
+        if not self.progress_var.get().startswith("转换"):
+            self.progress_var.set("就绪")
+
+def run_cli(argv):
+    """命令行模式 - 不加载tkinter，进度输出到stderr，返回退出码"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog=Path(sys.argv[0]).name,
+        description="Bilibili视频转GIF - 命令行模式"
+    )
+    parser.add_argument('--cli', action='store_true', help="使用命令行模式（不启动图形界面）")
+    parser.add_argument('source', nargs='?', help="Bilibili视频链接或本地视频文件")
+    parser.add_argument('-o', '--output', help="输出GIF文件或目录（默认: output目录）")
+    parser.add_argument('-s', '--start', type=float, default=0.0, help="开始时间(秒)，默认0")
+    parser.add_argument('-e', '--end', type=float, default=10.0, help="结束时间(秒)，默认10")
+    parser.add_argument('--size', default="640x360", help="输出分辨率，例如 480x270，默认640x360")
+    parser.add_argument('--fps', type=int, default=20, help="帧率，默认20")
+    parser.add_argument('--quality', default="中", choices=["高", "中", "低", "high", "medium", "low"],
+                        help="质量，默认中")
+    parser.add_argument('--no-black-borders', dest='remove_black_borders', action='store_false',
+                        help="不移除黑边")
+    parser.add_argument('--no-watermark', dest='remove_watermark', action='store_false',
+                        help="不移除水印")
+    parser.add_argument('--no-delta', dest='delta_encoding', action='store_false',
+                        help="不使用帧间差分压缩")
+    parser.add_argument('--engine', default='thread', choices=OptimizedFrameProcessor.ENGINES,
+                        help="帧处理引擎，默认thread")
+    parser.add_argument('--palette', default='local', choices=OptimizedFrameProcessor.PALETTE_MODES,
+                        help="调色板模式，默认local")
+    parser.add_argument('--workers', type=int, help="帧处理工作线程/进程数")
+    parser.add_argument('--seek', default='auto', choices=FrameSeeker.STRATEGIES, help="跳帧策略，默认auto")
+    parser.add_argument('--decoder', default='auto', choices=OptimizedFrameProcessor.DECODERS,
+                        help="解码器，默认auto（有ffmpeg时使用ffmpeg）")
+    parser.add_argument('--encoder', default='pil', choices=GifConversionPipeline.ENCODERS,
+                        help="GIF编码引擎，默认pil；ffmpeg在一个滤镜图中完成调色板生成与编码")
+    parser.add_argument('--dither', default='sierra2_4a', choices=FFmpegGifEncoder.DITHER_MODES,
+                        help="ffmpeg编码引擎的抖动方式，默认sierra2_4a")
+    parser.add_argument('--quantize-dither', default='none', choices=OptimizedFrameProcessor.DITHER_MODES,
+                        help="pil编码引擎量化时的抖动方式，默认none；ordered有序抖动只在--palette global时"
+                             "配合帧间差分文件更小（逐帧调色板下反而比error_diffusion大）")
+    parser.add_argument('--dedup', type=float, nargs='?', const=OptimizedFrameProcessor.DEDUP_THRESHOLD, default=0,
+                        metavar='THRESHOLD',
+                        help=f"合并近似重复帧（时长并入前一帧），可指定阈值，默认{OptimizedFrameProcessor.DEDUP_THRESHOLD}")
+    parser.add_argument('--adaptive-fps', action='store_true',
+                        help="运动自适应帧率：总帧数不变，按画面运动量分配取帧时刻（仅pil编码引擎）")
+    parser.add_argument('--memory-budget', type=float, default=MemoryBudget.DEFAULT_BUDGET_MB, metavar='MB',
+                        help=f"帧数据内存预算（MB），超出时收紧流水线窗口、全局调色板帧转存到临时目录，"
+                             f"0为不限制，默认{MemoryBudget.DEFAULT_BUDGET_MB}")
+    parser.add_argument('--target-size', type=float, metavar='MB',
+                        help="目标文件大小（MB），先用采样帧试编码自动选择分辨率、颜色数和帧率")
+    parser.add_argument('--batch', help="批量任务文件（JSON或CSV），命令行中的参数作为任务的默认值")
+    parser.add_argument('--download-workers', type=int, default=2, help="批量模式下载并发数，默认2")
+    parser.add_argument('--decode-workers', type=int, default=1, help="批量模式解码并发数，默认1")
+    parser.add_argument('--encode-workers', type=int, default=1, help="批量模式编码并发数，默认1")
+    parser.add_argument('--report', help="批量模式任务状态报告输出文件（JSON）")
+    parser.add_argument('--serve', action='store_true', help="启动本地HTTP转换服务")
+    parser.add_argument('--host', default='127.0.0.1', help="服务监听地址，默认127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765, help="服务端口，默认8765")
+    args = parser.parse_args(argv)
+    if not args.source and not args.batch and not args.serve:
+        parser.error("需要视频链接/文件、--batch任务文件或--serve")
+    
+    # 参数验证（参数错误时argparse以退出码2退出）
+    match = re.fullmatch(r'(\d+)[xX*](\d+)', args.size)
+    if not match:
+        parser.error(f"无效的分辨率: {args.size}")
+    width, height = int(match.group(1)), int(match.group(2))
+    if width <= 0 or height <= 0:
+        parser.error("分辨率必须大于0")
+    if args.target_size is not None and args.target_size <= 0:
+        parser.error("目标文件大小必须大于0")
+    if args.fps <= 0 or args.fps > 60:
+        parser.error("帧率必须在1-60之间")
+    if args.start < 0 or args.start >= args.end:
+        parser.error("开始时间必须小于结束时间")
+    quality = {"high": "高", "medium": "中", "low": "低"}.get(args.quality, args.quality)
+    
+    def progress_callback(msg):
+        print(msg, file=sys.stderr, flush=True)
+    
+    base_dir = Path(__file__).parent
+    temp_dir = base_dir / "temp"
+    temp_dir.mkdir(exist_ok=True)
+    
+    if args.batch:
+        return _run_cli_batch(args, base_dir, temp_dir, width, height, quality)
+    if args.serve:
+        return _run_cli_server(args, temp_dir, width, height, quality)
+    
+    # 转换日志写到stderr，成功后在stdout输出生成的GIF路径，便于脚本调用
+    temp_video = None
+    downloader = None
+    try:
+        with redirect_stdout(sys.stderr):
+            is_local_file = Path(args.source).is_file()
+            if is_local_file:
+                temp_video = Path(args.source)
+                time_offset = 0.0
+                title = temp_video.stem
+            else:
+                if not re.match(r'https?://', args.source):
+                    raise Exception(f"文件不存在或链接无效: {args.source}")
+                downloader = VideoDownloader(
+                    temp_dir,
+                    cache=VideoCache(temp_dir / "video_cache"),
+                    info_cache=VideoInfoCache(temp_dir / "info_cache")
+                )
+                progress_callback("下载视频中...")
+                temp_video, time_offset = downloader.download(args.source, args.start, args.end)
+                try:
+                    title = downloader.extract_info(args.source).get('title', 'video')
+                except Exception:
+                    title = 'video'
+            
+            if args.output and Path(args.output).suffix.lower() == '.gif':
+                output_file = Path(args.output)
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+            else:
+                output_dir = Path(args.output) if args.output else base_dir / "output"
+                output_dir.mkdir(parents=True, exist_ok=True)
+                output_file = GifConversionPipeline.output_filename(output_dir, title)
+            
+            progress_callback("转换为GIF中...")
+            pipeline = GifConversionPipeline(OptimizedFrameProcessor(
+                max_workers=args.workers, engine=args.engine, palette_mode=args.palette,
+                seek_strategy=args.seek, decoder=args.decoder, dither=args.quantize_dither,
+                dedup_threshold=args.dedup, sampling='adaptive' if args.adaptive_fps else 'fixed',
+                memory_budget=int(args.memory_budget * 1024 ** 2), spill_dir=temp_dir
+            ), encoder=args.encoder, dither=args.dither, stats_file=base_dir / "logs" / "encoder_stats.jsonl")
+            if args.target_size:
+                pipeline.convert_to_size(
+                    str(temp_video), str(output_file),
+                    args.start - time_offset, args.end - time_offset,
+                    width, height, args.fps, quality, int(args.target_size * 1024 * 1024),
+                    args.remove_black_borders, args.remove_watermark, args.delta_encoding,
+                    progress_callback=progress_callback
+                )
+            else:
+                pipeline.convert(
+                    str(temp_video), str(output_file),
+                    args.start - time_offset, args.end - time_offset,
+                    width, height, args.fps, quality,
+                    args.remove_black_borders, args.remove_watermark, args.delta_encoding,
+                    progress_callback=progress_callback
+                )
+        
+        print(output_file)
+        return 0
+    except KeyboardInterrupt:
+        print("转换被中断", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"转换失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if downloader and temp_video:
+            downloader.release(temp_video)
+
+def _run_cli_batch(args, base_dir, temp_dir, width, height, quality):
+    """命令行批量模式，全部任务成功时返回0"""
+    def status_callback(job):
+        print(f"[任务{job['id']}] {job['status']} {job['source']}"
+              + (f" -> {job['output_file']}" if job['status'] == 'done' else "")
+              + (f" ({job['error']})" if job['error'] else ""), file=sys.stderr, flush=True)
+    
+    defaults = {
+        'start_time': args.start, 'end_time': args.end, 'width': width, 'height': height,
+        'fps': args.fps, 'quality': quality,
+        'remove_black_borders': args.remove_black_borders,
+        'remove_watermark': args.remove_watermark,
+        'delta_encoding': args.delta_encoding,
+        'encoder': args.encoder, 'target_size': args.target_size
+    }
+    try:
+        with redirect_stdout(sys.stderr):
+            jobs = BatchScheduler.load_jobs(args.batch, defaults)
+            downloader = VideoDownloader(
+                temp_dir,
+                cache=VideoCache(temp_dir / "video_cache"),
+                info_cache=VideoInfoCache(temp_dir / "info_cache")
+            )
+            scheduler = BatchScheduler(
+                downloader, args.output or base_dir / "output",
+                download_workers=args.download_workers,
+                decode_workers=args.decode_workers,
+                encode_workers=args.encode_workers,
+                frame_processor=OptimizedFrameProcessor(
+                    max_workers=args.workers, engine=args.engine, palette_mode=args.palette,
+                    seek_strategy=args.seek, decoder=args.decoder, dither=args.quantize_dither,
+                    dedup_threshold=args.dedup, sampling='adaptive' if args.adaptive_fps else 'fixed',
+                    memory_budget=int(args.memory_budget * 1024 ** 2), spill_dir=temp_dir
+                ),
+                status_callback=status_callback,
+                dither=args.dither
+            )
+            summary = scheduler.run(jobs)
+    except KeyboardInterrupt:
+        print("批量转换被中断", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"批量转换失败: {e}", file=sys.stderr)
+        return 1
+    
+    print(f"完成 {summary['completed']}/{summary['total']}，失败 {summary['failed']}，"
+          f"耗时 {summary['elapsed']:.1f}秒，吞吐量 {summary['clips_per_minute']:.2f} 片段/分钟", file=sys.stderr)
+    if args.report:
+        Path(args.report).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    for job in summary['jobs']:
+        if job['status'] == 'done':
+            print(job['output_file'])
+    return 0 if summary['failed'] == 0 else 1
+
+def _run_cli_server(args, temp_dir, width, height, quality):
+    """命令行服务模式，运行到被中断为止"""
+    defaults = {
+        'width': width, 'height': height, 'fps': args.fps, 'quality': quality,
+        'remove_black_borders': args.remove_black_borders,
+        'remove_watermark': args.remove_watermark,
+        'delta_encoding': args.delta_encoding,
+        'encoder': args.encoder, 'target_size': args.target_size
+    }
+    try:
+        server = ConversionServer(
+            temp_dir, host=args.host, port=args.port,
+            download_workers=args.download_workers,
+            decode_workers=args.decode_workers,
+            encode_workers=args.encode_workers,
+            frame_processor=OptimizedFrameProcessor(
+                max_workers=args.workers, engine=args.engine, palette_mode=args.palette, persistent=True,
+                seek_strategy=args.seek, decoder=args.decoder, dither=args.quantize_dither,
+                dedup_threshold=args.dedup, sampling='adaptive' if args.adaptive_fps else 'fixed',
+                memory_budget=int(args.memory_budget * 1024 ** 2), spill_dir=temp_dir
+            ),
+            defaults=defaults,
+            dither=args.dither
+        )
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("转换服务已停止", file=sys.stderr)
+        return 0
+    except Exception as e:
+        print(f"转换服务启动失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+def main(argv=None):
+    """主函数，带--cli参数时使用命令行模式"""
+    argv = sys.argv[1:] if argv is None else argv
+    
+    # 设置环境变量解决Windows编码问题
+    if os.name == 'nt':
+        os.environ['PYTHONIOENCODING'] = 'utf-8'
+        try:
+            locale.setlocale(locale.LC_ALL, 'C.UTF-8')
+        except:
+            try:
+                locale.setlocale(locale.LC_ALL, '.UTF8')
+            except:
+                os.environ['LC_ALL'] = 'C.UTF-8'
+    
+    if '--cli' in argv:
+        return run_cli(argv)
+    
+    print("启动 Bilibili视频转GIF工具By:丶樱流")
+    _load_tkinter()
+    
+    # 检查并安装依赖库
+    try:
+        LibraryInstaller.check_and_install_packages()
+    except Exception as e:
+        print(f"库检查过程中出现错误: {e}")
+        print("尝试继续运行...")
+    
+    # 创建GUI
+    root = tk.Tk()
+    app = BilibiliToGifConverter(root)
+    
+    try:
+        root.mainloop()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    # 打包为EXE时进程池引擎需要
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# 黑边检测基准测试：对比逐行逐列循环的旧实现与向量化实现（以及缩小后检测）在1080p和4K下的耗时
+# 用法: python benchmarks/bench_black_borders.py [--repeat 20]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import cv2
+
+from basecode import VideoProcessor
+
+def legacy_detect_black_borders(frame, threshold=30):
+    """旧实现：Python循环逐行逐列计算均值"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    top = 0
+    for i in range(h // 3):
+        if np.mean(gray[i, :]) > threshold:
+            break
+        top = i + 1
+    bottom = 0
+    for i in range(h - 1, h * 2 // 3, -1):
+        if np.mean(gray[i, :]) > threshold:
+            break
+        bottom = h - i
+    left = 0
+    for i in range(w // 3):
+        if np.mean(gray[:, i]) > threshold:
+            break
+        left = i + 1
+    right = 0
+    for i in range(w - 1, w * 2 // 3, -1):
+        if np.mean(gray[:, i]) > threshold:
+            break
+        right = w - i
+    return top, bottom, left, right
+
+def make_frame(rng, width, height):
+    """带随机黑边（含噪声）的测试帧，黑边宽度覆盖0到超过三分之一的情况"""
+    frame = rng.integers(40, 255, (height, width, 3), dtype=np.uint8)
+    top, bottom = rng.integers(0, height // 2, 2)
+    left, right = rng.integers(0, width // 2, 2)
+    noise = lambda shape: rng.integers(0, 45, shape, dtype=np.uint8)
+    frame[:top] = noise(frame[:top].shape)
+    frame[height - bottom:] = noise(frame[height - bottom:].shape)
+    frame[:, :left] = noise(frame[:, :left].shape)
+    frame[:, width - right:] = noise(frame[:, width - right:].shape)
+    return frame
+
+def timed(func, frame, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(frame)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="黑边检测基准测试")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--cases', type=int, default=20, help="一致性检查的随机帧数量")
+    parser.add_argument('--max-side', type=int, default=640, help="缩小检测时的最长边")
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    print(f"{'分辨率':<10}{'旧实现(ms)':>12}{'向量化(ms)':>12}{'加速比':>8}{'缩小(ms)':>10}{'加速比':>8}{'一致':>6}{'缩小误差(px)':>14}")
+    for name, width, height in (("1080p", 1920, 1080), ("4K", 3840, 2160)):
+        frames = [make_frame(rng, width, height) for _ in range(args.cases)]
+        
+        identical = all(
+            legacy_detect_black_borders(frame) == VideoProcessor.detect_black_borders(frame) for frame in frames
+        )
+        max_error = max(
+            max(abs(a - b) for a, b in zip(legacy_detect_black_borders(frame),
+                                           VideoProcessor.detect_black_borders(frame, max_side=args.max_side)))
+            for frame in frames
+        )
+        
+        legacy_ms, _ = timed(legacy_detect_black_borders, frames[0], args.repeat)
+        fast_ms, _ = timed(VideoProcessor.detect_black_borders, frames[0], args.repeat)
+        small_ms, _ = timed(lambda f: VideoProcessor.detect_black_borders(f, max_side=args.max_side),
+                            frames[0], args.repeat)
+        print(f"{name:<10}{legacy_ms:>12.2f}{fast_ms:>12.2f}{legacy_ms / fast_ms:>8.1f}"
+              f"{small_ms:>10.2f}{legacy_ms / small_ms:>8.1f}{'是' if identical else '否':>6}{max_error:>14}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# 抖动方式基准测试：对比none、ordered（Bayer）和error_diffusion（Floyd–Steinberg）的量化耗时与GIF大小，
+# 分别用逐帧调色板（--palette local）和全局调色板（--palette global）量化
+# 用法: python benchmarks/bench_dither_modes.py [video] [--colors 64,128] [--seconds 4]
+# 不指定视频时生成带平滑渐变背景和运动物体的合成视频（渐变处最能体现抖动差异）
+import argparse
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from basecode import GifDeltaEncoder, GifFrameWriter, GlobalPalette, OptimizedFrameProcessor
+
+def make_gradient_video(path, width=1280, height=720, fps=30, seconds=4):
+    """生成平滑渐变背景 + 运动圆形的合成视频"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    background = np.stack([
+        np.broadcast_to(x[None, :], (height, width)),
+        np.broadcast_to(y[:, None], (height, width)),
+        np.broadcast_to((x[None, :] + y[:, None]) / 2, (height, width)),
+    ], axis=2).astype(np.uint8)
+    for i in range(fps * seconds):
+        frame = background.copy()
+        cv2.circle(frame, ((i * 12) % width, height // 2), height // 6, (40, 200, 240), -1)
+        writer.write(frame)
+    writer.release()
+
+def encode(frames, fps, delta_encoding):
+    """按write_gif的方式写入内存，返回字节数"""
+    buffer = io.BytesIO()
+    encoder = GifDeltaEncoder() if delta_encoding else None
+    duration = max(20, int(1000 / fps))
+    with GifFrameWriter(buffer) as writer:
+        for frame in frames:
+            if encoder:
+                delta_frame, offset, transparency = encoder.encode(frame)
+                writer.add_frame(delta_frame, duration, offset, disposal=1, transparency=transparency)
+            else:
+                writer.add_frame(frame, duration, disposal=2)
+    return buffer.tell()
+
+def main():
+    parser = argparse.ArgumentParser(description="抖动方式基准测试")
+    parser.add_argument('video', nargs='?', help="测试视频，不指定则生成合成视频")
+    parser.add_argument('--seconds', type=float, default=4)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=480)
+    parser.add_argument('--height', type=int, default=270)
+    parser.add_argument('--colors', default="64,128", help="颜色数列表")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video = args.video
+        if not video:
+            video = Path(temp_dir) / "gradient.mp4"
+            make_gradient_video(video, seconds=int(np.ceil(args.seconds)))
+        processor = OptimizedFrameProcessor(max_workers=1)
+        rgb_frames = [frame.convert('RGB') for frame in processor.iter_rgb_frames(
+            str(video), 0, args.seconds, args.fps, args.width, args.height
+        )]
+    
+    print(f"{len(rgb_frames)}帧 {args.width}x{args.height}")
+    print(f"{'颜色':>6}{'调色板':>8}{'抖动':>18}{'量化ms/帧':>12}{'大小KB':>10}{'差分大小KB':>12}")
+    for colors in (int(n) for n in args.colors.split(',')):
+        for palette_mode in OptimizedFrameProcessor.PALETTE_MODES:
+            for dither in OptimizedFrameProcessor.DITHER_MODES:
+                start = time.perf_counter()
+                if palette_mode == 'global':
+                    palette = GlobalPalette.from_frames(rgb_frames, colors)
+                    frames = [palette.map_frame(frame, dither) for frame in rgb_frames]
+                else:
+                    frames = [OptimizedFrameProcessor._quantize_image(frame, colors, dither) for frame in rgb_frames]
+                elapsed = (time.perf_counter() - start) / len(frames) * 1000
+                full_size = encode(frames, args.fps, False)
+                delta_size = encode(frames, args.fps, True)
+                print(f"{colors:>6}{palette_mode:>8}{dither:>18}{elapsed:>12.2f}"
+                      f"{full_size / 1024:>10.0f}{delta_size / 1024:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# 帧处理引擎基准测试：对比线程池与进程池（共享内存）引擎随核心数的扩展性
+# 用法: python benchmarks/bench_frame_engines.py [视频文件] [--width 480] [--height 270]
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import cv2
+
+from basecode import OptimizedFrameProcessor
+
+def make_synthetic_video(path, width=1920, height=1080, fps=30, seconds=10):
+    """生成带运动内容的合成测试视频"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(fps * seconds):
+        frame = np.roll(background, i * 8, axis=1)
+        cv2.circle(frame, ((i * 20) % width, height // 2), height // 6, (0, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+def run_once(video, engine, workers, args):
+    processor = OptimizedFrameProcessor(max_workers=workers, engine=engine)
+    start = time.perf_counter()
+    frames = processor.extract_and_process_frames_optimized(
+        str(video), 0, args.seconds, args.fps, args.width, args.height, args.colors
+    )
+    return time.perf_counter() - start, len(frames)
+
+def main():
+    parser = argparse.ArgumentParser(description="帧处理引擎扩展性基准测试")
+    parser.add_argument('video', nargs='?', help="测试视频，不指定则生成1080p合成视频")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fps', type=int, default=20)
+    parser.add_argument('--width', type=int, default=480)
+    parser.add_argument('--height', type=int, default=270)
+    parser.add_argument('--colors', type=int, default=128)
+    args = parser.parse_args()
+    
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({n for n in (1, 2, 4, 8, 16, 32, cpu_count) if n <= cpu_count})
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video = args.video
+        if video is None:
+            video = Path(temp_dir) / "synthetic_1080p.mp4"
+            print("生成合成测试视频...")
+            make_synthetic_video(video, seconds=int(args.seconds) + 1)
+        
+        results = []
+        for engine in OptimizedFrameProcessor.ENGINES:
+            for workers in worker_counts:
+                elapsed, frame_count = run_once(video, engine, workers, args)
+                results.append((engine, workers, elapsed, frame_count))
+        
+        print()
+        print(f"{'引擎':<8}{'工作者':>6}{'耗时(秒)':>10}{'帧/秒':>10}{'加速比':>8}")
+        baseline = {}
+        for engine, workers, elapsed, frame_count in results:
+            baseline.setdefault(engine, elapsed)
+            print(f"{engine:<8}{workers:>6}{elapsed:>10.2f}{frame_count / elapsed:>10.1f}"
+                  f"{baseline[engine] / elapsed:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# 帧缩放基准测试：对比原先的"裁切 → 全尺寸BGR转RGB → PIL图像 → 按比例选算法resize"与
+# 融合路径OptimizedFrameProcessor.resize_frame（裁切视图 → BGR下INTER_AREA缩放 → 小图通道转换）
+# 用法: python benchmarks/bench_resize_kernel.py [--source 1920x1080] [--target 854x480] [--frames 60]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from basecode import OptimizedFrameProcessor
+
+def legacy_resize(frame, target_width, target_height, crop_params=None):
+    """原先process_frame_batch_optimized中的缩放步骤"""
+    if crop_params and any(crop_params):
+        crop_top, crop_bottom, crop_left, crop_right = crop_params
+        h, w = frame.shape[:2]
+        frame = frame[crop_top:h-crop_bottom, crop_left:w-crop_right]
+    img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    scale_factor = (target_width * target_height) / (img.size[0] * img.size[1])
+    if scale_factor < 0.5:
+        resample_method = Image.Resampling.LANCZOS
+    elif scale_factor < 0.8:
+        resample_method = Image.Resampling.BILINEAR
+    else:
+        resample_method = Image.Resampling.NEAREST
+    return img.resize((target_width, target_height), resample_method)
+
+def fused_resize(frame, target_width, target_height, crop_params=None):
+    return Image.fromarray(OptimizedFrameProcessor.resize_frame(frame, target_width, target_height, crop_params))
+
+def make_frames(width, height, count):
+    """渐变背景 + 运动方块 + 噪声的合成帧（BGR）"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    background = np.stack([
+        np.broadcast_to(x[None, :], (height, width)),
+        np.broadcast_to(y[:, None], (height, width)),
+        np.broadcast_to((x[None, :] + y[:, None]) / 2, (height, width)),
+    ], axis=2).astype(np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        cv2.rectangle(frame, ((i * 24) % width, height // 3), ((i * 24) % width + height // 4, height // 2),
+                      (40, 200, 240), -1)
+        frame ^= rng.integers(0, 8, frame.shape, dtype=np.uint8)
+        frames.append(frame)
+    return frames
+
+def measure(function, frames, target_width, target_height, crop_params, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            function(frame, target_width, target_height, crop_params)
+        elapsed = (time.perf_counter() - start) / len(frames) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="帧缩放基准测试")
+    parser.add_argument('--source', default="1920x1080")
+    parser.add_argument('--target', default="854x480,640x360,1280x720")
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    source_width, source_height = (int(n) for n in args.source.split('x'))
+    frames = make_frames(source_width, source_height, args.frames)
+    print(f"源 {source_width}x{source_height}，{len(frames)}帧，单线程，取{args.repeat}次中的最好成绩")
+    print(f"{'目标':>12}{'裁切':>14}{'原路径ms/帧':>14}{'融合ms/帧':>12}{'加速':>8}{'平均差':>8}")
+    for target in args.target.split(','):
+        target_width, target_height = (int(n) for n in target.split('x'))
+        for crop_params in (None, (60, 60, 0, 0)):
+            legacy = measure(legacy_resize, frames, target_width, target_height, crop_params, args.repeat)
+            fused = measure(fused_resize, frames, target_width, target_height, crop_params, args.repeat)
+            difference = np.abs(
+                np.asarray(legacy_resize(frames[0], target_width, target_height, crop_params), dtype=np.int16) -
+                np.asarray(fused_resize(frames[0], target_width, target_height, crop_params), dtype=np.int16)
+            ).mean()
+            crop_desc = 'x'.join(map(str, crop_params)) if crop_params else '-'
+            print(f"{target:>12}{crop_desc:>14}{legacy:>14.2f}{fused:>12.2f}{legacy / fused:>7.1f}x{difference:>8.2f}")
+
+if __name__ == "__main__":
+    main()
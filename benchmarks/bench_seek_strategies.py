@@ -0,0 +1,75 @@
+# 跳帧策略基准测试：在不同GOP长度的合成视频上对比grab、seek、keyframe和auto策略的取帧耗时
+# 用法: python benchmarks/bench_seek_strategies.py [--gops 12,60,250] [--steps 2,5,15,30]
+# 需要ffmpeg（libx264）生成指定GOP的测试视频
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+
+from basecode import FrameSeeker
+
+def make_gop_video(path, gop, width=1280, height=720, fps=30, seconds=20):
+    """用ffmpeg生成固定GOP长度的H.264测试视频"""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y', '-f', 'lavfi',
+        '-i', f'testsrc2=size={width}x{height}:rate={fps}', '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(gop), '-keyint_min', str(gop),
+        '-sc_threshold', '0', '-pix_fmt', 'yuv420p', str(path)
+    ], check=True)
+
+def sample_frames(video, step, strategy, start_frame=30):
+    """按步长取帧，返回 (耗时, 取到的帧数, 帧签名列表, 跳帧器)"""
+    cap = cv2.VideoCapture(str(video))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    keyframes = FrameSeeker.read_keyframes(video) if strategy in ('auto', 'keyframe') else None
+    
+    start = time.perf_counter()
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    seeker = FrameSeeker(cap, strategy, keyframes)
+    position = start_frame
+    signatures = []
+    while position < total_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        signatures.append(int(frame[::16, ::16].sum()))
+        position += 1
+        seeker.skip_to(position, position + step - 1)
+        position += step - 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed, len(signatures), signatures, seeker
+
+def main():
+    parser = argparse.ArgumentParser(description="跳帧策略基准测试")
+    parser.add_argument('--gops', default="12,60,250", help="GOP长度列表")
+    parser.add_argument('--steps', default="2,5,15,30", help="取帧步长列表")
+    parser.add_argument('--seconds', type=int, default=20)
+    args = parser.parse_args()
+    
+    if shutil.which('ffmpeg') is None:
+        print("需要ffmpeg生成测试视频")
+        sys.exit(1)
+    
+    strategies = ('grab', 'seek', 'keyframe', 'auto')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"{'GOP':>5}{'步长':>6}" + "".join(f"{name + '(秒)':>14}" for name in strategies) + f"{'帧一致':>8}  auto选择")
+        for gop in (int(n) for n in args.gops.split(',')):
+            video = Path(temp_dir) / f"gop{gop}.mp4"
+            make_gop_video(video, gop, seconds=args.seconds)
+            for step in (int(n) for n in args.steps.split(',')):
+                results = {name: sample_frames(video, step, name) for name in strategies}
+                reference = results['grab'][2]
+                identical = all(result[2] == reference for result in results.values())
+                row = f"{gop:>5}{step:>6}" + "".join(f"{results[name][0]:>14.3f}" for name in strategies)
+                print(f"{row}{'是' if identical else '否':>8}  {results['auto'][3].describe()}")
+
+if __name__ == "__main__":
+    main()
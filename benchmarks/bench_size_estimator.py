@@ -0,0 +1,90 @@
+# GIF大小估算精度基准测试：在合成视频夹具上对比原固定系数模型、采样校准估算与实际编码大小
+# 用法: python benchmarks/bench_size_estimator.py [--sizes 480x270,320x180] [--fps 10,20] [--seconds 6]
+# 需要ffmpeg生成测试视频
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from basecode import GifConversionPipeline, GifSizeEstimator
+
+# 夹具：运动合成画面、细节丰富的缩放、静态画面、局部变化
+FIXTURES = {
+    'testsrc2': 'testsrc2=size=1280x720:rate=30',
+    'mandelbrot': 'mandelbrot=size=1280x720:rate=30',
+    'smptebars': 'smptebars=size=1280x720:rate=30',
+    'life': 'life=size=1280x720:rate=30:mold=10:ratio=0.1:death_color=#C83232:life_color=#00ff00',
+}
+QUALITIES = {256: "高", 128: "中", 64: "低"}
+
+def make_fixture(path, source, seconds):
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', source, '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', str(path)
+    ], check=True)
+
+def constant_model(width, height, duration, fps, colors):
+    """原_estimate_gif_size的固定系数模型（字节）"""
+    return width * height * duration * fps * 0.8 * (colors / 256) * 0.4 + 1024 + colors * 3
+
+def main():
+    parser = argparse.ArgumentParser(description="GIF大小估算精度基准测试")
+    parser.add_argument('--fixtures', default=",".join(FIXTURES), help="夹具列表")
+    parser.add_argument('--sizes', default="480x270,320x180", help="GIF分辨率列表")
+    parser.add_argument('--fps', default="10,20", help="帧率列表")
+    parser.add_argument('--colors', default="256,128,64", help="颜色数列表")
+    parser.add_argument('--seconds', type=int, default=6, help="片段时长")
+    args = parser.parse_args()
+    
+    if shutil.which('ffmpeg') is None:
+        print("需要ffmpeg生成测试视频")
+        sys.exit(1)
+    
+    sizes = [tuple(map(int, size.split('x'))) for size in args.sizes.split(',')]
+    fps_list = [int(n) for n in args.fps.split(',')]
+    colors_list = [int(n) for n in args.colors.split(',')]
+    pipeline = GifConversionPipeline()
+    estimator = GifSizeEstimator()
+    
+    errors = {'constant': [], 'calibrated': []}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"{'夹具':<12}{'参数':<20}{'实际KB':>10}{'固定模型KB':>12}{'校准估算KB':>12}{'误差':>8}")
+        for name in args.fixtures.split(','):
+            video = Path(temp_dir) / f"{name}.mp4"
+            make_fixture(video, FIXTURES[name], args.seconds)
+            
+            with redirect_stdout(None):
+                started = time.perf_counter()
+                coefficients = estimator.calibrate(name, str(video), 0, args.seconds, 1280, 720, False, False)
+                calibrate_time = time.perf_counter() - started
+            
+            for width, height in sizes:
+                for fps in fps_list:
+                    for colors in colors_list:
+                        output = Path(temp_dir) / "out.gif"
+                        with redirect_stdout(None):
+                            pipeline.convert(str(video), str(output), 0, args.seconds, width, height, fps,
+                                             QUALITIES[colors], False, False, True)
+                        actual = output.stat().st_size
+                        constant = constant_model(width, height, args.seconds, fps, colors)
+                        calibrated = GifSizeEstimator.estimate(coefficients, width, height, args.seconds, fps, colors)
+                        errors['constant'].append(abs(constant - actual) / actual)
+                        errors['calibrated'].append(abs(calibrated - actual) / actual)
+                        print(f"{name:<12}{f'{width}x{height} {fps}fps {colors}色':<20}{actual / 1024:>10.0f}"
+                              f"{constant / 1024:>12.0f}{calibrated / 1024:>12.0f}"
+                              f"{(calibrated - actual) / actual * 100:>+7.0f}%")
+            print(f"{name}: 校准耗时 {calibrate_time:.2f}秒, 帧间相似度 {coefficients['similarity']:.2f}")
+    
+    for model, values in errors.items():
+        print(f"{model}: 误差中位数 {np.median(values) * 100:.0f}%, 最大 {np.max(values) * 100:.0f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# 转换服务负载测试：不同并发下 POST /convert 的延迟与吞吐量
+# 用法: python benchmarks/load_test_server.py [视频文件] [--url http://127.0.0.1:8765] [--concurrency 1,2,4]
+# 不指定--url时在本进程内启动一个转换服务
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from basecode import ConversionServer, OptimizedFrameProcessor
+from bench_frame_engines import make_synthetic_video
+
+def convert_once(url, job):
+    """提交一次同步转换，返回 (延迟秒数, GIF字节数, HTTP状态码)"""
+    request = urllib.request.Request(
+        f"{url}/convert", data=json.dumps(job).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            size = len(response.read())
+            return time.perf_counter() - start, size, response.status
+    except urllib.error.HTTPError as e:
+        return time.perf_counter() - start, 0, e.code
+
+def run_level(url, job, concurrency, request_count):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: convert_once(url, job), range(request_count)))
+    elapsed = time.perf_counter() - start
+    
+    latencies = sorted(latency for latency, _, status in results if status == 200)
+    failed = sum(1 for _, _, status in results if status != 200)
+    if not latencies:
+        return elapsed, None, None, None, failed
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return elapsed, statistics.median(latencies), p95, latencies[-1], failed
+
+def start_local_server(temp_dir, args):
+    server = ConversionServer(
+        temp_dir, port=0,
+        decode_workers=args.decode_workers,
+        encode_workers=args.encode_workers,
+        frame_processor=OptimizedFrameProcessor(persistent=True)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    while server.httpd is None:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{server.httpd.server_port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="转换服务负载测试")
+    parser.add_argument('video', nargs='?', help="测试视频（服务端可访问的路径或链接），不指定则生成合成视频")
+    parser.add_argument('--url', help="已运行的转换服务地址，不指定则在本进程内启动")
+    parser.add_argument('--concurrency', default="1,2,4", help="并发数列表，默认1,2,4")
+    parser.add_argument('--requests', type=int, default=8, help="每个并发级别的请求数，默认8")
+    parser.add_argument('--seconds', type=float, default=3, help="每个片段的时长，默认3秒")
+    parser.add_argument('--size', default="320x180")
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--decode-workers', type=int, default=2)
+    parser.add_argument('--encode-workers', type=int, default=2)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video = args.video
+        if video is None:
+            video = str(Path(temp_dir) / "synthetic_720p.mp4")
+            print("生成合成测试视频...")
+            make_synthetic_video(video, width=1280, height=720, seconds=int(args.seconds) + 1)
+        
+        server = None
+        url = args.url
+        if url is None:
+            server, url = start_local_server(temp_dir, args)
+        
+        job = {'source': video, 'start': 0, 'end': args.seconds, 'size': args.size, 'fps': args.fps}
+        results = []
+        try:
+            for concurrency in (int(n) for n in args.concurrency.split(',')):
+                results.append((concurrency, *run_level(url.rstrip('/'), job, concurrency, args.requests)))
+        finally:
+            if server:
+                server.shutdown()
+        
+        print()
+        print(f"{'并发':>4}{'总耗时(秒)':>12}{'请求/分钟':>10}{'P50(秒)':>10}{'P95(秒)':>10}{'最大(秒)':>10}{'失败':>6}")
+        for concurrency, elapsed, p50, p95, worst, failed in results:
+            completed = args.requests - failed
+            if p50 is None:
+                print(f"{concurrency:>4}{elapsed:>12.2f}{0:>10.1f}{'-':>10}{'-':>10}{'-':>10}{failed:>6}")
+                continue
+            print(f"{concurrency:>4}{elapsed:>12.2f}{completed / elapsed * 60:>10.1f}"
+                  f"{p50:>10.2f}{p95:>10.2f}{worst:>10.2f}{failed:>6}")
+
+if __name__ == "__main__":
+    main()